@@ -3,15 +3,64 @@ import subprocess
 import sys
 import time
 
+from functools import partial
 from math import floor
 
+from src.SAT.portfolio import solve_sat_portfolio
 from src.SAT.sat_model import solve_sat
+from src.batch_runner import run_batch
+from src.bounds import objective_lower_bound, optimality_gap
 from src.SMT.SMT import main_smt
-from src.io_utils import write_to_json, output_to_dict_cp, read_input_file
+from src.heuristics import heuristic_solution
+from src.LNS.lns import main_lns
+from src.io_utils import (
+    write_to_json, output_to_dict_cp, read_input_file, warm_start_to_dzn, preprocessing_to_dzn, symmetries_to_dzn
+)
+from src.route_utils import predecessors_from_table, routes_from_predecessors
 from src.MIP.main_mip import main_mip
+from src.preprocessing import preprocess
+from src.symmetry import canonical_routes, detect_symmetries
+
+
+# Time limits of the models (ms)
+CP_TIME_LIMIT = 290000
+SAT_CONSTRAINT_ADDING_TIMEOUT = 600000
+SAT_SOLVING_TIMEOUT = 300000
+
+# Time budget of each method (s), from the time limits of its model: the SMT models stop after 300 s, the MIP ones
+# after 285 s and LNS after 290 s
+METHOD_BUDGETS = {
+    "CP": CP_TIME_LIMIT / 1000,
+    "SAT": (SAT_CONSTRAINT_ADDING_TIMEOUT + SAT_SOLVING_TIMEOUT) / 1000,
+    "SAT_PORTFOLIO": (SAT_CONSTRAINT_ADDING_TIMEOUT + SAT_SOLVING_TIMEOUT) / 1000,
+    "SMT": 300,
+    "SMT_SUCCESSOR": 300,
+    "SMT_LAZY": 300,
+    "LNS": 290,
+    "MIP": 285,
+    "MIP_LAZY": 285,
+    "MIP_TWO_INDEX": 285,
+    "MIP_HIGHS": 285,
+    "MIP_HIGHS_LAZY": 285,
+    "MIP_HIGHS_TWO_INDEX": 285
+}
+
+# Time allowed to each run in batch mode beyond the budget of its method (s), for reading the instance, the heuristic
+# solution and the preprocessing
+DEADLINE_MARGIN = 60
+
+
+def method_deadline(task):
+    """
+    Default deadline of a batch task: the time budget of its method, plus a margin.
+
+    :param task: tuple - instance number, experiment name and method name, as in run_instance
+    :return: float - the deadline (s)
+    """
+    return METHOD_BUDGETS[task[2]] + DEADLINE_MARGIN
 
 
-def run_cp_instance(data_path):
+def run_cp_instance(data_path, parameters):
     # Start timer
     time_started = time.time()
 
@@ -22,7 +71,8 @@ def run_cp_instance(data_path):
             '--solver', 'gecode',
             os.path.join('.', "src", "CP", "the_problem.mzn"),
             data_path,
-            "--time-limit", "290000",
+            "-D", parameters,
+            "--time-limit", str(CP_TIME_LIMIT),
             "--random-seed", "42"
         ],
         stdin=subprocess.PIPE,
@@ -47,25 +97,30 @@ def run_cp_instance(data_path):
 
 def run_sat_instance(
         data_path,
-        ignore_max_load_symmetry_breaking_constraints=True,
-        ignore_distance_symmetry_breaking_constraints=True,
-        constraint_adding_timeout=600000,
-        solving_timeout=300000
+        ignore_max_load_symmetry_breaking_constraints=False,
+        ignore_distance_symmetry_breaking_constraints=False,
+        ignore_item_symmetry_breaking_constraints=False,
+        constraint_adding_timeout=SAT_CONSTRAINT_ADDING_TIMEOUT,
+        solving_timeout=SAT_SOLVING_TIMEOUT,
+        portfolio=False,
+        portfolio_workers=None
 ):
     # Read problem data from file
     instance = read_input_file(data_path)
 
-    # Solve instance
-    result, instance_obj = solve_sat(
+    # Solve instance (with a single solver, or with a portfolio of solvers running in parallel)
+    solve = partial(solve_sat_portfolio, workers=portfolio_workers) if portfolio else solve_sat
+    result, instance_obj = solve(
         instance,
         ignore_max_load_symmetry_breaking_constraints=ignore_max_load_symmetry_breaking_constraints,
         ignore_distance_symmetry_breaking_constraints=ignore_distance_symmetry_breaking_constraints,
+        ignore_item_symmetry_breaking_constraints=ignore_item_symmetry_breaking_constraints,
         constraint_adding_timeout=constraint_adding_timeout,
         solving_timeout=solving_timeout
     )
 
     # Extract solution
-    if len(result.keys()) == 1:
+    if "max_dist" not in result:
         return None
     else:
         item_assignment = result["item_assignment"]
@@ -74,123 +129,160 @@ def run_sat_instance(
 
     elapsed_time = floor(result["elapsed_time"] / 1000)
 
-    # Prepare output variables (solution will contain the routes)
-    solution = list()
-
     # Find item assignments and routes
-    for idx, co_assignment in enumerate(item_assignment):
-        # Get all items for current courier
-        items = [i for i, val in enumerate(co_assignment) if val]
-
-        # Case when courier delivers no items
-        if len(items) == 0:
-            solution.append(list())
-            continue
-
-        # Prepare to extract route
-        current_pre_col = None
-
-        for item in items:
-            # Find first item delivered by courier and initialize route
-            if not any(pre_table[item]):
-                current_item = item
-                solution.append([item + 1])
-                current_pre_col = [row[current_item] for row in pre_table]
-                break
-
-        # Go through route while successor exists
-        while any(current_pre_col):
-            current_item = current_pre_col.index(True)
-            current_pre_col = [row[current_item] for row in pre_table]
-            solution[idx].append(current_item + 1)
-
-    # Prepare output dict
-    if elapsed_time >= (solving_timeout / 1000):
+    solution = routes_from_predecessors(
+        predecessors_from_table(pre_table),
+        item_assignment.argmax(axis=0),
+        len(item_assignment)
+    )
+
+    # Prepare output dict (the model may have run out of time before solving, leaving the heuristic solution)
+    if elapsed_time >= (solving_timeout / 1000) or not result.get("optimal", True):
         output_dict = {
             "time": 300,
             "optimal": False,
             "obj": max_dist,
-            "sol": solution
+            "sol": solution,
+            "gap": optimality_gap(max_dist, result["lower_bound"])
         }
     else:
         output_dict = {
             "time": elapsed_time,
             "optimal": True,
             "obj": max_dist,
-            "sol": solution
+            "sol": solution,
+            "gap": 0.0
         }
 
     return output_dict
 
 
+def list_instances():
+    """
+    Find the numbers of all the available problem instances.
+
+    :return: list(int) - sorted instance numbers
+    """
+    the_dir = os.path.join('.', "data", "problem_instances")
+
+    return sorted(int(el[4:-4]) for el in os.listdir(the_dir) if el.startswith("inst") and el.endswith(".dat"))
+
+
+def run_instance(instance_number, experiment_name, method_name, portfolio_workers=None):
+    """
+    Solve a single instance with the given method and write the results to the corresponding json file.
+
+    :param instance_number: int - number of the instance to solve
+    :param experiment_name: str - name of the experiment, used as key in the json file
+    :param method_name: str - name of the solving method (CP, SAT, SAT_PORTFOLIO, SMT, SMT_SUCCESSOR, SMT_LAZY, MIP,
+                        MIP_LAZY, MIP_TWO_INDEX, MIP_HIGHS, MIP_HIGHS_LAZY, MIP_HIGHS_TWO_INDEX or LNS)
+    :param portfolio_workers: int - number of workers of the SAT portfolio (see portfolio.solve_sat_portfolio)
+    :return: None
+    """
+    print("Working on instance", instance_number)
+
+    if method_name == "CP":
+        data_path = os.path.join('.', "data", "CP", "problem_instances", "inst%02d.dzn" % (instance_number, ))
+
+        # Start from the heuristic solution, and stop at the lower bound
+        instance = read_input_file(os.path.join('.', "data", "problem_instances", "inst%02d.dat" % (instance_number, )))
+        routes, max_dist = heuristic_solution(instance)
+        lower_bound = objective_lower_bound(instance)
+
+        # Items each courier can carry, and arcs each courier may travel in a solution no worse than the heuristic one
+        compatible, arc_mask = preprocess(instance, max_dist)
+
+        # Symmetries broken by the model, which the heuristic solution is made to satisfy
+        symmetries = detect_symmetries(instance)
+        if routes is not None:
+            routes = canonical_routes(routes, symmetries)
+
+        parameters = "%s %s %s" % (
+            warm_start_to_dzn(instance, routes, max_dist, lower_bound), preprocessing_to_dzn(compatible, arc_mask),
+            symmetries_to_dzn(symmetries)
+        )
+        output, time_delta, courier_number = run_cp_instance(data_path, parameters)
+        parsed_output = output_to_dict_cp(output, experiment_name, time_delta, courier_number, routes, max_dist)
+        if experiment_name in parsed_output:
+            results = parsed_output[experiment_name]
+            results["gap"] = optimality_gap(results["obj"], lower_bound, results["optimal"])
+        write_to_json(parsed_output, instance_number, method_name)
+
+    if method_name in ("SAT", "SAT_PORTFOLIO"):
+        sat_solution = dict()
+        data_path = os.path.join('.', "data", "problem_instances", "inst%02d.dat" % (instance_number, ))
+        solution = run_sat_instance(
+            data_path, portfolio=(method_name == "SAT_PORTFOLIO"), portfolio_workers=portfolio_workers
+        )
+        if solution is not None:
+            # The portfolio has its own key, so that it doesn't overwrite the single solver
+            key = experiment_name + " (portfolio)" if method_name == "SAT_PORTFOLIO" else experiment_name
+            sat_solution[key] = solution
+            write_to_json(sat_solution, instance_number, "SAT")
+
+    if method_name in ("SMT", "SMT_SUCCESSOR", "SMT_LAZY"):
+        main_smt(
+            instance_number,
+            formulation="successor" if method_name == "SMT_SUCCESSOR" else "arcs",
+            subtour_elimination="lazy" if method_name == "SMT_LAZY" else "mtz"
+        )
+
+    if method_name == "LNS":
+        main_lns(instance_number, experiment_name)
+
+    if method_name in ("MIP", "MIP_LAZY", "MIP_TWO_INDEX", "MIP_HIGHS", "MIP_HIGHS_LAZY", "MIP_HIGHS_TWO_INDEX"):
+        main_mip(
+            instance_number,
+            subtour_elimination="lazy" if method_name.endswith("_LAZY") else "mtz",
+            solver="highs" if method_name.startswith("MIP_HIGHS") else "gurobi",
+            formulation="two_index" if method_name.endswith("_TWO_INDEX") else "three_index"
+        )
+
+    return None
+
+
 def main():
     """
     The main function.
 
+    Arguments: instance number (0 for all), experiment name, method name(s) (comma separated for more methods), and
+    optionally the number of parallel workers and the per-instance deadline in seconds (by default, the time budget of
+    each method plus a margin). When the number of workers is given, every instance runs in its own process, which is
+    killed if it exceeds the deadline.
+
     :return: None
     """
 
-    the_dir = os.path.join('.', "data", "problem_instances")
-
     instance_number = int(sys.argv[1])
     experiment_name = sys.argv[2]
-    method_name = sys.argv[3]
+    method_names = sys.argv[3].split(",")
 
-    if method_name == "CP":
-        the_dir = os.path.join('.', "data", "CP", "problem_instances")
-
-        if instance_number == 0:
-            for el in os.listdir(the_dir):
-                print("Working on", el)
-                data_path = os.path.join(the_dir, el)
-                output, time_delta, courier_number = run_cp_instance(data_path)
-                parsed_output = output_to_dict_cp(output, experiment_name, time_delta, courier_number)
-                inst_n = el[-6:-3]
-                write_to_json(parsed_output, inst_n, method_name)
-        else:
-            print("Working on instance", instance_number)
-            data_path = os.path.join(the_dir, "inst%02d.dzn" % (instance_number, ))
-            output, time_delta, courier_number = run_cp_instance(data_path)
-            parsed_output = output_to_dict_cp(output, experiment_name, time_delta, courier_number)
-            write_to_json(parsed_output, instance_number, method_name)
-
-    if method_name == "SAT":
-        if instance_number == 0:
-            for el in os.listdir(the_dir):
-                print("Working on", el)
-                sat_solution = dict()
-                data_path = os.path.join(the_dir, el)
-                solution = run_sat_instance(data_path)
-                if solution is not None:
-                    sat_solution[experiment_name] = solution
-                    inst_n = el[-6:-3]
-                    write_to_json(sat_solution, inst_n, method_name)
-        else:
-            print("Working on instance", instance_number)
-            sat_solution = dict()
-            data_path = os.path.join(the_dir, "inst%02d.dat" % (instance_number, ))
-            solution = run_sat_instance(data_path)
-            if solution is not None:
-                sat_solution[experiment_name] = solution
-                write_to_json(sat_solution, instance_number, method_name)
-
-    if method_name == "SMT":
-        if instance_number == 0:
-            for i in range(1, 22):
-                print("Working on instance", i)
-                main_smt(i)
-        else:
-            print("Working on instance", instance_number)
-            main_smt(instance_number)
-
-    if method_name == "MIP":
-        if instance_number == 0:
-            for i in range(1, 22):
-                print("Working on instance", i)
-                main_mip(i)
-        else:
-            print("Working on instance", instance_number)
-            main_mip(instance_number)
+    if instance_number == 0:
+        instance_numbers = list_instances()
+    else:
+        instance_numbers = [instance_number]
+
+    tasks = [(i, experiment_name, method_name) for method_name in method_names for i in instance_numbers]
+
+    if len(sys.argv) > 4:
+        workers = int(sys.argv[4])
+        deadline = float(sys.argv[5]) if len(sys.argv) > 5 else method_deadline
+
+        # A SAT portfolio only gets its share of the cores, the others going to the tasks running at the same time
+        running = min(workers if workers > 0 else os.cpu_count() or 1, len(tasks))
+        portfolio_workers = max(1, (os.cpu_count() or 1) // running)
+        tasks = [task + (portfolio_workers, ) for task in tasks]
+
+        statuses = run_batch(tasks, run_instance, workers=workers, deadline=deadline)
+
+        failed = [task for task in tasks if statuses[task] != "done"]
+        if failed:
+            print("Not completed:")
+            for task in failed:
+                print("\t", task, "-", statuses[task])
+    else:
+        for task in tasks:
+            run_instance(*task)
 
     return None
 
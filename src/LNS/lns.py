@@ -0,0 +1,207 @@
+import math
+
+import numpy as np
+
+from timeit import default_timer as timer
+
+from src.bounds import objective_lower_bound, optimality_gap
+from src.heuristics import heuristic_solution
+from src.io_utils import read_input_file, write_to_json
+from src.local_search import improve_solution, sorted_neighbors
+from src.solution import Solution
+
+
+def random_removal(solution, q, rng, neighbors):
+    """
+    Remove q items picked at random.
+
+    :return: list(int) - the removed items
+    """
+    items = [j for route in solution.routes for j in route]
+    return rng.choice(items, size=min(q, len(items)), replace=False).tolist()
+
+
+def related_removal(solution, q, rng, neighbors):
+    """
+    Remove a random item and the q - 1 items nearest to it, which can then be delivered in a different order or by
+    different couriers.
+
+    :return: list(int) - the removed items
+    """
+    items = [j for route in solution.routes for j in route]
+    seed = int(rng.choice(items))
+
+    return [seed] + neighbors[seed][:min(q, len(items)) - 1]
+
+
+def worst_courier_removal(solution, q, rng, neighbors):
+    """
+    Remove up to q items picked at random from the longest route, and the items nearest to them until q are removed.
+
+    :return: list(int) - the removed items
+    """
+    longest = solution.paths[int(np.argmax(solution.lengths))][1:-1]
+
+    removed = rng.choice(longest, size=min(q, len(longest)), replace=False).tolist() if longest else list()
+    for j in list(removed):
+        for k in neighbors[j]:
+            if len(removed) >= q:
+                break
+            if k not in removed:
+                removed.append(k)
+
+    return removed
+
+
+DESTROY_OPERATORS = [random_removal, related_removal, worst_courier_removal]
+
+# Iterations in a row without a better solution after which the search stops
+MAX_STAGNATION = 2000
+
+
+def regret_insertion(solution, removed):
+    """
+    Insert the removed items back, where they fit, one at a time: first the item losing the most if it were not put
+    on the route it suits best (regret-2), each on the route that ends up shortest.
+
+    :param solution: Solution - solution without the removed items (modified)
+    :param removed: list(int) - items to insert
+    :return: bool - whether all the items could be inserted
+    """
+    def best_insertion(j, i):
+        # Shortest length of route i with item j, and position of j
+        if solution.loads[i] + solution.sizes[j] > solution.capacities[i]:
+            return None
+        return min(
+            (solution.lengths[i] + solution.insertion_delta(j, i, p), p) for p in range(1, len(solution.paths[i]))
+        )
+
+    # Best insertion of each item in each route, updated for the route changed by each insertion
+    insertions = {j: [best_insertion(j, i) for i in range(len(solution.paths))] for j in removed}
+    while insertions:
+        best = None
+        for j, options in insertions.items():
+            feasible = sorted(option + (i, ) for i, option in enumerate(options) if option is not None)
+            if not feasible:
+                return False
+            regret = feasible[1][0] - feasible[0][0] if len(feasible) > 1 else math.inf
+            if best is None or (regret, -feasible[0][0]) > best[0]:
+                best = ((regret, -feasible[0][0]), j, feasible[0])
+
+        _, j, (_, position, i) = best
+        solution.insert(j, i, position)
+
+        del insertions[j]
+        for k in insertions:
+            insertions[k][i] = best_insertion(k, i)
+
+    return True
+
+
+def solve_lns(instance, timeout=290000, seed=42, on_incumbent=None, max_stagnation=MAX_STAGNATION):
+    """
+    Large Neighbourhood Search: starting from the heuristic solution, repeatedly remove some items (with a destroy
+    operator picked at random) and insert them back by regret insertion, improving the result by local search.
+    New solutions are accepted with simulated annealing, the temperature going down to 0 at the time limit. The search
+    stops at the time limit, at the lower bound of the objective, or after max_stagnation iterations in a row without
+    a better solution.
+
+    :param instance: MCPProblem - the instance
+    :param timeout: int - time limit (ms)
+    :param seed: int - seed of the random generator
+    :param on_incumbent: function(dict) - called with the result dict after every improving solution
+    :param max_stagnation: int - iterations without a better solution before stopping
+    :return: dict - time (s), optimal, obj and routes (items 1-based) of the best solution (obj None if no solution is
+             found), the time (s) and objective of every improving solution found, and the lower bound of the objective
+    """
+    start_time = timer()
+    deadline = start_time + timeout / 1000
+
+    n = instance.n_items
+    neighbors = sorted_neighbors(instance.distances, n)
+    lower_bound = objective_lower_bound(instance)
+    rng = np.random.default_rng(seed)
+
+    result_dict = {
+        "time": timeout / 1000,
+        "optimal": False,
+        "obj": None,
+        "routes": None,
+        "incumbents": list(),
+        "lower_bound": lower_bound
+    }
+
+    def record(routes, obj):
+        result_dict["obj"] = obj
+        result_dict["routes"] = [[j + 1 for j in route] for route in routes]
+        result_dict["incumbents"].append([round(timer() - start_time, 3), obj])
+        if on_incumbent is not None:
+            on_incumbent(result_dict)
+
+    routes, obj = heuristic_solution(instance, time_limit=timeout / 10000)
+    if routes is None:
+        return result_dict
+    record(routes, obj)
+
+    # Solutions are compared by their maximum distance, then by their total distance
+    current = Solution(instance, routes)
+    current_cost = (obj, sum(current.lengths))
+    initial_temperature = 0.05 * obj
+    stagnation = 0
+    while result_dict["obj"] > lower_bound and stagnation < max_stagnation:
+        now = timer()
+        if now >= deadline:
+            break
+        stagnation += 1
+
+        candidate = current.copy()
+        q = int(rng.integers(2, max(3, min(n, n // 4 + 2)) + 1))
+        destroy = DESTROY_OPERATORS[int(rng.integers(len(DESTROY_OPERATORS)))]
+        removed = destroy(candidate, q, rng, neighbors)
+        candidate.remove_items(removed)
+
+        if not regret_insertion(candidate, removed):
+            continue
+        obj = improve_solution(candidate, deadline - timer())
+        cost = (obj, sum(candidate.lengths))
+
+        temperature = initial_temperature * (deadline - now) / (deadline - start_time)
+        if cost <= current_cost or rng.random() < math.exp((current_cost[0] - obj) / max(temperature, 1e-9)):
+            current, current_cost = candidate, cost
+        if obj < result_dict["obj"]:
+            record(candidate.routes, obj)
+            stagnation = 0
+
+    if result_dict["obj"] <= lower_bound:
+        result_dict["time"] = timer() - start_time
+        result_dict["optimal"] = True
+
+    return result_dict
+
+
+def main_lns(instance_number, experiment_name):
+    """
+    Solve an instance with LNS and write the results to the json file, after every improving solution, so that a run
+    killed at the deadline still reports the best one.
+
+    :param instance_number: int - number of the instance
+    :param experiment_name: str - name of the experiment, used as key in the json file
+    """
+    instance = read_input_file("data/problem_instances/inst%02d.dat" % (instance_number, ))
+
+    def write_results(result_dict):
+        data = {
+            experiment_name: {
+                "time": int(math.floor(result_dict["time"])) if result_dict["optimal"] else 300,
+                "optimal": result_dict["optimal"],
+                "obj": result_dict["obj"],
+                "sol": result_dict["routes"],
+                "gap": optimality_gap(result_dict["obj"], result_dict["lower_bound"], result_dict["optimal"])
+            }
+        }
+
+        write_to_json(data, instance_number, "LNS")
+
+    result_dict = solve_lns(instance, on_incumbent=write_results)
+    if result_dict["obj"] is not None:
+        write_results(result_dict)
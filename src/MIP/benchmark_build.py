@@ -0,0 +1,67 @@
+import csv
+import os
+import sys
+
+import gurobipy as gp
+
+from timeit import default_timer as timer
+
+from src.io_utils import problem_to_lists, read_input_file
+from src.MIP.main_mip import build_loop_model
+from src.MIP.matrix_model import build_matrix_model
+
+
+BENCHMARK_FIELDS = ["instance", "m", "n", "builder", "variables", "constraints", "build_time"]
+
+
+def benchmark_build(instance_numbers, subtour_elimination="mtz"):
+    """
+    Build the MIP model of each instance one variable and constraint at a time and with the matrix API, recording the
+    time (in s) until the model is updated and ready to be solved.
+
+    :param instance_numbers: list(int) - numbers of the instances to benchmark
+    :param subtour_elimination: str - mtz or lazy, as in main_mip
+    :return: list(dict) - one row per instance and builder, with the fields in BENCHMARK_FIELDS
+    """
+    builders = {"loops": build_loop_model, "matrix": build_matrix_model}
+
+    rows = list()
+    with gp.Env(params={"OutputFlag": 0}) as env:
+        for instance_number in instance_numbers:
+            m, n, li, sj, Di_j = problem_to_lists(
+                read_input_file(os.path.join("data", "problem_instances", "inst%02d.dat" % (instance_number, )))
+            )
+
+            for name, build in builders.items():
+                print("Instance", instance_number, "-", name)
+                with gp.Model(env=env) as model:
+                    start_time = timer()
+                    build(model, m, n, li, sj, Di_j, subtour_elimination)
+                    model.update()
+                    build_time = timer() - start_time
+
+                    rows.append({
+                        "instance": instance_number,
+                        "m": m,
+                        "n": n,
+                        "builder": name,
+                        "variables": model.NumVars,
+                        "constraints": model.NumConstrs,
+                        "build_time": round(build_time, 3)
+                    })
+
+    return rows
+
+
+def write_benchmark(rows, file_path):
+    with open(file_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=BENCHMARK_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    # python -m src.MIP.benchmark_build [instance numbers, all if none given]
+    numbers = [int(arg) for arg in sys.argv[1:]] or range(1, 22)
+
+    write_benchmark(benchmark_build(numbers), os.path.join("data", "MIP_build_benchmark.csv"))
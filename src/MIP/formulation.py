@@ -0,0 +1,236 @@
+import numpy as np
+import scipy.sparse as sp
+
+from src.route_utils import routes_from_arcs, subtours
+
+
+class MIPFormulation:
+    """
+    Three-index MIP formulation of an instance as sparse matrices, independent of the solver:
+    minimize c @ v, subject to A @ v (sense) rhs and lb <= v <= ub, with v[j] integer where integrality[j] is 1.
+
+    The variables are, in order: x[i, j, k] (courier i moves from location j to location k, origin included), y[i, j]
+    (courier i visits location j), u[i, j] (MTZ variables, only with MTZ subtour elimination) and the maximum distance.
+    The sense of each row is "<" (at most) or "=".
+    """
+    def __init__(self, m, n, li, sj, Di_j, subtour_elimination="mtz", compatible=None, arc_mask=None,
+                 symmetries=None):
+        """
+        Build the formulation of an instance.
+
+        :param m: int - number of couriers
+        :param n: int - number of items
+        :param li: list(int) - maximum load of each courier
+        :param sj: list(int) - size of each item
+        :param Di_j: list(list(int)) - distances between each two locations (the origin is the last one)
+        :param subtour_elimination: str - mtz to include the MTZ variables and constraints, lazy to leave subtour
+                                    elimination to the cuts of subtour_cuts
+        :param compatible: ndarray - items each courier can carry (see preprocessing.preprocess), all if not given
+        :param arc_mask: ndarray - arcs each courier may travel (see preprocessing.preprocess), all if not given
+        :param symmetries: dict - symmetries of the instance to break (see symmetry.detect_symmetries), none if not
+                           given: a start solution must satisfy the constraints (see symmetry.canonical_routes)
+        """
+        self.m = m
+        self.n = n
+        self.distances = np.asarray(Di_j)
+        self.subtour_elimination = subtour_elimination
+
+        # Number of locations (items and origin)
+        L = n + 1
+        self.n_x = m * L * L
+        self.n_y = m * n
+        self.n_u = m * L if subtour_elimination == "mtz" else 0
+        self.n_variables = self.n_x + self.n_y + self.n_u + 1
+
+        # Position of the first variable of each kind (x[i, j, k] is at i * L * L + j * L + k, y[i, j] at i * n + j)
+        self.y_offset = self.n_x
+        self.u_offset = self.n_x + self.n_y
+        self.objective_index = self.n_variables - 1
+
+        # Minimize the maximum distance
+        self.c = np.zeros(self.n_variables)
+        self.c[self.objective_index] = 1
+
+        # Binary x and y, non-negative integer u and maximum distance
+        self.lb = np.zeros(self.n_variables)
+        self.ub = np.full(self.n_variables, np.inf)
+        self.ub[:self.u_offset] = 1
+        self.integrality = np.ones(self.n_variables)
+
+        # The arcs and items pruned by the preprocessing are fixed to 0, and dropped by the presolve of the solver
+        if arc_mask is not None:
+            self.ub[:self.n_x][~np.asarray(arc_mask).ravel()] = 0
+        if compatible is not None:
+            self.ub[self.y_offset:self.u_offset][~np.asarray(compatible).ravel()] = 0
+
+        # Coefficients of a single courier, repeated for each courier
+        couriers = sp.identity(m, format="csr")
+
+        def per_courier(rows, cols, values, shape):
+            return sp.kron(couriers, sp.csr_matrix((values, (rows, cols)), shape=shape), format="csr")
+
+        blocks, senses, rhs = list(), list(), list()
+
+        def add(sense, value, x=None, y=None, u=None, objective=None):
+            # Rows with the given coefficients of each kind of variables (none if not given)
+            n_rows = next(block.shape[0] for block in (x, y, u, objective) if block is not None)
+            row = [
+                sp.csr_matrix(block) if block is not None else sp.csr_matrix((n_rows, width))
+                for block, width in ((x, self.n_x), (y, self.n_y), (u, self.n_u), (objective, 1))
+            ]
+            blocks.append(sp.hstack(row, format="csr"))
+            senses.append(np.full(n_rows, sense))
+            rhs.append(np.broadcast_to(value, n_rows))
+
+        # Distance of each courier is at most the maximum distance
+        add("<", 0, x=sp.kron(couriers, self.distances.reshape(1, -1)), objective=-np.ones((m, 1)))
+
+        # Assignment constraints only exactly one visit per location
+        add("=", 1, y=sp.kron(np.ones((1, m)), sp.identity(n)))
+
+        # Linking constraint, limits a courier to a single y variable per location it arrives to or departs from
+        j, k = np.nonzero(~np.eye(n, L, dtype=bool))
+        add("=", 0, x=per_courier(j, j * L + k, np.ones(len(j)), (n, L * L)), y=-sp.identity(m * n))
+
+        k, j = np.nonzero(~np.eye(n, L, dtype=bool))
+        add("=", 0, x=per_courier(k, j * L + k, np.ones(len(k)), (n, L * L)), y=-sp.identity(m * n))
+
+        # Load capacity constraint (for number of couriers)
+        add("<", np.asarray(li), y=sp.kron(couriers, np.asarray(sj).reshape(1, -1)))
+
+        # MTZ constraint: u[i, j] - u[i, k] + n * x[i, j, k] <= n - 1, for j an item and k any other location
+        if subtour_elimination == "mtz":
+            j, k = np.nonzero(~np.eye(n, L, dtype=bool))
+            rows = np.arange(len(j))
+            mtz_u = per_courier(np.concatenate((rows, rows)), np.concatenate((j, k)),
+                                np.concatenate((np.ones(len(j)), -np.ones(len(j)))), (len(j), L))
+            mtz_x = per_courier(rows, j * L + k, np.full(len(j), n), (len(j), L * L))
+            add("<", n - 1, x=mtz_x, u=mtz_u)
+
+        # Ensure for each courier that they leave origin and come back to it exactly once
+        locations = np.arange(L)
+        add("=", 1, x=per_courier(np.zeros(L, dtype=int), n * L + locations, np.ones(L), (1, L * L)))
+        add("=", 1, x=per_courier(np.zeros(L, dtype=int), locations * L + n, np.ones(L), (1, L * L)))
+
+        if symmetries is not None:
+            # Of two couriers with the same capacity, the first item either of them visits is visited by the lower
+            # numbered one: y[i2, t] <= sum(y[i1, t'] for t' < t)
+            earlier_t, earlier_t2 = np.nonzero(np.tril(np.ones((n, n), dtype=bool), -1))
+            for group in symmetries["identical_capacities"]:
+                for i1, i2 in zip(group[:-1], group[1:]):
+                    rows = np.concatenate((np.arange(n), earlier_t))
+                    cols = np.concatenate((i2 * n + np.arange(n), i1 * n + earlier_t2))
+                    values = np.concatenate((np.ones(n), -np.ones(len(earlier_t))))
+                    add("<", 0, y=sp.csr_matrix((values, (rows, cols)), shape=(n, self.n_y)))
+
+            # Of two interchangeable items j < k, j is visited by a courier numbered no higher than the courier of k:
+            # y[i, j] <= sum(y[i', k] for i' >= i)
+            later_i, later_i2 = np.nonzero(np.triu(np.ones((m, m), dtype=bool)))
+            for group in symmetries["interchangeable_items"]:
+                for j, k in zip(group[:-1], group[1:]):
+                    rows = np.concatenate((np.arange(m), later_i))
+                    cols = np.concatenate((np.arange(m) * n + j, later_i2 * n + k))
+                    values = np.concatenate((np.ones(m), -np.ones(len(later_i))))
+                    add("<", 0, y=sp.csr_matrix((values, (rows, cols)), shape=(m, self.n_y)))
+
+            # With symmetric distances, each route goes from its lower numbered end (the origin counting as n): the
+            # first location is at most the last one
+            if symmetries["symmetric_distances"]:
+                add("<", 0, x=per_courier(np.zeros(2 * L, dtype=int),
+                                          np.concatenate((n * L + locations, locations * L + n)),
+                                          np.concatenate((locations, -locations)), (1, L * L)))
+
+        self.A = sp.vstack(blocks, format="csr")
+        self.sense = np.concatenate(senses)
+        self.rhs = np.concatenate(rhs).astype(float)
+
+    def x_index(self, i, j, k):
+        """
+        :return: int - position of the variable x[i, j, k]
+        """
+        L = self.n + 1
+        return (i * L + j) * L + k
+
+    def start_values(self, initial_routes):
+        """
+        Values of all the variables for the routes of a heuristic solution.
+
+        :param initial_routes: list(list(int)) - locations (0-based, origin included at both ends) of each courier
+        :return: ndarray - one value per variable
+        """
+        L = self.n + 1
+        values = np.zeros(self.n_variables)
+        for i, route in enumerate(initial_routes):
+            for position, (j, k) in enumerate(zip(route[:-1], route[1:])):
+                values[self.x_index(i, j, k)] = 1
+                if k != self.n:
+                    values[self.y_offset + i * self.n + k] = 1
+                    if self.n_u:
+                        values[self.u_offset + i * L + k] = position + 1
+
+            # The origin comes after all the items in the MTZ order: the MTZ rows of the arcs back to it need its
+            # position to exceed that of the last item
+            if self.n_u:
+                values[self.u_offset + i * L + self.n] = len(route) - 1
+
+        values[self.objective_index] = self.objective(values)
+
+        return values
+
+    def is_feasible(self, values):
+        """
+        :param values: ndarray - one value per variable
+        :return: bool - whether the values satisfy all the constraints and bounds
+        """
+        lhs = self.A @ values
+        rows_satisfied = np.where(self.sense == "=", np.isclose(lhs, self.rhs), lhs <= self.rhs + 1e-6)
+
+        return bool(rows_satisfied.all() and (values >= self.lb).all() and (values <= self.ub).all())
+
+    def arcs(self, values):
+        """
+        :param values: ndarray - one value per variable
+        :return: list(list((int, int))) - arcs travelled by each courier
+        """
+        x = np.asarray(values[:self.n_x]).reshape(self.m, self.n + 1, self.n + 1) > 0.5
+
+        return [[(j, k) for j, k in np.argwhere(x[i]).tolist()] for i in range(self.m)]
+
+    def objective(self, values):
+        """
+        :param values: ndarray - one value per variable
+        :return: int - distance travelled by the courier going farthest
+        """
+        x = np.asarray(values[:self.n_x]).reshape(self.m, -1) > 0.5
+
+        return int((x @ self.distances.ravel()).max())
+
+    def routes(self, values):
+        """
+        :param values: ndarray - one value per variable
+        :return: list(list(int)) - items (1-based, as in the output format) delivered by each courier, in order
+        """
+        return routes_from_arcs(self.arcs(values), self.n)
+
+    def subtour_cuts(self, values):
+        """
+        Subtour elimination cuts violated by a solution: for every cycle not going through the origin, each courier
+        travels at most one arc less than the number of its locations.
+
+        :param values: ndarray - one value per variable
+        :return: (csr_matrix, ndarray) - rows and right-hand sides (at most) of the cuts, None if there are none
+        """
+        rows, cols, rhs = list(), list(), list()
+        for arcs in self.arcs(values):
+            for cycle in subtours({j: k for j, k in arcs if j != k}, self.n):
+                for i in range(self.m):
+                    cols.extend(self.x_index(i, j, k) for j in cycle for k in cycle if j != k)
+                    rows.extend([len(rhs)] * (len(cycle) * (len(cycle) - 1)))
+                    rhs.append(len(cycle) - 1)
+
+        if not rhs:
+            return None
+
+        cuts = sp.csr_matrix((np.ones(len(cols)), (rows, cols)), shape=(len(rhs), self.n_variables))
+
+        return cuts, np.asarray(rhs, dtype=float)
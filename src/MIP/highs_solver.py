@@ -0,0 +1,82 @@
+import numpy as np
+import scipy.sparse as sp
+
+from scipy.optimize import Bounds, LinearConstraint, milp
+from timeit import default_timer as timer
+
+
+def solve_highs(formulation, time_limit=285, initial_routes=None, lower_bound=None):
+    """
+    Solve a MIP formulation with HiGHS, through scipy.optimize.milp.
+
+    milp takes no starting solution: a feasible heuristic solution bounds the objective instead, and is kept as the
+    incumbent if HiGHS finds nothing better within the time limit. With lazy subtour elimination the model is solved
+    again, with the violated subtour cuts, until its solution has no subtours or the time runs out.
+    A lower bound of the objective tightens its bounds, and stops the search as soon as a solution reaches it.
+
+    :param formulation: MIPFormulation - the formulation of the instance
+    :param time_limit: float - time limit for solving (s)
+    :param initial_routes: list(list(int)) - heuristic solution (locations 0-based, origin included at both ends)
+    :param lower_bound: int - lower bound of the objective (see bounds.objective_lower_bound), none if not given
+    :return: dict - optimal, obj and routes of the best solution found (obj None if there is none)
+    """
+    result_dict = {
+        "optimal": False,
+        "obj": None,
+        "routes": list()
+    }
+
+    lb = formulation.lb.copy()
+    ub = formulation.ub.copy()
+    if lower_bound is not None:
+        lb[formulation.objective_index] = max(lb[formulation.objective_index], lower_bound)
+    if initial_routes is not None:
+        start = formulation.start_values(initial_routes)
+        if formulation.is_feasible(start):
+            result_dict["obj"] = formulation.objective(start)
+            result_dict["routes"] = formulation.routes(start)
+            ub[formulation.objective_index] = result_dict["obj"]
+
+    # The heuristic solution is already optimal
+    if result_dict["obj"] is not None and result_dict["obj"] <= lb[formulation.objective_index]:
+        result_dict["optimal"] = True
+        return result_dict
+
+    A = formulation.A
+    row_lb = np.where(formulation.sense == "=", formulation.rhs, -np.inf)
+    row_ub = formulation.rhs
+
+    start_time = timer()
+    while True:
+        remaining_time = time_limit - (timer() - start_time)
+        if remaining_time <= 0:
+            break
+
+        res = milp(
+            formulation.c,
+            integrality=formulation.integrality,
+            bounds=Bounds(lb, ub),
+            constraints=LinearConstraint(A, row_lb, row_ub),
+            options={"time_limit": remaining_time, "disp": False}
+        )
+        if res.x is None:
+            # Nothing better than the heuristic solution (proven if HiGHS finished)
+            result_dict["optimal"] = res.status == 2 and result_dict["obj"] is not None
+            break
+
+        # Cut off the subtours of the solution, and solve again
+        cuts = formulation.subtour_cuts(res.x)
+        if cuts is not None:
+            A = sp.vstack((A, cuts[0]), format="csr")
+            row_lb = np.concatenate((row_lb, np.full(len(cuts[1]), -np.inf)))
+            row_ub = np.concatenate((row_ub, cuts[1]))
+            continue
+
+        obj = formulation.objective(res.x)
+        if result_dict["obj"] is None or obj <= result_dict["obj"]:
+            result_dict["obj"] = obj
+            result_dict["routes"] = formulation.routes(res.x)
+        result_dict["optimal"] = res.status == 0 or result_dict["obj"] <= lb[formulation.objective_index]
+        break
+
+    return result_dict
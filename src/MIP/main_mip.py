@@ -1,82 +1,26 @@
 # Importing all necessary libraries
-import json
 import math
 import os
 
-import gurobipy as gp
-
-from gurobipy import GRB
 from timeit import default_timer as timer
 
-
-def import_data(path):
-    with open(path, 'r') as f:
-        lines = [line.strip() for line in f]
-
-        # Assign the first line to the m variable (Couriers)
-        m = int(lines[0])
-
-        # Assign the second line to the n variable (Locations)
-        n = int(lines[1])
-
-        # Assign the third line to the li variable (Couriers' maximum load)
-        li = [int(x) for x in lines[2].split()]
-
-        # Assign the fourth line to the sj variable (Load sizes)
-        sj = [int(x) for x in lines[3].split()]
-
-        # Assign the remaining lines to the Di_j variable (Distances between locations)
-        Di_j = []
-        for line in lines[4:]:
-            Di_j.append([int(x) for x in line.split()])
-
-    return m, n, li, sj, Di_j
-
-
-def nearest_neighbor_heuristic(Di_j, m, n, sj, li):
-    routes = []
-    unvisited_locations = set(range(n))
-    max_distances = [0] * m
-    current_load = [0] * m
-
-    for i in range(m):
-        # Sets depot as starting location
-        start = [n]
-        routes.append(start)
-
-    while unvisited_locations:
-        nearest_neighbors = {}
-        for i in range(m):
-            current_location = routes[i][-1]
-            feasible_neighbors = [j for j in unvisited_locations if current_load[i] + sj[j] <= li[i]]
-
-            if not feasible_neighbors:
-                continue  # Skip to the next courier if no feasible neighbors
-
-            # Finds next location that minimizes distance travelled by courier i
-            best_customer = min(feasible_neighbors, key=lambda j: max_distances[i] + Di_j[current_location][j])
-            nearest_neighbors[i] = best_customer
-
-        if not nearest_neighbors:
-            break  # Break the loop if no feasible neighbors for any courier
-
-        # Finds next location that minimizes the maximum distance travelled by any courier
-        closest_courier = min(
-            nearest_neighbors.keys(),
-            key=lambda j: Di_j[routes[j][-1]][nearest_neighbors[j]] + max_distances[j])
-
-        # Update the current demand for the selected courier
-        current_load[closest_courier] += sj[nearest_neighbors[closest_courier]]
-
-        max_distances[closest_courier] += Di_j[routes[closest_courier][-1]][nearest_neighbors[closest_courier]]
-
-        routes[closest_courier].append(nearest_neighbors[closest_courier])
-        # Removes the nearest neighbor from list of available locations
-        unvisited_locations.remove(nearest_neighbors[closest_courier])
-
-    # Return to the depot
-    [route.append(n) for route in routes]
-    return routes
+from src.bounds import objective_lower_bound, optimality_gap
+from src.heuristics import heuristic_solution, nearest_neighbor_heuristic
+from src.io_utils import problem_to_lists, read_input_file, write_to_json
+from src.MIP.formulation import MIPFormulation
+from src.MIP.highs_solver import solve_highs
+from src.MIP.matrix_model import add_formulation, build_matrix_model
+from src.MIP.two_index_formulation import TwoIndexFormulation
+from src.preprocessing import preprocess
+from src.route_utils import arcs_from_values, routes_from_arcs, subtours
+from src.symmetry import canonical_routes, detect_symmetries
+
+# Gurobi is optional: without it, the formulations can still be solved with HiGHS
+try:
+    import gurobipy as gp
+    from gurobipy import GRB
+except ImportError:
+    gp = GRB = None
 
 
 def initialize_routes(initial_routes, m, x):
@@ -86,71 +30,53 @@ def initialize_routes(initial_routes, m, x):
             x[i, movement[0], movement[1]].start = 1
 
 
-def order_routes(route_list):
-    ordered_routes = []
-    first_transfer = max(route_list, key=lambda x: x[0])
-
-    # Remove the first_transfer from the original list
-    route_list.remove(first_transfer)
-
-    # Set first_transfer as first instance of the list
-    route_list.insert(0, first_transfer)
-
-    while route_list:
-        for i, route in enumerate(route_list):
-            # Checks that final destination and starting destination are the same
-            if not ordered_routes or route[0] == ordered_routes[-1][1]:
-                ordered_routes.append(route)
-                del route_list[i]
-                break
-    return ordered_routes
-
+def subtour_callback(model, where):
+    # Lazy subtour elimination: cut off the cycles not going through the origin in every new incumbent
+    if where != GRB.Callback.MIPSOL:
+        return
 
-def main_mip(instance):
-    # Setting Parameters to access Gurobi environment
-    params = {
-        "WLSACCESSID": 'a8ff319c-dbbd-4eb8-8e06-0aba81176e45',
-        "WLSSECRET": '318dbc76-0352-4577-93dc-b5a881ede973',
-        "LICENSEID": 2467001,
-    }
-    env = gp.Env(params=params)
-
-    # Create the model within the Gurobi environment
-    model = gp.Model(env=env)
+    m, n, x = model._m, model._n, model._x
+    keys = list(x.keys())
+    values = dict(zip(keys, model.cbGetSolution([x[key] for key in keys])))
+    for arcs in arcs_from_values(values, m):
+        for cycle in subtours({j: k for j, k in arcs if j != k}, n):
+            # The items of the cycle are left at most once less than their number, by every courier
+            for i2 in range(m):
+                model.cbLazy(gp.quicksum(x[i2, j, k] for j in cycle for k in cycle if j != k) <= len(cycle) - 1)
 
-    m, n, li, sj, Di_j = import_data("data/problem_instances/inst%02d.dat" % (instance, ))
-
-    start_time = timer()
 
-    # Sets time limit
-    model.setParam("TimeLimit", 285)
+def build_loop_model(model, m, n, li, sj, Di_j, subtour_elimination="mtz", compatible=None, arc_mask=None,
+                     symmetries=None):
+    """
+    Add the variables, constraints and objective of the three-index formulation to a Gurobi model, one at a time.
+    The arcs and items pruned by the preprocessing (compatible and arc_mask, see preprocessing.preprocess) are fixed
+    to 0, and the symmetries given (see symmetry.detect_symmetries) are broken as in formulation.MIPFormulation.
 
+    :return: dict((int, int, int) -> Var) - the variable x[i, j, k] of each courier and pair of locations
+    """
     # Binary variable, if x = 1, then courier i has moved from location j to location k (includes origin)
     x = {}
     for i in range(m):
         for j in range(n + 1):
             for k in range(n + 1):
-                x[i, j, k] = model.addVar(vtype=GRB.BINARY, name=f"x_{i}_{j}_{k}")
-
-    # Turn on/off whether the model uses a heuristic based warm start
-    heuristic = True
-    if heuristic:
-        # Warm starts initial solution using nearest neighbor heuristic
-        initial_routes = nearest_neighbor_heuristic(Di_j, m, n, sj, li)
-        # Sets x[i, j, k] = 1 start values according to initial routes found using the NN heuristic
-        initialize_routes(initial_routes, m, x)
+                x[i, j, k] = model.addVar(
+                    vtype=GRB.BINARY, ub=1 if arc_mask is None or arc_mask[i, j, k] else 0, name=f"x_{i}_{j}_{k}"
+                )
 
     # Binary variable, if y = 1, then courier i has visited location j
     y = {}
     for i in range(m):
         for j in range(n):
-            y[i, j] = model.addVar(vtype=GRB.BINARY, name=f"y_{i}_{j}")
+            y[i, j] = model.addVar(
+                vtype=GRB.BINARY, ub=1 if compatible is None or compatible[i, j] else 0, name=f"y_{i}_{j}"
+            )
 
     # Integer MTZ variable
     u = {}
-    for i in range(m):
-        for j in range(n + 1):
-            u[i, j] = model.addVar(vtype=GRB.INTEGER)
+    if subtour_elimination == "mtz":
+        for i in range(m):
+            for j in range(n + 1):
+                u[i, j] = model.addVar(vtype=GRB.INTEGER)
 
     # Initialize variable to be used in the objective function
     max_distance = model.addVar(vtype=GRB.INTEGER)
@@ -179,12 +105,13 @@ def main_mip(instance):
     for i in range(m):
         model.addConstr(gp.quicksum(sj[j] * y[i, j] for j in range(n)) <= li[i], f"courier_capacity_{i}")
 
-    # MTZ constraint
-    for i in range(m):
-        for j in range(n + 1):
-            for k in range(n + 1):
-                if j != n and j != k:
-                    model.addConstr(u[i, j] - u[i, k] + n * x[i, j, k] <= n - 1)
+    # MTZ constraint (with lazy subtour elimination, the cuts are added by the callback)
+    if subtour_elimination == "mtz":
+        for i in range(m):
+            for j in range(n + 1):
+                for k in range(n + 1):
+                    if j != n and j != k:
+                        model.addConstr(u[i, j] - u[i, k] + n * x[i, j, k] <= n - 1)
 
     # Ensure for each courier that they leave origin and come back to it exactly once
     for i in range(m):
@@ -193,87 +120,254 @@ def main_mip(instance):
     for i in range(m):
         model.addConstr(gp.quicksum(x[i, j, n] for j in range(n + 1)) == 1, name=f'courier_flow_end_{i}')
 
+    if symmetries is not None:
+        # Of two couriers with the same capacity, the first item either of them visits is visited by the lower
+        # numbered one
+        for group in symmetries["identical_capacities"]:
+            for i1, i2 in zip(group[:-1], group[1:]):
+                for j in range(n):
+                    model.addConstr(y[i2, j] <= gp.quicksum(y[i1, j2] for j2 in range(j)), f"courier_order_{i2}_{j}")
+
+        # Of two interchangeable items, the lower numbered one is visited by a courier numbered no higher
+        for group in symmetries["interchangeable_items"]:
+            for j, k in zip(group[:-1], group[1:]):
+                for i in range(m):
+                    model.addConstr(y[i, j] <= gp.quicksum(y[i2, k] for i2 in range(i, m)), f"item_order_{i}_{j}")
+
+        # With symmetric distances, each route goes from its lower numbered end (the origin counting as n)
+        if symmetries["symmetric_distances"]:
+            for i in range(m):
+                first = gp.quicksum(k * x[i, n, k] for k in range(n + 1))
+                last = gp.quicksum(j * x[i, j, n] for j in range(n + 1))
+                model.addConstr(first <= last, f"route_direction_{i}")
+
     # Flow constraint, each courier must visit a location and then move to visit another location
     for i in range(m):
         for j in range(n):
             model.addConstr(gp.quicksum(x[i, j, k] for k in range(n)) - gp.quicksum(x[i, j, k] for k in range(n)) == 0,
                             name=f'flow_conservation_{i}_{j}')
 
+    return x
+
+
+def gurobi_env():
+    """
+    Gurobi environment. The WLS licence is read from the GUROBI_WLSACCESSID, GUROBI_WLSSECRET and GUROBI_LICENSEID
+    environment variables when they are set, otherwise Gurobi looks for its licence file (gurobi.lic) as usual.
+    """
+    if gp is None:
+        raise ImportError("gurobipy is not installed: use the HiGHS solver (the MIP_HIGHS methods) instead")
+
+    params = dict()
+    if "GUROBI_WLSACCESSID" in os.environ:
+        params = {
+            "WLSACCESSID": os.environ["GUROBI_WLSACCESSID"],
+            "WLSSECRET": os.environ["GUROBI_WLSSECRET"],
+            "LICENSEID": int(os.environ["GUROBI_LICENSEID"]),
+        }
+
+    return gp.Env(params=params)
+
+
+def solve_gurobi(m, n, li, sj, Di_j, time_limit=285, initial_routes=None, subtour_elimination="mtz",
+                 builder="matrix", lower_bound=None, compatible=None, arc_mask=None, symmetries=None):
+    """
+    Solve an instance with Gurobi.
+
+    :param time_limit: float - time limit for solving (s)
+    :param initial_routes: list(list(int)) - heuristic solution (locations 0-based, origin included at both ends)
+    :param subtour_elimination: str - mtz or lazy, as in main_mip
+    :param builder: str - matrix or loops, as in main_mip
+    :param lower_bound: int - lower bound of the objective, Gurobi stops as soon as it finds a solution reaching it
+    :param compatible: ndarray - items each courier can carry (see preprocessing.preprocess), all if not given
+    :param arc_mask: ndarray - arcs each courier may travel (see preprocessing.preprocess), all if not given
+    :param symmetries: dict - symmetries of the instance to break (see symmetry.detect_symmetries), none if not given
+    :return: dict - optimal, obj and routes of the best solution found (obj None if there is none)
+    """
+    # Create the model within the Gurobi environment (which raises if Gurobi is not installed)
+    env = gurobi_env()
+    model = gp.Model(env=env)
+
+    # Sets time limit, and stops at the lower bound
+    model.setParam("TimeLimit", time_limit)
+    if lower_bound is not None:
+        model.setParam("BestObjStop", lower_bound)
+
+    # Build the model
+    if builder == "matrix":
+        x = build_matrix_model(model, m, n, li, sj, Di_j, subtour_elimination, compatible, arc_mask, symmetries)
+    else:
+        x = build_loop_model(model, m, n, li, sj, Di_j, subtour_elimination, compatible, arc_mask, symmetries)
+
+    if initial_routes is not None:
+        # Sets x[i, j, k] = 1 start values according to the initial routes found by the heuristic
+        initialize_routes(initial_routes, m, x)
+
+    if subtour_elimination == "lazy":
+        model._m, model._n, model._x = m, n, x
+        model.setParam("LazyConstraints", 1)
+        model.optimize(subtour_callback)
+    else:
+        model.optimize()
+
+    def solution_paths():
+        # Routes of the couriers, from the values of all the x variables read at once
+        keys = list(x.keys())
+        values = dict(zip(keys, model.getAttr("X", [x[key] for key in keys])))
+        return routes_from_arcs(arcs_from_values(values, m), n)
+
+    result_dict = {
+        "optimal": model.status == GRB.OPTIMAL,
+        "obj": None,
+        "routes": list()
+    }
+    if model.SolCount > 0:
+        result_dict["obj"] = int(round(model.objVal))
+        result_dict["routes"] = solution_paths()
+        result_dict["optimal"] |= lower_bound is not None and result_dict["obj"] <= lower_bound
+
+    return result_dict
+
+
+def solve_gurobi_formulation(formulation, time_limit=285, initial_routes=None, lower_bound=None):
+    """
+    Solve a sparse MIP formulation with Gurobi, starting from the heuristic solution.
+
+    :param formulation: MIPFormulation - the formulation of the instance
+    :param time_limit: float - time limit for solving (s)
+    :param initial_routes: list(list(int)) - heuristic solution (locations 0-based, origin included at both ends)
+    :param lower_bound: int - lower bound of the objective, Gurobi stops as soon as it finds a solution reaching it
+    :return: dict - optimal, obj and routes of the best solution found (obj None if there is none)
+    """
+    # The environment raises if Gurobi is not installed
+    env = gurobi_env()
+    model = gp.Model(env=env)
+    model.setParam("TimeLimit", time_limit)
+    if lower_bound is not None:
+        model.setParam("BestObjStop", lower_bound)
+
+    v = add_formulation(model, formulation)
+    if initial_routes is not None:
+        v.Start = formulation.start_values(initial_routes)
+
     model.optimize()
 
+    result_dict = {
+        "optimal": model.status == GRB.OPTIMAL,
+        "obj": None,
+        "routes": list()
+    }
+    if model.SolCount > 0:
+        values = v.X
+        result_dict["obj"] = formulation.objective(values)
+        result_dict["routes"] = formulation.routes(values)
+        result_dict["optimal"] |= lower_bound is not None and result_dict["obj"] <= lower_bound
+
+    return result_dict
+
+
+def main_mip(instance, subtour_elimination="mtz", builder="matrix", solver="gurobi", formulation="three_index"):
+    """
+    Solve an instance with the MIP model and write the results to the json file.
+
+    :param instance: int - number of the instance
+    :param subtour_elimination: str - mtz to add all the MTZ constraints up front, lazy to add only the subtour cuts
+                                violated by the incumbents (through a lazy constraint callback with Gurobi, by solving
+                                again with the cuts with HiGHS)
+    :param builder: str - matrix to build the Gurobi model with the matrix API (matrix_model.build_matrix_model),
+                    loops to add the variables and constraints one at a time (build_loop_model)
+    :param solver: str - gurobi, or highs to solve the sparse formulation (formulation.MIPFormulation) with HiGHS,
+                   which needs no licence
+    :param formulation: str - three_index for an arc variable per courier and pair of locations, two_index for arcs
+                        shared by all the couriers (two_index_formulation.TwoIndexFormulation, which ignores
+                        subtour_elimination and builder)
+    """
+    problem = read_input_file("data/problem_instances/inst%02d.dat" % (instance, ))
+    m, n, li, sj, Di_j = problem_to_lists(problem)
+
+    start_time = timer()
+
+    # Lower bound of the objective, to stop as soon as a solution reaches it
+    lower_bound = objective_lower_bound(problem)
+
+    # Symmetries of the instance, broken by the formulations
+    symmetries = detect_symmetries(problem)
+
+    # Turn on/off whether the model uses a heuristic based warm start
+    heuristic = True
+    initial_routes = None
+    upper_bound = None
+    if heuristic:
+        # Warm starts initial solution using the heuristic improved by local search (origin added at both ends), or
+        # the nearest neighbor heuristic when it can't place all the items
+        routes, upper_bound = heuristic_solution(problem)
+        if routes is not None:
+            # Made to satisfy the symmetry breaking constraints, in the order of the couriers of the formulation
+            routes = canonical_routes(
+                routes, symmetries, courier_order="first_item" if formulation == "two_index" else "assignment"
+            )
+            initial_routes = [[n] + route + [n] for route in routes]
+        else:
+            initial_routes = nearest_neighbor_heuristic(Di_j, m, n, sj, li)
+
+    # Items each courier can carry, and arcs each courier may travel in a solution no worse than the heuristic one
+    compatible, arc_mask = preprocess(problem, upper_bound)
+
+    if solver == "highs" or formulation == "two_index":
+        if formulation == "two_index":
+            mip_formulation = TwoIndexFormulation(
+                m, n, li, sj, Di_j, compatible=compatible, arc_mask=arc_mask, symmetries=symmetries,
+                upper_bound=upper_bound, lower_bound=lower_bound
+            )
+        else:
+            mip_formulation = MIPFormulation(m, n, li, sj, Di_j, subtour_elimination, compatible, arc_mask, symmetries)
+
+        solve = solve_highs if solver == "highs" else solve_gurobi_formulation
+        result_dict = solve(mip_formulation, time_limit=285, initial_routes=initial_routes, lower_bound=lower_bound)
+    else:
+        result_dict = solve_gurobi(m, n, li, sj, Di_j, time_limit=285, initial_routes=initial_routes,
+                                   subtour_elimination=subtour_elimination, builder=builder, lower_bound=lower_bound,
+                                   compatible=compatible, arc_mask=arc_mask, symmetries=symmetries)
+
     end_time = timer()
 
     time = end_time - start_time
 
     # Print the solution and prepares data for the JSON file
-    if model.status == GRB.OPTIMAL:
+    paths = result_dict["routes"]
+    if result_dict["optimal"]:
         is_optimal = True
-        routes = []
         print("\nOptimal solution found:")
-        for i in range(m):
-            route = []
-            for j in range(n + 1):
-                for k in range(n + 1):
-                    if x[i, j, k].x > 0.5:
-                        route.append((j + 1, k + 1))
+        for i, route in enumerate(paths):
             print(f"Courier {i + 1}: {route}")
-            routes.append(route)
-        print("\nTotal distance:", model.objVal)
-        result = model.objVal
+        print("\nTotal distance:", result_dict["obj"])
+        result = result_dict["obj"]
     else:
         is_optimal = False
         time = 300
         result = 0
-        routes = []
-        if model.objVal <= 10000:
-            for i in range(m):
-                route = []
-                for j in range(n + 1):
-                    for k in range(n + 1):
-                        if x[i, j, k].x > 0.5:
-                            route.append((j + 1, k + 1))
-                print(f"Courier {i + 1}: {route}")
-                routes.append(route)
-            result = model.objVal
-        print("No solution found.")
-
-    paths = []
-    for route in routes:
-        ordered_destinations = order_routes(route)
-        path = []
-        for r in ordered_destinations[:-1]:
-            path.append(r[1])
-        paths.append(path)
-
-    # Prepare directories if they don't exist yet
-    if not os.path.exists("res"):
-        os.mkdir("res")
-    if not os.path.exists(os.path.join("res", "MIP")):
-        os.mkdir(os.path.join("res", "MIP"))
-
-    # Prepare json path
-    json_file_path = os.path.join("res", "MIP", "%02d" % (instance, ) + ".json")
-
-    # Read existing data from the json
-    if os.path.exists(json_file_path):
-        with open(json_file_path, "r") as f:
-            loaded_data = json.load(f)
-    else:
-        loaded_data = dict()
+        if result_dict["obj"] is not None:
+            result = result_dict["obj"]
+            print("\nBest solution found, not proven optimal:", result)
+        else:
+            paths = []
+            print("No solution found.")
 
     experiment_name = "Heuristic" if heuristic else "No Heuristic"
+    if formulation == "two_index":
+        experiment_name += " (two-index)"
+    elif subtour_elimination == "lazy":
+        experiment_name += " (lazy)"
+    if solver == "highs":
+        experiment_name += " (HiGHS)"
     data = {
         experiment_name: {
             "time": int(math.floor(time)),
             "optimal": True if is_optimal else False,
             "obj": int(result),
-            "sol": paths
+            "sol": paths,
+            "gap": optimality_gap(result_dict["obj"], lower_bound, is_optimal)
         }
     }
 
-    for key in data.keys():
-        loaded_data[key] = data[key]
-
-    # Creates JSON file with associated data
-    with open(json_file_path, "w") as json_file:
-        json.dump(loaded_data, json_file, indent=4)
+    write_to_json(data, instance, "MIP")
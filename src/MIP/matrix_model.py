@@ -0,0 +1,54 @@
+import numpy as np
+
+from src.MIP.formulation import MIPFormulation
+
+# Gurobi is optional (see main_mip.gurobi_env): the models given here are Gurobi models whenever it is used
+try:
+    from gurobipy import GRB
+except ImportError:
+    GRB = None
+
+
+def add_formulation(model, formulation):
+    """
+    Add a sparse MIP formulation (formulation.MIPFormulation or two_index_formulation.TwoIndexFormulation) to a
+    Gurobi model through the matrix API: all the variables are a single MVar, and all the constraints are added in a
+    single call.
+
+    :return: MVar - the variables of the formulation, in its order
+    """
+    # Binary, integer or continuous variables
+    vtype = np.where(
+        formulation.integrality == 0,
+        GRB.CONTINUOUS,
+        np.where((formulation.lb == 0) & (formulation.ub == 1), GRB.BINARY, GRB.INTEGER)
+    )
+    v = model.addMVar(formulation.n_variables, lb=formulation.lb, ub=formulation.ub, obj=formulation.c, vtype=vtype)
+    model.ModelSense = GRB.MINIMIZE
+
+    sense = np.where(formulation.sense == "=", GRB.EQUAL, GRB.LESS_EQUAL)
+    model.addMConstr(formulation.A, v, sense, formulation.rhs)
+
+    return v
+
+
+def build_matrix_model(model, m, n, li, sj, Di_j, subtour_elimination="mtz", compatible=None, arc_mask=None,
+                       symmetries=None):
+    """
+    Add the three-index formulation of main_mip.build_loop_model to a Gurobi model through the matrix API, with the
+    sparse coefficient matrix of formulation.MIPFormulation.
+    (The flow conservation constraints of build_loop_model are identically zero and are left out.)
+
+    :return: dict((int, int, int) -> Var) - the variable x[i, j, k] of each courier and pair of locations
+    """
+    formulation = MIPFormulation(m, n, li, sj, Di_j, subtour_elimination, compatible, arc_mask, symmetries)
+    v = add_formulation(model, formulation)
+
+    # The variables x one by one, as built by build_loop_model
+    model.update()
+    variables = v.tolist()
+
+    return {
+        (i, j, k): variables[formulation.x_index(i, j, k)]
+        for i in range(m) for j in range(n + 1) for k in range(n + 1)
+    }
@@ -0,0 +1,216 @@
+import numpy as np
+import scipy.sparse as sp
+
+from src.bounds import courier_distance_upper_bounds, objective_lower_bound
+from src.heuristics import route_distance
+from src.MCPProblem import MCPProblem
+from src.MIP.formulation import MIPFormulation
+
+
+class TwoIndexFormulation(MIPFormulation):
+    """
+    Two-index MIP formulation of an instance as sparse matrices, with the same interface as MIPFormulation.
+
+    The arcs are shared by all the couriers: the nodes are the items, a start node for each courier (n + i for
+    courier i) and a single end node (n + m), the last two both standing for the origin. A courier is identified by
+    the start node its route leaves from, and its capacity and distance are carried along the route by flow variables:
+    q[j], the load the courier can still carry after delivering item j, and t[j], the distance it travelled to reach
+    item j. The variables are, in order: x (one per arc), q, t, the positions of the items (only when some item has
+    size 0, since otherwise the load flow already rules out subtours) and the maximum distance.
+
+    The number of arc variables is n^2 + (m + 1) * n + m, instead of m * (n + 1)^2. Couriers with the same capacity
+    still give symmetric solutions when they exchange their routes: with the symmetries of the instance (see
+    symmetry.detect_symmetries), they are ordered by the first item of their routes (the start of an unused courier
+    counting as n). The other symmetries are left alone, since the routes are not tied to their couriers past their
+    first arc. The subtour_elimination argument is accepted for the same interface but ignored, and so is the
+    compatibility mask, already enforced by the load flow.
+    The arcs pruned by the preprocessing (see preprocessing.py) are left out: an arc between items when no courier may
+    travel it, from the start of a courier to an item when that courier may not go there from the origin, and from an
+    item to the end when no courier may go back to the origin from it.
+    The bounds of the objective (the maximum distance of a heuristic solution, and objective_lower_bound) bound the
+    distance flows and the objective; without them, the longest route any courier could make and objective_lower_bound
+    are computed.
+    """
+    def __init__(self, m, n, li, sj, Di_j, subtour_elimination="mtz", compatible=None, arc_mask=None,
+                 symmetries=None, upper_bound=None, lower_bound=None):
+        self.m = m
+        self.n = n
+        self.distances = np.asarray(Di_j)
+        self.subtour_elimination = subtour_elimination
+
+        self.max_loads = np.asarray(li)
+        self.sizes = np.asarray(sj)
+
+        instance = MCPProblem(m, n, li, sj, self.distances)
+        if upper_bound is None:
+            upper_bound = max(courier_distance_upper_bounds(instance))
+        if lower_bound is None:
+            lower_bound = objective_lower_bound(instance)
+        li = self.max_loads
+        sj = self.sizes
+
+        # Arcs between items, from items to the end, from the starts to items, and from the starts to the end
+        end = n + m
+        j, k = np.nonzero(~np.eye(n, dtype=bool))
+        starts = np.repeat(np.arange(n, n + m), n)
+        self.tails = np.concatenate((j, np.arange(n), starts, np.arange(n, n + m)))
+        self.heads = np.concatenate((k, np.full(n, end), np.tile(np.arange(n), m), np.full(m, end)))
+        if arc_mask is not None:
+            arc_mask = np.asarray(arc_mask)
+            keep = np.concatenate((
+                arc_mask[:, j, k].any(axis=0),
+                arc_mask[:, :n, n].any(axis=0),
+                arc_mask[:, n, :n].ravel(),
+                np.ones(m, dtype=bool)
+            ))
+            self.tails, self.heads = self.tails[keep], self.heads[keep]
+        self.n_x = len(self.tails)
+
+        # Distance of each arc (the start and end nodes are at the origin)
+        arc_distances = self.distances[np.minimum(self.tails, n), np.minimum(self.heads, n)]
+
+        # Position of the first variable of each kind
+        self.q_offset = self.n_x
+        self.t_offset = self.q_offset + n
+        self.u_offset = self.t_offset + n
+        self.n_u = n if (sj == 0).any() else 0
+        self.objective_index = self.u_offset + self.n_u
+        self.n_variables = self.objective_index + 1
+
+        # Minimize the maximum distance
+        self.c = np.zeros(self.n_variables)
+        self.c[self.objective_index] = 1
+
+        # Binary x, integer positions and maximum distance, continuous flows
+        self.lb = np.zeros(self.n_variables)
+        self.ub = np.ones(self.n_variables)
+        self.ub[self.q_offset:self.t_offset] = li.max()
+        self.ub[self.t_offset:self.u_offset] = upper_bound
+        self.lb[self.u_offset:self.objective_index] = 1
+        self.ub[self.u_offset:self.objective_index] = n
+        self.lb[self.objective_index] = lower_bound
+        self.ub[self.objective_index] = upper_bound
+        self.integrality = np.ones(self.n_variables)
+        self.integrality[self.q_offset:self.u_offset] = 0
+
+        rows, cols, values, senses, rhs = list(), list(), list(), list(), list()
+
+        def add(sense, value, row_cols):
+            # One row per list of (column, coefficient) pairs
+            for row, row_value in zip(row_cols, np.broadcast_to(value, len(row_cols))):
+                rows.extend([len(rhs)] * len(row))
+                cols.extend(col for col, _ in row)
+                values.extend(coefficient for _, coefficient in row)
+                rhs.append(row_value)
+                senses.append(sense)
+
+        arcs = np.arange(self.n_x)
+        between_items = arcs[(self.tails < n) & (self.heads < n)]
+        from_starts = arcs[(self.tails >= n) & (self.heads < n)]
+        to_end = arcs[(self.tails < n) & (self.heads == end)]
+
+        # Each item is reached and left exactly once, and each courier leaves its start exactly once
+        add("=", 1, [[(a, 1) for a in arcs[self.heads == j]] for j in range(n)])
+        add("=", 1, [[(a, 1) for a in arcs[self.tails == j]] for j in range(n + m)])
+
+        # Load flow: the first item of courier i leaves it li[i] - sj[j], every next item sj[k] less
+        big_load = int(li.max())
+        add("<", [int(li[self.tails[a] - n] - sj[self.heads[a]] + big_load) for a in from_starts],
+            [[(self.q_offset + self.heads[a], 1), (a, big_load)] for a in from_starts])
+        add("<", [int(big_load - sj[self.heads[a]]) for a in between_items],
+            [[(self.q_offset + self.heads[a], 1), (self.q_offset + self.tails[a], -1), (a, big_load)]
+             for a in between_items])
+
+        # Distance flow: the first item is reached from the origin, every next item adds the distance of its arc
+        add("<", 0, [
+            [(a, int(self.distances[n, j])) for a in from_starts[self.heads[from_starts] == j]] + [(self.t_offset + j, -1)]
+            for j in range(n)
+        ])
+        add("<", upper_bound, [
+            [(self.t_offset + self.tails[a], 1), (self.t_offset + self.heads[a], -1),
+             (a, int(arc_distances[a]) + upper_bound)]
+            for a in between_items
+        ])
+
+        # Distance of each courier is at most the maximum distance
+        add("<", upper_bound, [
+            [(self.t_offset + self.tails[a], 1), (self.objective_index, -1), (a, int(arc_distances[a]) + upper_bound)]
+            for a in to_end
+        ])
+
+        # Items without size don't change the load flow: MTZ on their positions rules out subtours
+        if self.n_u:
+            add("<", n - 1, [
+                [(self.u_offset + self.tails[a], 1), (self.u_offset + self.heads[a], -1), (a, n)]
+                for a in between_items
+            ])
+
+        # Of two couriers with the same capacity, the lower numbered one starts with the lower numbered item
+        if symmetries is not None:
+            def first_item(i):
+                return [(a, int(min(self.heads[a], n))) for a in arcs[self.tails == n + i]]
+
+            add("<", 0, [
+                first_item(i1) + [(a, -value) for a, value in first_item(i2)]
+                for group in symmetries["identical_capacities"] for i1, i2 in zip(group[:-1], group[1:])
+            ])
+
+        self.A = sp.csr_matrix((values, (rows, cols)), shape=(len(rhs), self.n_variables))
+        self.sense = np.asarray(senses)
+        self.rhs = np.asarray(rhs, dtype=float)
+
+        self._arc_index = {(int(tail), int(head)): a for a, (tail, head) in enumerate(zip(self.tails, self.heads))}
+
+    def start_values(self, initial_routes):
+        n, m = self.n, self.m
+        values = np.zeros(self.n_variables)
+        for i, route in enumerate(initial_routes):
+            items = [location for location in route if location != n]
+            nodes = [n + i] + items + [n + m]
+            for tail, head in zip(nodes[:-1], nodes[1:]):
+                values[self._arc_index[tail, head]] = 1
+
+            load = self.max_loads[i]
+            distance = 0
+            previous = n
+            for position, j in enumerate(items):
+                load -= self.sizes[j]
+                distance += int(self.distances[previous, j])
+                values[self.q_offset + j] = load
+                values[self.t_offset + j] = distance
+                if self.n_u:
+                    values[self.u_offset + j] = position + 1
+                previous = j
+
+        values[self.objective_index] = self.objective(values)
+
+        return values
+
+    def routes(self, values):
+        n, m = self.n, self.m
+        successors = {
+            int(self.tails[a]): int(self.heads[a]) for a in np.nonzero(np.asarray(values[:self.n_x]) > 0.5)[0]
+        }
+
+        routes = list()
+        for i in range(m):
+            route = list()
+            node = successors.get(n + i, n + m)
+            while node < n and len(route) < n:
+                route.append(node + 1)
+                node = successors.get(node, n + m)
+            routes.append(route)
+
+        return routes
+
+    def arcs(self, values):
+        routes = self.routes(values)
+
+        return [list(zip([self.n] + [j - 1 for j in route], [j - 1 for j in route] + [self.n])) for route in routes]
+
+    def objective(self, values):
+        return max(route_distance([j - 1 for j in route], self.distances, self.n) for route in self.routes(values))
+
+    def subtour_cuts(self, values):
+        # The load flow (or the positions) rule out subtours
+        return None
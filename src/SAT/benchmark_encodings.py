@@ -0,0 +1,121 @@
+import csv
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+from src.io_utils import read_input_file
+from src.SAT.sat_model import solve_sat
+from src.SAT.solve_utils import EXACTLY_ONE_ENCODINGS
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where the runs have no memory limit
+    resource = None
+
+
+BENCHMARK_FIELDS = [
+    "instance", "m", "n", "encoding", "build_time", "n_vars", "n_clauses", "first_solution_time", "obj", "elapsed_time"
+]
+
+# Address space limit of each run (bytes), so that the largest models fail on their own instead of taking the machine
+# down, and time allowed to each run beyond its time limits (s), for loading the model into the solver
+MEMORY_LIMIT = 4 * 1024 ** 3
+RUN_MARGIN = 120
+
+
+def _benchmark_run(instance_number, encoding, solving_timeout, constraint_adding_timeout, memory_limit, rows):
+    """
+    Entry point of the process solving an instance with an encoding: puts its row on the rows queue.
+    """
+    if memory_limit is not None and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    instance = read_input_file(os.path.join("data", "problem_instances", "inst%02d.dat" % (instance_number, )))
+    result, _ = solve_sat(
+        instance,
+        exactly_one=encoding,
+        constraint_adding_timeout=constraint_adding_timeout,
+        solving_timeout=solving_timeout,
+        warm_start=False
+    )
+
+    # Models not built within the timeout have no stats
+    stats = result.get("stats", dict())
+    rows.put({
+        "build_time": stats.get("build_time"),
+        "n_vars": stats.get("n_vars"),
+        "n_clauses": stats.get("n_clauses"),
+        "first_solution_time": stats.get("first_solution_time"),
+        "obj": result.get("max_dist"),
+        "elapsed_time": result["elapsed_time"]
+    })
+
+
+def benchmark_encodings(instance_numbers, solving_timeout=30000, constraint_adding_timeout=120000,
+                        memory_limit=MEMORY_LIMIT):
+    """
+    Solve each instance with each exactly-one encoding, recording model size and timings (in ms). Each run has its own
+    process: a run exceeding the memory limit, or still loading the model into the solver well after the time limits,
+    is recorded with no results.
+
+    :param instance_numbers: list(int) - numbers of the instances to benchmark
+    :param solving_timeout: int - time limit for solving each instance (ms)
+    :param constraint_adding_timeout: int - time limit for building each model (ms)
+    :param memory_limit: int - address space limit of each run (bytes, where supported), none if None
+    :return: list(dict) - one row per instance and encoding, with the fields in BENCHMARK_FIELDS
+    """
+    context = multiprocessing.get_context("spawn")
+
+    rows = list()
+    for instance_number in instance_numbers:
+        instance = read_input_file(os.path.join("data", "problem_instances", "inst%02d.dat" % (instance_number, )))
+
+        for encoding in EXACTLY_ONE_ENCODINGS:
+            print("Instance", instance_number, "- encoding", encoding)
+            run_rows = context.Queue()
+            process = context.Process(target=_benchmark_run, args=(
+                instance_number, encoding, solving_timeout, constraint_adding_timeout, memory_limit, run_rows
+            ))
+            process.start()
+
+            # Wait for the row until the run ends (e.g. out of memory) or runs out of time
+            deadline = time.time() + (constraint_adding_timeout + solving_timeout) / 1000 + RUN_MARGIN
+            row = None
+            while row is None and process.is_alive() and time.time() < deadline:
+                try:
+                    row = run_rows.get(timeout=1)
+                except queue.Empty:
+                    pass
+            if row is None:
+                try:
+                    row = run_rows.get(timeout=1)
+                except queue.Empty:
+                    row = {"elapsed_time": solving_timeout}
+                    print("No results")
+            process.kill()
+            process.join()
+
+            row.update({"instance": instance_number, "m": instance.n_couriers, "n": instance.n_items,
+                        "encoding": encoding})
+            rows.append(row)
+
+    return rows
+
+
+def write_benchmark(rows, file_path):
+    with open(file_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=BENCHMARK_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    # python -m src.SAT.benchmark_encodings <solving timeout (ms)> [instance numbers, all if none given]
+    timeout = int(sys.argv[1]) if len(sys.argv) > 1 else 30000
+    numbers = [int(arg) for arg in sys.argv[2:]] or range(1, 22)
+
+    write_benchmark(benchmark_encodings(numbers, solving_timeout=timeout),
+                    os.path.join("data", "SAT_encodings_benchmark.csv"))
@@ -0,0 +1,318 @@
+import math
+import re
+import time
+
+import numpy as np
+
+from array import array
+from z3 import Bool, BoolVal, Not
+
+from src.SAT.math_utils import int_to_binary_arr
+
+
+class CNFBuilder:
+    """
+    Class to build a CNF formula directly at clause level.
+
+    Literals are non-zero integers, negative for negated variables (as in the DIMACS format). Clauses are stored in a
+    flat array of integers, each one terminated by 0, and are handed to the z3 solver in bulk, as a DIMACS string.
+    The variable with index i corresponds to the z3 constant Bool(i).
+
+    Bit-vectors are lists of literals, with the most significant bit first (as in math_utils).
+    """
+    def __init__(self):
+        self.n_vars = 0
+        self.n_clauses = 0
+
+        # Clauses not yet loaded into the solver
+        self.clauses = array('i')
+        self.pending_clauses = 0
+
+        # Constant literals
+        self.true = self.new_var()
+        self.false = -self.true
+        self.add_clause([self.true])
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ BASICS ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def new_var(self):
+        self.n_vars += 1
+        return self.n_vars
+
+    def new_vars(self, count):
+        first = self.n_vars + 1
+        self.n_vars += count
+        return list(range(first, self.n_vars + 1))
+
+    def add_clause(self, lits):
+        # Skip clauses satisfied by a constant and drop the false constants
+        if self.true in lits:
+            return
+        self.clauses.extend([lit for lit in lits if lit != self.false])
+        self.clauses.append(0)
+        self.n_clauses += 1
+        self.pending_clauses += 1
+
+    def is_constant(self, lit):
+        return lit == self.true or lit == self.false
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ GATES ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    # Each gate returns a literal equivalent to its output (Tseitin encoding), folding constant inputs
+    def and_gate(self, lits):
+        lits = [lit for lit in lits if lit != self.true]
+        if self.false in lits:
+            return self.false
+        if len(lits) == 0:
+            return self.true
+        if len(lits) == 1:
+            return lits[0]
+
+        g = self.new_var()
+        for lit in lits:
+            self.add_clause([-g, lit])
+        self.add_clause([g] + [-lit for lit in lits])
+
+        return g
+
+    def or_gate(self, lits):
+        return -self.and_gate([-lit for lit in lits])
+
+    def xor_gate(self, a, b):
+        if self.is_constant(a):
+            return b if a == self.false else -b
+        if self.is_constant(b):
+            return a if b == self.false else -a
+        if a == b:
+            return self.false
+        if a == -b:
+            return self.true
+
+        g = self.new_var()
+        self.add_clause([-g, a, b])
+        self.add_clause([-g, -a, -b])
+        self.add_clause([g, -a, b])
+        self.add_clause([g, a, -b])
+
+        return g
+
+    def equiv_gate(self, a, b):
+        return -self.xor_gate(a, b)
+
+    def majority_gate(self, a, b, c):
+        for x, y, z in ((a, b, c), (b, a, c), (c, a, b)):
+            if x == self.false:
+                return self.and_gate([y, z])
+            if x == self.true:
+                return self.or_gate([y, z])
+
+        g = self.new_var()
+        self.add_clause([-a, -b, g])
+        self.add_clause([-a, -c, g])
+        self.add_clause([-b, -c, g])
+        self.add_clause([a, b, -g])
+        self.add_clause([a, c, -g])
+        self.add_clause([b, c, -g])
+
+        return g
+
+    def full_adder(self, a, b, c):
+        return self.xor_gate(self.xor_gate(a, b), c), self.majority_gate(a, b, c)
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ CARDINALITY ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    # Same encodings as in solve_utils: pairwise (np), sequential (seq), bitwise (bw) and Heule (he)
+    def at_least_one(self, lits):
+        self.add_clause(lits)
+
+    def at_most_one(self, lits, encoding="seq"):
+        n = len(lits)
+        if n <= 1:
+            return
+
+        if encoding == "np" or (encoding == "he" and n <= 4):
+            for i in range(n):
+                for j in range(i + 1, n):
+                    self.add_clause([-lits[i], -lits[j]])
+
+        elif encoding == "seq":
+            s = self.new_vars(n - 1)
+            self.add_clause([-lits[0], s[0]])
+            self.add_clause([-lits[n - 1], -s[n - 2]])
+            for i in range(1, n - 1):
+                self.add_clause([-lits[i], s[i]])
+                self.add_clause([-lits[i], -s[i - 1]])
+                self.add_clause([-s[i - 1], s[i]])
+
+        elif encoding == "bw":
+            length = math.ceil(math.log2(n))
+            r = self.new_vars(length)
+            for i in range(n):
+                for j, bit in enumerate(int_to_binary_arr(i, length)):
+                    self.add_clause([-lits[i], r[j] if bit else -r[j]])
+
+        elif encoding == "he":
+            y = self.new_var()
+            self.at_most_one(lits[:3] + [y], "np")
+            self.at_most_one(lits[3:] + [-y], "he")
+
+        else:
+            raise ValueError(f"Unknown encoding: {encoding}")
+
+    def exactly_one(self, lits, encoding="seq"):
+        self.at_least_one(lits)
+        self.at_most_one(lits, encoding)
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ BIT-VECTORS ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def const_bits(self, value, length):
+        return [self.true if bit else self.false for bit in int_to_binary_arr(value, length)]
+
+    def gated_const_bits(self, value, length, lit):
+        """
+        Bit-vector equal to value if lit is true, 0 otherwise.
+        """
+        return [lit if bit else self.false for bit in int_to_binary_arr(value, length)]
+
+    def gated_bits(self, a, lit):
+        """
+        Bit-vector equal to a if lit is true, 0 otherwise.
+        """
+        return [self.and_gate([bit, lit]) for bit in a]
+
+    def one_hot_const_bits(self, options, length):
+        """
+        Bit-vector equal to the value of the selected option, for options of which at most one can be selected.
+
+        :param options: list((int, int)) - pairs of selection literal and value
+        """
+        values = [int_to_binary_arr(value, length) for _, value in options]
+
+        return [self.or_gate([lit for (lit, _), bits in zip(options, values) if bits[i]]) for i in range(length)]
+
+    def resize(self, a, length):
+        """
+        Bit-vector a with the given length: padded with leading zeros, or truncated forbidding the dropped bits.
+        """
+        if len(a) < length:
+            return [self.false] * (length - len(a)) + a
+
+        for bit in a[:len(a) - length]:
+            self.add_clause([-bit])
+        return a[len(a) - length:]
+
+    def add_with_carry(self, a, b):
+        """
+        Ripple-carry addition of two bit-vectors of the same length.
+
+        :return: (list, int) - the sum bits and the carry out literal
+        """
+        d = [self.false] * len(a)
+        carry = self.false
+        for i in reversed(range(len(a))):
+            d[i], carry = self.full_adder(a[i], b[i], carry)
+
+        return d, carry
+
+    def add(self, a, b):
+        """
+        Sum of two bit-vectors of the same length, forbidding overflow (as bin_add in math_utils).
+        """
+        if all(bit == self.false for bit in b):
+            return a
+        if all(bit == self.false for bit in a):
+            return b
+
+        d, carry = self.add_with_carry(a, b)
+        self.add_clause([-carry])
+
+        return d
+
+    def increment(self, a):
+        """
+        :return: (list, int) - the bits of a + 1 and the overflow literal
+        """
+        return self.add_with_carry(a, self.const_bits(1, len(a)))
+
+    def sum_all(self, vectors, length, deadline=None):
+        """
+        Sum of a list of bit-vectors through a chain of adders (as bin_arr_add in math_utils). The vectors are resized
+        to the length of the sum.
+
+        :param deadline: float - time (as given by time.time()) after which the construction is interrupted
+        """
+        total = self.const_bits(0, length)
+        for vector in vectors:
+            if (deadline is not None) and time.time() > deadline:
+                break
+            total = self.add(total, self.resize(vector, length))
+
+        return total
+
+    def less_than(self, a, b):
+        # Lexicographic comparison, going from the least significant bit
+        lt = self.false
+        for i in reversed(range(len(a))):
+            lt = self.or_gate([
+                self.and_gate([-a[i], b[i]]),
+                self.and_gate([self.equiv_gate(a[i], b[i]), lt])
+            ])
+
+        return lt
+
+    def less_or_eq(self, a, b):
+        return -self.less_than(b, a)
+
+    def equal(self, a, b):
+        return self.and_gate([self.equiv_gate(x, y) for x, y in zip(a, b)])
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ SOLVER ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def load(self, solver):
+        """
+        Hand all the clauses added since the previous call to the z3 solver, as a single DIMACS string.
+        """
+        if self.pending_clauses == 0:
+            return
+
+        solver.from_string("p cnf %d %d\n" % (self.n_vars, self.pending_clauses) + " ".join(map(str, self.clauses)))
+
+        self.clauses = array('i')
+        self.pending_clauses = 0
+
+    @staticmethod
+    def literal(lit):
+        """
+        The z3 expression corresponding to a literal.
+        """
+        return Bool(lit) if lit > 0 else Not(Bool(-lit))
+
+    def values(self, model):
+        """
+        Values of all the variables in a z3 model, read in a single pass over its printed form.
+
+        :return: ndarray(bool) - value of each variable, indexed by variable (variables missing in the model are false)
+        """
+        values = np.zeros(self.n_vars + 1, dtype=bool)
+        values[np.array(re.findall(r"k!(\d+) \(\) Bool\s+true", model.sexpr()), dtype=np.int64)] = True
+
+        return values
+
+    @staticmethod
+    def lit_values(values, lits):
+        """
+        Values of literals (in an array of any shape), given the values of the variables.
+        """
+        lits = np.asarray(lits, dtype=np.int64)
+        return values[np.abs(lits)] == (lits > 0)
+
+    @staticmethod
+    def set_phases(solver, lits, values):
+        """
+        Hint the z3 solver to try the given values first for some variables (in arrays of any shape).
+        The variables must already be loaded in the solver.
+        """
+        for lit, value in zip(np.ravel(lits).tolist(), np.ravel(values).tolist()):
+            solver.set_initial_value(Bool(lit), BoolVal(bool(value)))
+
+    def int_value(self, values, bits):
+        value = 0
+        for bit in self.lit_values(values, bits):
+            value = 2 * value + int(bit)
+
+        return value
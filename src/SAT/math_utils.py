@@ -1,6 +1,5 @@
 import time
 
-from math import ceil, log2
 from z3 import *
 
 
@@ -21,7 +20,8 @@ def int_to_binary_arr(num, length=None):
 
 
 def bit_requirement(x):
-    return ceil(log2(x))
+    # Bits needed to represent x (at least one)
+    return max(int(x).bit_length(), 1)
 
 
 def less_than(a, b):
@@ -0,0 +1,188 @@
+import sys
+
+from math import gcd
+
+from src.SAT.cnf_builder import CNFBuilder
+
+
+# Pseudo-Boolean "at most k" encodings: sum(weights[i] * lits[i]) <= k
+# Each one takes a CNFBuilder and adds the clauses to it.
+
+def _normalize(builder, lits, weights, k):
+    """
+    Simplify a PB constraint: drop zero weights, forbid literals heavier than k and divide everything by the gcd.
+
+    :return: (list, list, int) - remaining literals, their weights and the bound, or None if the constraint is trivial
+    """
+    pairs = list()
+    for lit, weight in zip(lits, weights):
+        if weight > k:
+            builder.add_clause([-lit])
+        elif weight > 0:
+            pairs.append((lit, weight))
+
+    if sum(weight for _, weight in pairs) <= k:
+        return None
+
+    divisor = 0
+    for _, weight in pairs:
+        divisor = gcd(divisor, weight)
+
+    return [lit for lit, _ in pairs], [weight // divisor for _, weight in pairs], k // divisor
+
+
+def at_most_k_adder(builder, lits, weights, k):
+    """
+    Binary encoding: masked weights summed through a ripple-carry adder chain, then compared to k.
+    """
+    normalized = _normalize(builder, lits, weights, k)
+    if normalized is None:
+        return
+    lits, weights, k = normalized
+
+    length = sum(weights).bit_length()
+    total = builder.sum_all([builder.gated_const_bits(weight, length, lit) for lit, weight in zip(lits, weights)],
+                            length)
+    builder.add_clause([builder.less_or_eq(total, builder.const_bits(k, length))])
+
+
+def _merge(builder, left, right, limit):
+    """
+    Node of a (generalized) totalizer: outputs for every sum of the children, clipped at limit.
+
+    :param left: dict(int -> int) - literal for each value of the left child (true if its sum is at least the value)
+    :param right: dict(int -> int) - same for the right child
+    :return: dict(int -> int) - literal for each value of the node
+    """
+    outputs = dict()
+
+    def output(value):
+        value = min(value, limit)
+        if value not in outputs:
+            outputs[value] = builder.new_var()
+        return outputs[value]
+
+    for a, a_lit in left.items():
+        builder.add_clause([-a_lit, output(a)])
+    for b, b_lit in right.items():
+        builder.add_clause([-b_lit, output(b)])
+    for a, a_lit in left.items():
+        for b, b_lit in right.items():
+            builder.add_clause([-a_lit, -b_lit, output(a + b)])
+
+    return outputs
+
+
+def _totalizer_tree(builder, leaves, k):
+    # Merge the leaves pairwise until the root, then forbid any sum over k
+    nodes = leaves
+    while len(nodes) > 1:
+        merged = [_merge(builder, nodes[i], nodes[i + 1], k + 1) for i in range(0, len(nodes) - 1, 2)]
+        if len(nodes) % 2 == 1:
+            merged.append(nodes[-1])
+        nodes = merged
+
+    if k + 1 in nodes[0]:
+        builder.add_clause([-nodes[0][k + 1]])
+
+
+def at_most_k_totalizer(builder, lits, weights, k):
+    """
+    Totalizer (Bailleux & Boufkhad): unary counter over the inputs, each one repeated as many times as its weight.
+    Compact when the weights (divided by their gcd) are small.
+    """
+    normalized = _normalize(builder, lits, weights, k)
+    if normalized is None:
+        return
+    lits, weights, k = normalized
+
+    _totalizer_tree(builder, [{1: lit} for lit, weight in zip(lits, weights) for _ in range(weight)], k)
+
+
+def at_most_k_gt(builder, lits, weights, k):
+    """
+    Generalized totalizer (Joshi et al.): each node only has outputs for the sums its inputs can actually reach.
+    """
+    normalized = _normalize(builder, lits, weights, k)
+    if normalized is None:
+        return
+    lits, weights, k = normalized
+
+    _totalizer_tree(builder, [{weight: lit} for lit, weight in zip(lits, weights)], k)
+
+
+def at_most_k_swc(builder, lits, weights, k):
+    """
+    Sequential weight counter (Hoelldobler et al.): s[i][j] is true if the first i + 1 inputs weigh more than j.
+    """
+    normalized = _normalize(builder, lits, weights, k)
+    if normalized is None:
+        return
+    lits, weights, k = normalized
+
+    prev = None
+    for i, (lit, weight) in enumerate(zip(lits, weights)):
+        s = builder.new_vars(k)
+
+        for j in range(weight):
+            builder.add_clause([-lit, s[j]])
+
+        if prev is not None:
+            for j in range(k):
+                builder.add_clause([-prev[j], s[j]])
+            for j in range(k - weight):
+                builder.add_clause([-lit, -prev[j], s[j + weight]])
+            builder.add_clause([-lit, -prev[k - weight]])
+
+        prev = s
+
+
+PB_ENCODINGS = {
+    "adder": at_most_k_adder,
+    "totalizer": at_most_k_totalizer,
+    "gt": at_most_k_gt,
+    "swc": at_most_k_swc,
+}
+
+
+def at_most_k(builder, lits, weights, k, encoding="gt"):
+    """
+    Add sum(weights[i] * lits[i]) <= k to the builder, with the chosen encoding.
+
+    :return: (int, int) - number of variables and clauses added
+    """
+    n_vars, n_clauses = builder.n_vars, builder.n_clauses
+    PB_ENCODINGS[encoding](builder, lits, weights, k)
+
+    return builder.n_vars - n_vars, builder.n_clauses - n_clauses
+
+
+def capacity_report(instance):
+    """
+    Size of the courier capacity constraints of an instance with each encoding.
+
+    :param instance: MCPProblem - the instance
+    :return: dict(str -> (int, int)) - number of variables and clauses for each encoding
+    """
+    report = dict()
+    for encoding in PB_ENCODINGS:
+        builder = CNFBuilder()
+        n_vars, n_clauses = 0, 0
+        for courier in range(instance.n_couriers):
+            lits = builder.new_vars(instance.n_items)
+            added_vars, added_clauses = at_most_k(builder, lits, instance.sizes, instance.max_loads[courier], encoding)
+            n_vars += added_vars
+            n_clauses += added_clauses
+        report[encoding] = (n_vars, n_clauses)
+
+    return report
+
+
+if __name__ == "__main__":
+    # python -m src.SAT.pb_encodings data/problem_instances/inst01.dat [...]
+    from src.io_utils import read_input_file
+
+    for path in sys.argv[1:]:
+        print(path)
+        for encoding, (n_vars, n_clauses) in capacity_report(read_input_file(path)).items():
+            print("\t%-10s %10d variables %10d clauses" % (encoding, n_vars, n_clauses))
@@ -0,0 +1,176 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from src.SAT.sat_model import solve_sat
+
+
+# Time between two checks of the shared bounds by each worker (in seconds)
+POLL_INTERVAL = 0.1
+
+# Settings the workers cycle through (the first worker uses the defaults of solve_sat)
+RANDOM_SEEDS = [0, 1, 2, 3, 4, 5, 6, 7]
+PHASE_SELECTIONS = [3, 5, 0, 6]
+EXACTLY_ONE_ENCODINGS = ["auto", "seq", "bw", "he", "np"]
+CAPACITY_ENCODINGS = ["gt", "adder"]
+
+# Workers of a portfolio when their number is not given (at most one per core), few enough to leave cores to the other
+# methods running at the same time
+DEFAULT_WORKERS = 4
+
+
+class SharedBounds:
+    """
+    Bounds of the objective shared by the workers of a portfolio, living in shared memory.
+    """
+    def __init__(self, context):
+        self.lock = context.Lock()
+        self.lower = context.Value('q', 0, lock=False)
+        # -1 until a solution is found
+        self.upper = context.Value('q', -1, lock=False)
+        self.stop_event = context.Event()
+
+        # Per-worker state, created by watch()
+        self.seen_upper = None
+        self.watching = None
+
+    def exchange(self, lower, upper):
+        """
+        Publish the bounds of a worker and get the best ones of the portfolio. Stops the portfolio when they meet.
+
+        :param lower: int - lower bound known by the worker
+        :param upper: int - best objective known by the worker (None if no solution yet)
+        :return: (int, int) - best lower bound and best objective (None if no solution yet)
+        """
+        with self.lock:
+            if upper is not None and (self.upper.value < 0 or upper < self.upper.value):
+                self.upper.value = upper
+            self.lower.value = max(self.lower.value, lower)
+
+            lower = self.lower.value
+            upper = self.upper.value if self.upper.value >= 0 else None
+
+        if upper is not None and lower >= upper:
+            self.stop_event.set()
+
+        self.seen_upper = upper
+        return lower, upper
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stopped(self):
+        return self.stop_event.is_set()
+
+    def watch(self, solver):
+        """
+        Interrupt the solver of this worker whenever another worker finds a better objective, or the portfolio stops.
+        """
+        self.watching = threading.Event()
+        self.watching.set()
+
+        def run():
+            interrupted_for = None
+            while self.watching.is_set():
+                time.sleep(POLL_INTERVAL)
+
+                upper = self.upper.value
+                improved = upper >= 0 and (self.seen_upper is None or upper < self.seen_upper)
+                if (improved or self.stopped()) and interrupted_for != (upper, self.stopped()):
+                    interrupted_for = (upper, self.stopped())
+                    solver.interrupt()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def unwatch(self):
+        self.watching.clear()
+
+    def __getstate__(self):
+        # Only the shared objects are sent to the workers
+        state = self.__dict__.copy()
+        state["seen_upper"] = None
+        state["watching"] = None
+        return state
+
+
+def portfolio_configs(workers):
+    """
+    Settings of each worker: different random seeds, phase selection strategies and encodings.
+
+    :param workers: int - number of workers
+    :return: list(dict) - keyword arguments of solve_sat for each worker
+    """
+    return [{
+        "random_seed": RANDOM_SEEDS[i % len(RANDOM_SEEDS)],
+        "phase_selection": PHASE_SELECTIONS[i % len(PHASE_SELECTIONS)],
+        "exactly_one": EXACTLY_ONE_ENCODINGS[i % len(EXACTLY_ONE_ENCODINGS)],
+        "capacity_encoding": CAPACITY_ENCODINGS[(i // 2) % len(CAPACITY_ENCODINGS)]
+    } for i in range(workers)]
+
+
+def _portfolio_worker(instance, config, shared_bounds, results, kwargs):
+    result, _ = solve_sat(instance, shared_bounds=shared_bounds, **config, **kwargs)
+    results.put((config, result))
+
+
+def solve_sat_portfolio(
+        instance,
+        workers=None,
+        constraint_adding_timeout=600000,
+        solving_timeout=30000,
+        **kwargs
+):
+    """
+    Solve an instance with several SAT workers in parallel, each with different settings. Every improvement of the
+    objective found by a worker is passed on to the others, and all of them stop as soon as optimality is proven.
+
+    :param instance: MCPProblem - the instance to solve
+    :param workers: int - number of worker processes (defaults to DEFAULT_WORKERS, at most the number of cores)
+    :param constraint_adding_timeout: int - time limit for building the model (ms)
+    :param solving_timeout: int - time limit for solving (ms)
+    :param kwargs: other arguments of solve_sat, common to all the workers
+    :return: (dict, MCPProblem) - the best solution found (as returned by solve_sat) and the instance
+    """
+    if workers is None or workers <= 0:
+        workers = min(DEFAULT_WORKERS, os.cpu_count() or 1)
+
+    context = multiprocessing.get_context("spawn")
+    shared_bounds = SharedBounds(context)
+    results = context.Queue()
+
+    kwargs["constraint_adding_timeout"] = constraint_adding_timeout
+    kwargs["solving_timeout"] = solving_timeout
+
+    processes = list()
+    for config in portfolio_configs(workers):
+        process = context.Process(target=_portfolio_worker, args=(instance, config, shared_bounds, results, kwargs))
+        process.start()
+        processes.append(process)
+
+    # Collect the results, waiting at most as much as a single worker is allowed to run (plus a margin)
+    deadline = time.time() + (constraint_adding_timeout + solving_timeout) / 1000 + 30
+    collected = list()
+    while len(collected) < workers:
+        try:
+            collected.append(results.get(timeout=max(deadline - time.time(), 0.1)))
+        except queue.Empty:
+            break
+
+    shared_bounds.stop()
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    # Keep the best solution
+    best = {"elapsed_time": solving_timeout}
+    for config, result in collected:
+        print("Worker", config, "- max dist", result.get("max_dist"))
+        if "max_dist" in result and ("max_dist" not in best or result["max_dist"] < best["max_dist"]):
+            best = result
+    best["lower_bound"] = shared_bounds.lower.value
+
+    return best, instance
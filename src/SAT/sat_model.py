@@ -1,24 +1,80 @@
 import time
 
-from src.SAT.math_utils import *
-from src.SAT.solve_utils import *
+import numpy as np
+
+from src.bounds import (
+    courier_distance_upper_bounds, distance_upper_bound, item_distance_upper_bounds, max_items_per_courier,
+    objective_lower_bound
+)
+from src.heuristics import heuristic_solution
+from src.preprocessing import preprocess
+from src.SAT.cnf_builder import CNFBuilder
+from src.SAT.math_utils import bit_requirement, int_to_binary_arr
+from src.SAT.pb_encodings import at_most_k
+from src.SAT.solve_utils import select_exactly_one
+from src.symmetry import canonical_routes, detect_symmetries
 
 from math import floor
 from z3 import *
 
 
+def _heuristic_values(routes, m, n, steps_length):
+    """
+    Values of the main variables of the model for a solution given as routes.
+
+    :param routes: list(list(int)) - items (0-based) delivered by each courier, in order
+    :return: dict - item_assignment, pre_table and steps, as extracted from a model by solve_sat
+    """
+    item_assignment = np.zeros((m, n), dtype=bool)
+    pre_table = np.zeros((n, n), dtype=bool)
+    steps = np.zeros((n, steps_length), dtype=bool)
+
+    for courier, route in enumerate(routes):
+        item_assignment[courier, route] = True
+        pre_table[route[1:], route[:-1]] = True
+        for step, item in enumerate(route):
+            steps[item] = int_to_binary_arr(step, steps_length)
+
+    return {"item_assignment": item_assignment, "pre_table": pre_table, "steps": steps}
+
+
 def solve_sat(
         instance,
-        exactly_one=exactly_one_seq,
-        ignore_max_load_symmetry_breaking_constraints=True,
-        ignore_distance_symmetry_breaking_constraints=True,
+        exactly_one="auto",
+        capacity_encoding="gt",
+        ignore_max_load_symmetry_breaking_constraints=False,
+        ignore_distance_symmetry_breaking_constraints=False,
+        ignore_item_symmetry_breaking_constraints=False,
         constraint_adding_timeout=600000,
-        solving_timeout=30000
+        solving_timeout=30000,
+        random_seed=None,
+        phase_selection=None,
+        shared_bounds=None,
+        warm_start=True
 ):
+    """
+    Build the SAT model of an instance as CNF clauses and minimize the maximum distance.
+
+    :param instance: MCPProblem - the instance to solve
+    :param exactly_one: str - encoding of the exactly-one/at-most-one constraints (np, seq, bw or he, as in solve_utils),
+                        or auto to pick it from the benchmark (see solve_utils.select_exactly_one)
+    :param capacity_encoding: str - encoding of the courier capacity constraints (adder, totalizer, gt or swc)
+    :param ignore_max_load_symmetry_breaking_constraints: bool - skip the symmetry breaking for equal max loads
+    :param ignore_distance_symmetry_breaking_constraints: bool - skip the symmetry breaking for symmetric distances
+    :param ignore_item_symmetry_breaking_constraints: bool - skip the symmetry breaking for interchangeable items
+    :param constraint_adding_timeout: int - time limit for building the model (ms)
+    :param solving_timeout: int - time limit for solving (ms)
+    :param random_seed: int - random seed of the solver
+    :param phase_selection: int - phase selection strategy of the solver (z3 phase_selection parameter)
+    :param shared_bounds: SharedBounds - bounds shared with the other workers of a portfolio (see portfolio.py)
+    :param warm_start: bool - start from the heuristic solution (see heuristics.heuristic_solution), as first upper
+                       bound and as initial phases of the solver
+    :return: (dict, MCPProblem) - the best solution found and the instance
+    """
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ PRELIMINARIES ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     # Start timer
     start_time = time.time()
-    elapsed_time = -1
+    deadline = start_time + constraint_adding_timeout / 1000
 
     result_dict = dict()
 
@@ -33,260 +89,371 @@ def solve_sat(
     assert n >= m, "The number of items should be greater or equal to the number of couriers!"
     assert sum(l) >= sum(s), "The total load exceeds the total capacity of couriers!"
 
+    # Accept the exactly-one functions of solve_utils as well (e.g. exactly_one_seq)
+    if callable(exactly_one):
+        exactly_one = exactly_one.__name__.split("_")[-1]
+    elif exactly_one == "auto":
+        exactly_one = select_exactly_one(m, n)
+
     # Prepare ranges in format similar to minizinc
     ITEMS = range(n)
     COURIERS = range(m)
-    LOCATIONS = range(n + 1)
-
-    # Prepare solver
-    solver_object = Solver()
-
-    # Compute bits required to represent the integers in the problem
-    # For the counted steps, the maximum number a courier will do is equal to the number of items
-    steps_length = bit_requirement(n)
-
-    # For the maximum distance, considering worst case scenario, when the maximum distance is made for each location
-    worst_max_dist = 0
-    for it in LOCATIONS:
-        worst_max_dist += max([row[it] for row in d])
-    max_distance_length = bit_requirement(worst_max_dist)
 
-    # For the carried weight of courier, compute sum of all weights
-    max_weight_length = bit_requirement(sum(s))
+    # Prepare clause builder
+    builder = CNFBuilder()
+
+    # Heuristic solution, bounding the objective
+    heuristic_routes, heuristic_max_dist = heuristic_solution(instance)
+    distance_bound = distance_upper_bound(instance, heuristic_routes)
+
+    # Compute bits required to represent the integers in the problem, from their bounds (see bounds.py)
+    # For the counted steps, a courier makes fewer than the items it can carry
+    steps_length = bit_requirement(max(max_items_per_courier(instance)) - 1)
+
+    # For the distances, no solution better than the heuristic one goes beyond its objective
+    max_distance_length = bit_requirement(distance_bound)
+    courier_distance_lengths = [
+        bit_requirement(bound) for bound in courier_distance_upper_bounds(instance, distance_bound)
+    ]
+    item_distance_lengths = [bit_requirement(bound) for bound in item_distance_upper_bounds(instance)]
+
+    # Items each courier can carry, and arcs each courier may travel in a solution no worse than the heuristic one (see
+    # preprocessing.py): the other variables are fixed to false, and left out of the clauses where possible
+    compatible, arc_mask = preprocess(instance, distance_bound)
+    any_arc = arc_mask.any(axis=0)
+
+    # Symmetries of the instance, each broken unless ignored (see symmetry.py)
+    symmetries = detect_symmetries(instance)
+    if ignore_max_load_symmetry_breaking_constraints:
+        symmetries["identical_capacities"] = list()
+    if ignore_distance_symmetry_breaking_constraints:
+        symmetries["symmetric_distances"] = False
+    if ignore_item_symmetry_breaking_constraints:
+        symmetries["interchangeable_items"] = list()
+
+    # Heuristic solution to start from, satisfying the symmetry breaking constraints
+    heuristic_result = None
+    if warm_start and heuristic_routes is not None:
+        heuristic_routes = canonical_routes(heuristic_routes, symmetries)
+        heuristic_result = _heuristic_values(heuristic_routes, m, n, steps_length)
+        heuristic_result["max_dist"] = heuristic_max_dist
+
+    # Bounds of the objective (see bounds.objective_lower_bound): the search stops as soon as a solution reaches the
+    # lower one
+    lower_bound = objective_lower_bound(instance)
+
+    def build_timed_out():
+        # The model couldn't be built in time: the heuristic solution (if any) is the best one found
+        timed_out_result = dict(heuristic_result) if heuristic_result is not None else dict()
+        timed_out_result["elapsed_time"] = solving_timeout
+        timed_out_result["optimal"] = False
+        timed_out_result["lower_bound"] = lower_bound
+        return timed_out_result, instance
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ VARIABLES ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     # Item assignment to courier
-    item_assignment = [[Bool(f"item_assignment_{i}_{j}") for i in ITEMS] for j in COURIERS]
+    item_assignment = [builder.new_vars(n) for _ in COURIERS]
 
-    # Precedence table - mark with 1 if pre_table[i][j] = 1, 0 otherwise
-    pre_table = [[Bool(f"pre_table_{i}_{j}") for i in ITEMS] for j in ITEMS]
+    # Precedence table - pre_table[i][j] is true if item j is delivered immediately before item i
+    pre_table = [builder.new_vars(n) for _ in ITEMS]
 
     # Steps from origin - the number of STEPS (not dist) a courier made to deliver current item - for cycle breaking
-    steps_from_origin = [[Bool(f"steps_from_origin_{i}_{j}") for j in range(steps_length)] for i in ITEMS]
+    steps_from_origin = [builder.new_vars(steps_length) for _ in ITEMS]
 
     # Objective value
-    max_dist = [Bool(f"max_dist_{i}") for i in range(max_distance_length)]
+    max_dist = builder.new_vars(max_distance_length)
+
+    # Items without precedent (first of their courier) and without successor (last of their courier)
+    is_first = [-builder.or_gate(pre_table[it]) for it in ITEMS]
+    is_last = [-builder.or_gate([row[it] for row in pre_table]) for it in ITEMS]
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ CONSTRAINTS ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-    distances_equal_to_max_dist = list()
+    # Preprocessing - no courier carries an item too large for it, nor travels a pruned arc from or to origin
     for courier in COURIERS:
-        # Break max_load symmetry
-        if not ignore_max_load_symmetry_breaking_constraints:
-            for courier2 in range(courier + 1, m):
-                if l[courier] == l[courier2]:
-                    less_than(item_assignment[courier], item_assignment[courier2])
+        for item in ITEMS:
+            if not compatible[courier, item]:
+                builder.add_clause([-item_assignment[courier][item]])
+                continue
+            if not arc_mask[courier, n, item]:
+                builder.add_clause([-item_assignment[courier][item], -is_first[item]])
+            if not arc_mask[courier, item, n]:
+                builder.add_clause([-item_assignment[courier][item], -is_last[item]])
+
+    # Distance travelled to deliver each item (from its precedent, or from origin if first), plus the way back to origin
+    # if it's the last one. It doesn't depend on the courier: exactly one of the ways to reach the item is used.
+    item_distances = list()
+    for item in ITEMS:
+        if time.time() > deadline:
+            return build_timed_out()
+
+        incoming_options = [(is_first[item], d[n][item])]
+        incoming_options += [(pre_table[item][item2], d[item2][item]) for item2 in ITEMS if any_arc[item2, item]]
+        incoming_distance = builder.one_hot_const_bits(incoming_options, item_distance_lengths[item])
+        outgoing_distance = builder.gated_const_bits(d[item][n], item_distance_lengths[item], is_last[item])
+        item_distances.append(builder.add(incoming_distance, outgoing_distance))
 
+    distances_equal_to_max_dist = list()
+    capacity_vars, capacity_clauses = 0, 0
+    for courier in COURIERS:
         # ENFORCE  COURIER  CAPACITY   &   COMPUTE  MAX  DIST
-        # Variables for total carried weight and total distance of current courier
-        carried_weight = [Bool(f'carried_weight_{courier}_{j}') for j in range(max_weight_length)]
-        local_distance = [Bool(f'local_distance_{courier}_{j}') for j in range(max_distance_length)]
-
-        # Lists of all the weights and distances
-        # (the ones that are not of items carried by current courier marked with 0)
-        carried_weights = list()
-        all_distances = list()
+        # Make sure the carried weight is smaller than the capacity
+        added_vars, added_clauses = at_most_k(builder, item_assignment[courier], s, l[courier], capacity_encoding)
+        capacity_vars += added_vars
+        capacity_clauses += added_clauses
+
+        # Compute total distance, adding up the distances of the items carried by current courier
+        local_distance = builder.sum_all(
+            [builder.gated_bits(item_distances[item], item_assignment[courier][item]) for item in ITEMS],
+            courier_distance_lengths[courier],
+            deadline=deadline
+        )
+        local_distance = builder.resize(local_distance, max_distance_length)
 
-        for item in ITEMS:
-            if (time.time() - start_time) > (constraint_adding_timeout / 1000):
-                result_dict["elapsed_time"] = floor(elapsed_time)
-                return result_dict, instance
-
-            # Transform from integer to array of booleans (base 10 to base 2)
-            local_weight = int_to_binary_arr(s[item], max_weight_length)
-
-            # Add all the weights (enforce 0 for items not carried by current courier)
-            carried_weights.append([And(item_assignment[courier][item], local_weight[i])
-                                    for i in range(max_weight_length)])
-
-            # Add all the distances
-            # Add distance from origin if first item
-            bin_dist = int_to_binary_arr(d[n][item], max_distance_length)
-            all_distances.append([And(
-                item_assignment[courier][item],
-                exactly_zero(pre_table[item]),
-                bin_dist[i]) for i in range(max_distance_length)])
-
-            # Add distance from previous item
-            for item2 in ITEMS:
-                if item2 != item:
-                    bin_dist = int_to_binary_arr(d[item2][item], max_distance_length)
-                    all_distances.append([And(
-                        item_assignment[courier][item],
-                        pre_table[item][item2],
-                        bin_dist[i]) for i in range(max_distance_length)])
-
-            # Add distance to origin if last item
-            bin_dist = int_to_binary_arr(d[item][n], max_distance_length)
-            all_distances.append([And(
-                item_assignment[courier][item],
-                exactly_zero([row[item] for row in pre_table]),
-                bin_dist[i]) for i in range(max_distance_length)])
-
-        # Compute total carried weight
-        solver_object.add(bin_arr_add(
-            total=carried_weight,
-            arr=carried_weights,
-            length=max_weight_length,
-            name=f"total_carried_weight_{courier}"
-        ))
-
-        # Make sure it's smaller than its capacity
-        solver_object.add(less_or_eq(
-            carried_weight,
-            int_to_binary_arr(l[courier], max_weight_length)
-        ))
-
-        if (time.time() - start_time) > (constraint_adding_timeout / 1000):
-            result_dict["elapsed_time"] = floor(elapsed_time)
-            return result_dict, instance
-
-        # Compute total distance
-        solver_object.add(bin_arr_add(
-            total=local_distance,
-            arr=all_distances,
-            length=max_distance_length,
-            name=f"local_distance_of_{courier}",
-            timeout=constraint_adding_timeout,
-            start_time=start_time
-        ))
-
-        if (time.time() - start_time) > (constraint_adding_timeout / 1000):
-            result_dict["elapsed_time"] = floor(elapsed_time)
-            return result_dict, instance
+        if time.time() > deadline:
+            return build_timed_out()
 
         # Update max dist
         # Make sure all are smaller or equal
-        solver_object.add(
-            less_or_eq(local_distance, max_dist)
-        )
+        builder.add_clause([builder.less_or_eq(local_distance, max_dist)])
 
         # Make sure at least one distance is equal to max dist
-        distances_equal_to_max_dist.append(eq_to(local_distance, max_dist))
-    solver_object.add(Or(distances_equal_to_max_dist))
+        distances_equal_to_max_dist.append(builder.equal(local_distance, max_dist))
+    builder.add_clause(distances_equal_to_max_dist)
 
-    for it1 in ITEMS:
-        if (time.time() - start_time) > (constraint_adding_timeout / 1000):
-            result_dict["elapsed_time"] = floor(elapsed_time)
-            return result_dict, instance
+    # Steps of the item following each item, and whether they overflow
+    next_steps = [builder.increment(steps_from_origin[it]) for it in ITEMS]
 
-        # [No improvement] Add upper domain boundary for steps_from_origin
-        # solver_object.add(less_or_eq(steps_from_origin[it1], int_to_binary_arr(n, steps_length)))
+    for it1 in ITEMS:
+        if time.time() > deadline:
+            return build_timed_out()
 
         # Item cannot precede itself
-        solver_object.add(Not(pre_table[it1][it1]))
+        builder.add_clause([-pre_table[it1][it1]])
 
         # Remove cycles - mark with 0 the number of steps done for first item
-        solver_object.add(Implies(exactly_zero(pre_table[it1]), exactly_zero(steps_from_origin[it1])))
+        for bit in steps_from_origin[it1]:
+            builder.add_clause([-is_first[it1], -bit])
 
         # Each item assigned to a single courier
-        solver_object.add(exactly_one([row[it1] for row in item_assignment], f"each_item_to_one_courier_{it1}"))
-
-        for it2 in range(it1 + 1, n):
-            # No 2 items with same precedent, unless coming from origin
-            solver_object.add(Implies(
-                Not(exactly_zero(pre_table[it1])),
-                Not(eq_to(pre_table[it1], pre_table[it2]))
-            ))
-
-            solver_object.add(Implies(
-                pre_table[it1][it2],
-                And(
-                    # Precedence only between items of the same courier - forward check
-                    eq_to([row[it1] for row in item_assignment], [row[it2] for row in item_assignment]),
-
-                    # Remove cycles - forward check
-                    eq_to_plus_one(
-                        steps_from_origin[it1],
-                        steps_from_origin[it2],
-                        length=steps_length,
-                        name=f"forward_cycle_{it1}_{it2}"
+        builder.exactly_one([row[it1] for row in item_assignment], exactly_one)
+
+        # Each item has at most one precedent, and no 2 items have the same precedent (unless coming from origin)
+        builder.at_most_one(pre_table[it1], exactly_one)
+        builder.at_most_one([row[it1] for row in pre_table], exactly_one)
+
+        for it2 in ITEMS:
+            if it2 == it1:
+                continue
+
+            if not any_arc[it2, it1]:
+                # Preprocessing - no courier goes from it2 to it1
+                builder.add_clause([-pre_table[it1][it2]])
+            else:
+                # Precedence only between items of the same courier, that may travel from it2 to it1
+                for courier in COURIERS:
+                    if not arc_mask[courier, it2, it1]:
+                        builder.add_clause([-pre_table[it1][it2], -item_assignment[courier][it1]])
+                        builder.add_clause([-pre_table[it1][it2], -item_assignment[courier][it2]])
+                        continue
+                    builder.add_clause(
+                        [-pre_table[it1][it2], -item_assignment[courier][it1], item_assignment[courier][it2]]
+                    )
+                    builder.add_clause(
+                        [-pre_table[it1][it2], item_assignment[courier][it1], -item_assignment[courier][it2]]
                     )
-                )
-            ))
+
+                # Remove cycles - steps of an item are one more than the steps of its precedent
+                next_bits, overflow = next_steps[it2]
+                builder.add_clause([-pre_table[it1][it2], -overflow])
+                for bit, next_bit in zip(steps_from_origin[it1], next_bits):
+                    builder.add_clause([-pre_table[it1][it2], -bit, next_bit])
+                    builder.add_clause([-pre_table[it1][it2], bit, -next_bit])
 
             # Each courier must have single item with origin as source
-            solver_object.add(
-                Implies(
-                    eq_to([row[it1] for row in item_assignment], [row[it2] for row in item_assignment]),
-                    And(
-                        Implies(exactly_zero(pre_table[it1]), Or(pre_table[it2])),
-                        Implies(exactly_zero(pre_table[it2]), Or(pre_table[it1])))
-                )
-            )
-
-            solver_object.add(Implies(
-                pre_table[it2][it1],
-                And(
-                    # Precedence only between items of the same courier - backward check
-                    eq_to([row[it1] for row in item_assignment], [row[it2] for row in item_assignment]),
-
-                    # Remove cycles - backward check
-                    eq_to_plus_one(
-                        steps_from_origin[it2],
-                        steps_from_origin[it1],
-                        length=steps_length,
-                        name=f"backward_cycle_{it2}_{it1}")
-                )
-            ))
-
-    # Break distances symmetry
-    if not ignore_distance_symmetry_breaking_constraints:
-        solver_object.add(less_or_eq(
-            [pre_table[it1][it2] for it2 in ITEMS for it1 in ITEMS],
-            [pre_table[it2][it1] for it2 in ITEMS for it1 in ITEMS]))
+            if it2 > it1:
+                for courier in COURIERS:
+                    builder.add_clause([
+                        -item_assignment[courier][it1], -item_assignment[courier][it2], -is_first[it1], -is_first[it2]
+                    ])
+
+    # Break max_load symmetry - of two couriers with the same max load, the first item either of them delivers is
+    # delivered by the lower numbered one
+    for group in symmetries["identical_capacities"]:
+        for courier, courier2 in zip(group[:-1], group[1:]):
+            # Whether courier delivers any of the items before the current one
+            delivers_before = None
+            for it in ITEMS:
+                if delivers_before is None:
+                    builder.add_clause([-item_assignment[courier2][it]])
+                    delivers_before = item_assignment[courier][it]
+                else:
+                    builder.add_clause([-item_assignment[courier2][it], delivers_before])
+                    delivers_before = builder.or_gate([delivers_before, item_assignment[courier][it]])
+
+    # Break items symmetry - of two interchangeable items, the lower numbered one is delivered by a courier numbered
+    # no higher than the courier of the other
+    for group in symmetries["interchangeable_items"]:
+        for it1, it2 in zip(group[:-1], group[1:]):
+            for courier in COURIERS:
+                later_couriers = range(courier, m)
+                builder.add_clause([-item_assignment[courier][it1]] + [item_assignment[c][it2] for c in later_couriers])
+
+    # Break distances symmetry - each route is travelled from its lower numbered end: no courier has a first item
+    # numbered higher than its last one (pairs already ruled out by the preprocessing are skipped)
+    if symmetries["symmetric_distances"]:
+        for it1 in ITEMS:
+            if time.time() > deadline:
+                return build_timed_out()
+
+            for it2 in range(it1):
+                for courier in COURIERS:
+                    if arc_mask[courier, n, it1] and arc_mask[courier, it2, n]:
+                        builder.add_clause([
+                            -item_assignment[courier][it1], -item_assignment[courier][it2], -is_first[it1],
+                            -is_last[it2]
+                        ])
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ SOLVING ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    print("Capacity constraints (%s): %d variables, %d clauses" % (capacity_encoding, capacity_vars, capacity_clauses))
+    print("Model (%s): %d variables, %d clauses" % (exactly_one, builder.n_vars, builder.n_clauses))
     print("Solving...")
 
+    # Prepare solver and hand it all the clauses at once
+    solver_object = Solver()
+    builder.load(solver_object)
+
+    if random_seed is not None:
+        solver_object.set("random_seed", random_seed)
+    if phase_selection is not None:
+        solver_object.set("phase_selection", phase_selection)
+
+    # Get interrupted when another worker of the portfolio improves the bounds
+    if shared_bounds is not None:
+        shared_bounds.watch(solver_object)
+
+    # Model statistics (times in ms)
+    stats = {
+        "build_time": floor((time.time() - start_time) * 1000),
+        "n_vars": builder.n_vars,
+        "n_clauses": builder.n_clauses,
+        "first_solution_time": None,
+        "heuristic_max_dist": None
+    }
+
+    upper_bound = None
+
+    if heuristic_result is not None:
+        # The heuristic solution is the first incumbent: only look for better ones, bisecting from the start
+        stats["heuristic_max_dist"] = heuristic_result["max_dist"]
+        result_dict = heuristic_result
+        upper_bound = heuristic_result["max_dist"]
+        builder.add_clause([builder.less_than(
+            max_dist,
+            builder.const_bits(upper_bound, max_distance_length)
+        )])
+        builder.load(solver_object)
+
+        # Try the assignment and the precedences of the heuristic first
+        builder.set_phases(solver_object, item_assignment, heuristic_result["item_assignment"])
+        builder.set_phases(solver_object, pre_table, heuristic_result["pre_table"])
+        builder.set_phases(solver_object, steps_from_origin, heuristic_result["steps"])
+
     # Set left time
     initial_solving_timeout = solving_timeout
     start_time = time.time()
+    elapsed_time = 0
 
     while solving_timeout > 0:
         solver_object.set("timeout", int(max(solving_timeout, 0)))
 
+        if shared_bounds is not None:
+            # Share the bounds found so far and get the best ones of the portfolio
+            lower_bound, shared_upper_bound = shared_bounds.exchange(lower_bound, upper_bound)
+            if shared_upper_bound is not None and (upper_bound is None or shared_upper_bound < upper_bound):
+                upper_bound = shared_upper_bound
+                builder.add_clause([builder.less_than(
+                    max_dist,
+                    builder.const_bits(upper_bound, max_distance_length)
+                )])
+                builder.load(solver_object)
+
+            # Optimality proven by any worker
+            if shared_bounds.stopped():
+                break
+
+        # Optimality proven
+        if upper_bound is not None and lower_bound >= upper_bound:
+            break
+
+        if upper_bound is None:
+            # Look for a first solution
+            bound = None
+            assumptions = list()
+        else:
+            # Bisect between the bounds. The bound is guarded by an assumption literal, so it can be dropped
+            # afterwards while the solver keeps all the clauses it learned.
+            bound = (lower_bound + upper_bound - 1) // 2
+            guard = builder.new_var()
+            within_bound = builder.less_or_eq(max_dist, builder.const_bits(bound, max_distance_length))
+            builder.add_clause([-guard, within_bound])
+            builder.load(solver_object)
+            assumptions = [builder.literal(guard)]
+
         # Solve
-        solver_status = solver_object.check()
+        solver_status = solver_object.check(*assumptions)
+
+        # Update time
+        solving_timeout -= ((time.time() - start_time) * 1000)
+        elapsed_time = initial_solving_timeout - solving_timeout
+        start_time = time.time()
 
-        if solver_status == sat and solving_timeout >= 0:
-            model = solver_object.model()
+        if solver_status == sat:
+            if stats["first_solution_time"] is None:
+                stats["first_solution_time"] = floor(elapsed_time)
 
             # Extract data from model
+            values = builder.values(solver_object.model())
             result_dict = {
-                "item_assignment": list(),
-                "pre_table": list(),
-                "steps": list()
+                "item_assignment": builder.lit_values(values, item_assignment),
+                "pre_table": builder.lit_values(values, pre_table),
+                "steps": builder.lit_values(values, steps_from_origin),
+                "max_dist": builder.int_value(values, max_dist)
             }
 
-            for row in item_assignment:
-                result_dict["item_assignment"].append([model.evaluate(el) for el in row])
-
-            for row in pre_table:
-                result_dict["pre_table"].append([model.evaluate(el) for el in row])
-
-            for row in steps_from_origin:
-                result_dict["steps"].append([model.evaluate(el) for el in row])
-
-            str_max_dist = ""
-            actual_max_dist = [model.evaluate(max_dist[i]) for i in range(max_distance_length)]
-            for el in actual_max_dist:
-                str_max_dist += str(int(bool(el)))
-            result_dict["max_dist"] = int(str_max_dist, 2)
-
-            # Update greatest max dist found so far
-            solver_object.add(less_than(max_dist, actual_max_dist))
-
-            # Update time
-            solving_timeout -= ((time.time() - start_time) * 1000)
-            elapsed_time = initial_solving_timeout - solving_timeout
-            start_time = time.time()
+            # Only look for better solutions from now on
+            upper_bound = result_dict["max_dist"]
+            builder.add_clause([builder.less_than(
+                max_dist,
+                builder.const_bits(upper_bound, max_distance_length)
+            )])
         elif solver_status == unsat:
-            solving_timeout -= ((time.time() - start_time) * 1000)
-            elapsed_time = initial_solving_timeout - solving_timeout
-            break
+            # No solution at all
+            if bound is None:
+                break
+
+            # No solution within the bound - drop the guard and keep the bound as a fact (negating the comparison the
+            # guard implied, instead of encoding it again)
+            lower_bound = bound + 1
+            builder.add_clause([-guard])
+            builder.add_clause([-within_bound])
         elif solver_status == unknown:
+            # Interrupted by the portfolio - retire the guard and continue with the new bounds
+            if shared_bounds is not None and solver_object.reason_unknown() in ("interrupted", "canceled"):
+                if bound is not None:
+                    builder.add_clause([-guard])
+                builder.load(solver_object)
+                continue
+
             elapsed_time = initial_solving_timeout
             break
 
+        builder.load(solver_object)
+
+    if shared_bounds is not None:
+        shared_bounds.exchange(lower_bound, upper_bound)
+        shared_bounds.unwatch()
+
     result_dict["elapsed_time"] = floor(elapsed_time)
+    result_dict["lower_bound"] = lower_bound
+    result_dict["stats"] = stats
     return result_dict, instance
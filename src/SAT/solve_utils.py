@@ -1,3 +1,6 @@
+import csv
+import math
+import os
 from itertools import combinations
 from z3 import *
 
@@ -126,3 +129,66 @@ def at_most_k_seq(bool_vars, k, name):
 
 def exactly_k_seq(bool_vars, k, name):
     return And(at_most_k_seq(bool_vars, k, name), at_least_k_seq(bool_vars, k, name))
+
+
+# Names of the exactly-one encodings above, as used by the CNF builder
+EXACTLY_ONE_ENCODINGS = ["np", "seq", "bw", "he"]
+
+
+BENCHMARK_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "data", "SAT_encodings_benchmark.csv")
+
+# Encoding with the best results over all the benchmarked instances (the lowest total rank, and the most instances
+# where it is strictly the best), used when there is no benchmark to select from and for the ties
+DEFAULT_EXACTLY_ONE = "seq"
+
+
+def _read_benchmark(file_path):
+    try:
+        with open(file_path, newline="") as f:
+            return list(csv.DictReader(f))
+    except OSError:
+        return list()
+
+
+def _encoding_key(row):
+    # Better results first: a solution found, then its objective, the time to end the search and to build the model
+    def value(field):
+        return int(row[field]) if row[field] else math.inf
+
+    return value("obj"), value("elapsed_time"), value("build_time")
+
+
+def select_exactly_one(m, n, benchmark_file=BENCHMARK_FILE):
+    """
+    Pick the exactly-one encoding for an instance from the benchmark of the bundled instances
+    (data/SAT_encodings_benchmark.csv, produced by python -m src.SAT.benchmark_encodings).
+
+    The benchmarked instances closest to the given one (by number of items, then of couriers) are the reference: each
+    encoding is ranked on each of them by its results, and the one with the lowest total rank is picked.
+
+    :param m: int - number of couriers
+    :param n: int - number of items
+    :param benchmark_file: str - path of the benchmark
+    :return: str - name of the encoding (one of EXACTLY_ONE_ENCODINGS)
+    """
+    rows = [row for row in _read_benchmark(benchmark_file) if row["encoding"] in EXACTLY_ONE_ENCODINGS]
+    if not rows:
+        return DEFAULT_EXACTLY_ONE
+
+    def distance(row):
+        return abs(int(row["n"]) - n), abs(int(row["m"]) - m)
+
+    closest = min(distance(row) for row in rows)
+    instances = dict()
+    for row in rows:
+        if distance(row) == closest:
+            instances.setdefault(row["instance"], list()).append(row)
+
+    # Rank of an encoding on an instance: the number of encodings with strictly better results
+    total_rank = {encoding: 0 for encoding in EXACTLY_ONE_ENCODINGS}
+    for instance_rows in instances.values():
+        for row in instance_rows:
+            total_rank[row["encoding"]] += sum(_encoding_key(other) < _encoding_key(row) for other in instance_rows)
+
+    # Ties go to the default encoding, then to the order of EXACTLY_ONE_ENCODINGS
+    return min(EXACTLY_ONE_ENCODINGS, key=lambda encoding: (total_rank[encoding], encoding != DEFAULT_EXACTLY_ONE))
@@ -1,46 +1,57 @@
 from z3 import *
-import os
 from timeit import default_timer as timer
 import time
 import math
-import json
 
-
-def import_data(path):
-    with open(path, 'r') as f:
-      lines = [line.strip() for line in f]
-
-      # Assign the first line to the m variable (Couriers)
-      m = int(lines[0])
-
-      # Assign the second line to the n variable (Locations)
-      n = int(lines[1])
-
-      # Assign the third line to the li variable (Couriers' maximum load)
-      li = [int(x) for x in lines[2].split()]
-
-      # Assign the fourth line to the sj variable (Load sizes)
-      sj = [int(x) for x in lines[3].split()]
-
-      # Assign the remaining lines to the Di_j variable (Distances between locations)
-      Di_j = []
-      for line in lines[4:]:
-        Di_j.append([int(x) for x in line.split()])
-
-    return m, n, li, sj, Di_j
-
-
-def solve_sat(m, n, Di_j, sj, li):
+from src.bounds import objective_lower_bound, optimality_gap
+from src.heuristics import heuristic_solution, route_distance
+from src.io_utils import problem_to_lists, read_input_file, write_to_json
+from src.preprocessing import preprocess
+from src.route_utils import arcs_from_values, routes_from_arcs, subtours
+from src.SMT.anytime import minimize
+from src.SMT.successor_model import solve_successor
+from src.SMT.symmetry_breaking import assignment_symmetry_breaking
+from src.symmetry import canonical_routes, detect_symmetries
+
+
+def solve_sat(m, n, Di_j, sj, li, timeout=300000, on_incumbent=None, subtour_elimination="mtz", pseudo_boolean=True,
+              initial_routes=None, lower_bound=None, compatible=None, arc_mask=None, symmetries=None):
+    """
+    SMT model with a Boolean per courier and pair of locations.
+
+    :param initial_routes: list(list(int)) - heuristic solution (items 0-based), the first incumbent and the initial
+                           values of the arcs
+    :param lower_bound: int - lower bound of the objective (see bounds.objective_lower_bound), the round trip one if
+                        not given
+    :param compatible: ndarray - items each courier can carry (see preprocessing.preprocess), all if not given
+    :param arc_mask: ndarray - arcs each courier may travel (see preprocessing.preprocess), all if not given
+    :param symmetries: dict - symmetries of the instance to break (see symmetry.detect_symmetries), none if not given:
+                       the initial routes must satisfy the constraints (see symmetry.canonical_routes)
+
+    :param pseudo_boolean: bool - write the cardinality and capacity constraints as native pseudo-Boolean constraints
+                           (PbEq, PbLe, AtMost) instead of sums of integers
+    :param subtour_elimination: str - mtz to add all the MTZ constraints up front, lazy to add only the subtour cuts
+                                violated by the solutions found, until these are valid routes
+    """
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ PRELIMINARIES ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     result_dict = dict()
 
-    # Initialize default result values
-    result_dict["time"] = -1
+    # Initialize default result values, returned if the model can't be built in time: the heuristic solution (if any)
+    # is the best one found
+    result_dict["time"] = timeout / 1000
     result_dict["optimal"] = False
     result_dict["obj"] = None
     result_dict["sol"] = None
 
+    incumbent = None
+    if initial_routes is not None:
+        incumbent = (
+            max(route_distance(route, Di_j, n) for route in initial_routes),
+            [[j + 1 for j in route] for route in initial_routes]
+        )
+        result_dict["obj"], result_dict["routes"] = incumbent
+
     s = Optimize()
 
     # Start timer
@@ -51,24 +62,26 @@ def solve_sat(m, n, Di_j, sj, li):
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ VARIABLES ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
     # Binary variable, if x = 1, then courier i has moved from location j to location k (includes origin)
+    # (false for the arcs pruned by the preprocessing)
     x = {}
     for i in range(m):
         for j in range(n + 1):
             for k in range(n + 1):
-                x[i, j, k] = Bool(f'x_{i}_{j}_{k}')
+                x[i, j, k] = Bool(f'x_{i}_{j}_{k}') if arc_mask is None or arc_mask[i, j, k] else BoolVal(False)
 
 
-    # Binary variable, if y = 1, then courier i has visited location j
+    # Binary variable, if y = 1, then courier i has visited location j (false for the items the courier can't carry)
     y = {}
     for i in range(m):
         for j in range(n):
-            y[i, j] = Bool(f'y_{i}_{j}')
+            y[i, j] = Bool(f'y_{i}_{j}') if compatible is None or compatible[i, j] else BoolVal(False)
 
     # Integer MTZ variable
     u = {}
-    for i in range(m):
-        for j in range(n+1):
-            u[i, j] = Int(f'u_{i}_{j}')
+    if subtour_elimination == "mtz":
+        for i in range(m):
+            for j in range(n+1):
+                u[i, j] = Int(f'u_{i}_{j}')
 
     # Initialize variable to be used in the objective function
     max_distance = Int('max_distance')
@@ -81,8 +94,12 @@ def solve_sat(m, n, Di_j, sj, li):
 
     # Objective function is defined here, minimizes the maximum distance that any one courier has to travel
     constraints = []
+    distances = [
+        Sum([x[i, j, k] * Di_j[j][k] for j in range(n+1) for k in range(n+1) if not is_false(x[i, j, k])])
+        for i in range(m)
+    ]
     for i in range(m):
-        constraints.append(Sum([x[i, j, k] * Di_j[j][k] for j in range(n+1) for k in range(n+1)]) <= max_distance)
+        constraints.append(distances[i] <= max_distance)
 
     # Add constraints
     for constraint in constraints:
@@ -91,27 +108,43 @@ def solve_sat(m, n, Di_j, sj, li):
 
 
     # Assignment constraints only exactly one visit per location
-    assign_constraints = [Sum([If(y[i,j], 1, 0) for i in range(m)]) == 1 for j in range(n)]
+    if pseudo_boolean:
+        assign_constraints = [PbEq([(y[i,j], 1) for i in range(m)], 1) for j in range(n)]
+    else:
+        assign_constraints = [Sum([If(y[i,j], 1, 0) for i in range(m)]) == 1 for j in range(n)]
     s.add(assign_constraints)
 
     if check_timeout(start_time):
       return result_dict
 
     # Linking constraint, limits a courier to a single y variable per location it arrives to or departs from
-    courier_tour_depart_constraints = [
-        Sum([If(x[i,j,k], 1, 0) for k in range(n + 1) if j != k]) == If(y[i,j], 1, 0) for j in range(n)
-        for i in range(m)
-    ]
+    # (as pseudo-Boolean constraints, the arcs plus the negation of y sum up to one)
+    if pseudo_boolean:
+        courier_tour_depart_constraints = [
+            PbEq([(x[i,j,k], 1) for k in range(n + 1) if j != k] + [(Not(y[i,j]), 1)], 1) for j in range(n)
+            for i in range(m)
+        ]
+    else:
+        courier_tour_depart_constraints = [
+            Sum([If(x[i,j,k], 1, 0) for k in range(n + 1) if j != k]) == If(y[i,j], 1, 0) for j in range(n)
+            for i in range(m)
+        ]
     s.add(courier_tour_depart_constraints)
 
     if check_timeout(start_time):
       return result_dict
 
 
-    courier_tour_arrive_constraints = [
-        Sum([If(x[i,j,k], 1, 0) for j in range(n + 1) if j != k]) == If(y[i,k], 1, 0) for k in range(n)
-        for i in range(m)
-    ]
+    if pseudo_boolean:
+        courier_tour_arrive_constraints = [
+            PbEq([(x[i,j,k], 1) for j in range(n + 1) if j != k] + [(Not(y[i,k]), 1)], 1) for k in range(n)
+            for i in range(m)
+        ]
+    else:
+        courier_tour_arrive_constraints = [
+            Sum([If(x[i,j,k], 1, 0) for j in range(n + 1) if j != k]) == If(y[i,k], 1, 0) for k in range(n)
+            for i in range(m)
+        ]
     s.add(courier_tour_arrive_constraints)
 
     if check_timeout(start_time):
@@ -119,83 +152,119 @@ def solve_sat(m, n, Di_j, sj, li):
 
 
     # Load capacity constraint (for number of couriers)
-    load_capacity_constraints = [
-        Sum([sj[j] * If(y[i,j], 1, 0) for j in range(n)]) <= li[i] for i in range(m)
-    ]
+    if pseudo_boolean:
+        load_capacity_constraints = [PbLe([(y[i,j], sj[j]) for j in range(n)], li[i]) for i in range(m)]
+    else:
+        load_capacity_constraints = [
+            Sum([sj[j] * If(y[i,j], 1, 0) for j in range(n)]) <= li[i] for i in range(m)
+        ]
     s.add(load_capacity_constraints)
 
     if check_timeout(start_time):
       return result_dict
 
 
-    # MTZ subtour elimination constraint
-    for i in range(m):
-        for j in range(n+1):
-            for k in range(n+1):
-                if j != n and j != k:
-                    s.add(u[i,j] - u[i,k] + n * If(x[i,j,k], 1, 0) <= n - 1)
+    # MTZ subtour elimination constraint (with lazy subtour elimination, the cuts are added while solving)
+    if subtour_elimination == "mtz":
+        for i in range(m):
+            for j in range(n+1):
+                for k in range(n+1):
+                    if j != n and j != k and not is_false(x[i,j,k]):
+                        s.add(u[i,j] - u[i,k] + n * If(x[i,j,k], 1, 0) <= n - 1)
 
     if check_timeout(start_time):
       return result_dict
 
     # Ensure for each courier that they leave origin and come back to it exactly once
-    courier_flow_start_constraints = [
-        Sum([If(x[i,n,k], 1, 0) for k in range(n + 1)]) == 1 for i in range(m)
-    ]
+    if pseudo_boolean:
+        courier_flow_start_constraints = [PbEq([(x[i,n,k], 1) for k in range(n + 1)], 1) for i in range(m)]
+        courier_flow_end_constraints = [PbEq([(x[i,j,n], 1) for j in range(n + 1)], 1) for i in range(m)]
+    else:
+        courier_flow_start_constraints = [
+            Sum([If(x[i,n,k], 1, 0) for k in range(n + 1)]) == 1 for i in range(m)
+        ]
+        courier_flow_end_constraints = [
+            Sum([If(x[i,j,n], 1, 0) for j in range(n + 1)]) == 1 for i in range(m)
+        ]
     s.add(courier_flow_start_constraints)
-
-    courier_flow_end_constraints = [
-        Sum([If(x[i,j,n], 1, 0) for j in range(n + 1)]) == 1 for i in range(m)
-    ]
     s.add(courier_flow_end_constraints)
 
-
-    # Set objective
-    s.minimize(max_distance)
+    # Symmetry breaking - couriers with the same capacity and interchangeable items (see symmetry_breaking.py), and
+    # with symmetric distances, each route goes from its lower numbered end (the origin counting as n)
+    if symmetries is not None:
+        s.add(assignment_symmetry_breaking(symmetries, m, n, lambda i, j: y[i, j]))
+        if symmetries["symmetric_distances"]:
+            s.add([
+                Sum([x[i, n, k] * k for k in range(n + 1) if not is_false(x[i, n, k])])
+                <= Sum([x[i, j, n] * j for j in range(n + 1) if not is_false(x[i, j, n])])
+                for i in range(m)
+            ])
 
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ SOLVING ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    # Sets time limit for solver
-    s.set("timeout", 300000)
-    print("SOLVING...")
-    start_time = timer()
-
-    # Solve
-    is_sat = s.check()
-
-    end_time = timer()
-    elapsed_time = end_time-start_time
-
-    # Saving unordered routes travelled into a list
-    routes = []
-    for i in range(m):
-        route = []
-        for j in range(n + 1):
-            for k in range(n + 1):
-                if s.model()[x[i, j, k]]:
-                    route.append((j+1, k+1))
-        routes.append(route)
-
-    # Assign result to dictionary if model finds optimal solution
-    if is_sat == sat:
-        result_dict["time"] = elapsed_time
-        result_dict["optimal"] = True
-        result_dict["obj"] = s.model()[max_distance].as_long()
-        result_dict["paths"] = routes
-
-    # Assign best found results to dictionary if model does not find optimal solution
-    else:
-        result_dict["time"] = 300
-        result_dict["optimal"] = False
-        try:
-            if s.model()[max_distance].as_long():
-                result_dict["obj"] = s.model()[max_distance].as_long()
-                result_dict["paths"] = routes
-
-        # Does not assign results to dictionary of no solution found (even non-optimal)
-        except AttributeError:
-            return result_dict
+    # Arc of each variable x, by name
+    arc_names = {x[key].decl().name(): key for key in x if not is_false(x[key])}
+
+    def arcs(model):
+        # Arcs travelled by each courier (as pairs of 0-based locations), in a single pass over the model
+        # (variables missing in the model are false)
+        values = dict()
+        for decl in model.decls():
+            key = arc_names.get(decl.name())
+            if key is not None and is_true(model[decl]):
+                values[key] = True
+
+        return arcs_from_values(values, m)
+
+    def decode(model):
+        return routes_from_arcs(arcs(model), n)
+
+    def separate(model):
+        # Subtour cuts violated by the solution: the items of each cycle are left at most once less than their number,
+        # by every courier
+        cuts = []
+        for route in arcs(model):
+            for cycle in subtours({j: k for j, k in route if j != k}, n):
+                if pseudo_boolean:
+                    cuts += [
+                        AtMost(*[x[i, j, k] for j in cycle for k in cycle if j != k], len(cycle) - 1)
+                        for i in range(m)
+                    ]
+                else:
+                    cuts += [
+                        Sum([If(x[i, j, k], 1, 0) for j in cycle for k in cycle if j != k]) <= len(cycle) - 1
+                        for i in range(m)
+                    ]
+        return cuts
+
+    # Whoever delivers an item makes at least the round trip to it
+    if lower_bound is None:
+        lower_bound = max(Di_j[n][j] + Di_j[j][n] for j in range(n))
+
+    # Start from the heuristic solution
+    if initial_routes is not None:
+        for i, route in enumerate(initial_routes):
+            locations = [n] + route + [n]
+            for j, k in zip(locations[:-1], locations[1:]):
+                s.set_initial_value(x[i, j, k], True)
+
+    # Time spent building the model (s)
+    build_time = timer() - start_time
+
+    # Minimize the maximum distance, keeping the best solution found within the time limit
+    result_dict = minimize(
+        s,
+        max_distance,
+        distances,
+        decode,
+        lower_bound=lower_bound,
+        timeout=timeout,
+        on_incumbent=on_incumbent,
+        separate=separate if subtour_elimination == "lazy" else None,
+        incumbent=incumbent
+    )
+    result_dict["build_time"] = build_time
 
     return result_dict
 
@@ -209,74 +278,72 @@ def check_timeout(start_time):
       return False
 
 
-def order_routes(route_list):
-    ordered_routes = []
-    first_transfer = max(route_list, key=lambda x: x[0])
-    # Remove the first_transfer from the original list
-    route_list.remove(first_transfer)
-    # Set first_transfer as first instance of the list
-    route_list.insert(0, first_transfer)
-
-    while route_list:
-        for i, route in enumerate(route_list):
-            # Checks that final destination and starting destination are the same
-            if not ordered_routes or route[0] == ordered_routes[-1][1]:
-                ordered_routes.append(route)
-                del route_list[i]
-                break
-    return ordered_routes
-
-
-def main_smt(instance):
-    m, n, li, sj, Di_j = import_data("data/problem_instances/inst%02d.dat" % (instance, ))
-
-    # Solve instance
-    result_dict = solve_sat(
-        m=m,
-        n=n,
-        sj=sj,
-        Di_j=Di_j,
-        li=li
-    )
+def main_smt(instance, formulation="arcs", subtour_elimination="mtz"):
+    """
+    Solve an instance with SMT and write the results to the json file.
 
-    paths = []
-    if "paths" in result_dict:
-        for route in result_dict["paths"]:
-            ordered_destinations = order_routes(route)
-            path = []
-            for r in ordered_destinations[:-1]:
-                path.append(r[1])
-            paths.append(path)
-
-    # Prepare directories if they don't exist yet
-    if not os.path.exists("res"):
-        os.mkdir("res")
-    if not os.path.exists(os.path.join("res", "SMT")):
-        os.mkdir(os.path.join("res", "SMT"))
-
-    # Prepare json path
-    json_file_path = os.path.join("res", "SMT", "%02d.json" % (instance, ))
-
-    # Read existing data from the json
-    if os.path.exists(json_file_path):
-        with open(json_file_path, "r") as f:
-            loaded_data = json.load(f)
-    else:
-        loaded_data = dict()
+    :param instance: int - number of the instance
+    :param formulation: str - arcs for the model with a Boolean per courier and pair of locations (solve_sat),
+                        successor for the model with a successor per item (successor_model.solve_successor)
+    :param subtour_elimination: str - mtz or lazy, for the arcs formulation (see solve_sat)
+    """
+    problem = read_input_file("data/problem_instances/inst%02d.dat" % (instance, ))
+    m, n, li, sj, Di_j = problem_to_lists(problem)
 
+    # Each variant has its own key, so that they don't overwrite each other
     experiment_name = "SMT"
-    data = {
-        experiment_name: {
-            "time": int(math.floor(result_dict['time'])),
-            "optimal": result_dict['optimal'],
-            "obj": int(result_dict['obj']) if result_dict['obj'] else None,
-            "sol": paths
+    if formulation == "successor":
+        experiment_name += " (successor)"
+    elif subtour_elimination == "lazy":
+        experiment_name += " (lazy)"
+
+    def write_results(result_dict):
+        data = {
+            experiment_name: {
+                "time": int(math.floor(result_dict['time'])),
+                "optimal": result_dict['optimal'],
+                "obj": int(result_dict['obj']) if result_dict['obj'] else None,
+                "sol": result_dict.get('routes') or [],
+                "incumbents": result_dict.get('incumbents', []),
+                "gap": optimality_gap(result_dict['obj'], lower_bound, result_dict['optimal'])
+            }
         }
-    }
 
-    for key in data.keys():
-        loaded_data[key] = data[key]
+        write_to_json(data, instance, "SMT")
+
+    # Heuristic solution, the first incumbent, and lower bound of the objective, to stop as soon as it is reached
+    initial_routes, upper_bound = heuristic_solution(problem)
+    lower_bound = objective_lower_bound(problem)
+
+    # Items each courier can carry, and arcs each courier may travel in a solution no worse than the heuristic one
+    compatible, arc_mask = preprocess(problem, upper_bound)
 
-    # Creates JSON file with associated data
-    with open(json_file_path, "w") as json_file:
-        json.dump(loaded_data, json_file, indent=4)
+    # Symmetries broken by the models, which the heuristic solution is made to satisfy
+    symmetries = detect_symmetries(problem)
+    if initial_routes is not None:
+        initial_routes = canonical_routes(initial_routes, symmetries)
+
+    # Solve instance, writing every improving solution as soon as it is found, so that a run killed at the deadline
+    # still reports the best one
+    if formulation == "successor":
+        result_dict = solve_successor(
+            m=m, n=n, sj=sj, Di_j=Di_j, li=li, on_incumbent=write_results, initial_routes=initial_routes,
+            lower_bound=lower_bound, compatible=compatible, arc_mask=arc_mask, symmetries=symmetries
+        )
+    else:
+        result_dict = solve_sat(
+            m=m,
+            n=n,
+            sj=sj,
+            Di_j=Di_j,
+            li=li,
+            on_incumbent=write_results,
+            subtour_elimination=subtour_elimination,
+            initial_routes=initial_routes,
+            lower_bound=lower_bound,
+            compatible=compatible,
+            arc_mask=arc_mask,
+            symmetries=symmetries
+        )
+
+    write_results(result_dict)
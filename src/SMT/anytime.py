@@ -0,0 +1,164 @@
+from z3 import *
+from timeit import default_timer as timer
+
+
+def minimize(s, max_distance, distances, decode, lower_bound=0, timeout=300000, on_incumbent=None, separate=None,
+             incumbent=None):
+    """
+    Anytime minimization of the objective, reporting every improving solution as soon as it is found.
+
+    With an Optimize, the solutions are received through its model callback. With a plain Solver, after each solution
+    the objective is bounded by its value and the search goes on, bisecting between the bounds, until no better
+    solution exists or the time runs out.
+
+    With a separation function, the model may lack some constraints (e.g. subtour elimination): the constraints
+    violated by each solution are added, and the search goes on until the solutions satisfy all of them.
+
+    :param s: Solver or Optimize - solver holding all the constraints of the model
+    :param max_distance: ArithRef - the objective, bounding the distance of every courier
+    :param distances: list(ArithRef) - distance travelled by each courier
+    :param decode: function(ModelRef) -> list(list(int)) - routes (items 1-based) of a model
+    :param lower_bound: int - lower bound of the objective: the search stops as soon as a solution reaches it
+    :param timeout: int - time limit for solving (ms)
+    :param on_incumbent: function(dict) - called with the result dict after every improving solution
+    :param separate: function(ModelRef) -> list(BoolRef) - constraints of the problem violated by a model
+    :param incumbent: (int, list(list(int))) - objective and routes (items 1-based) of a known solution (e.g. a
+                      heuristic one), the first incumbent: only better solutions are searched for
+    :return: dict - time (s), optimal, obj and routes of the best solution (None if no solution is found), and the
+             time (s) and objective of every improving solution found
+    """
+    result_dict = {
+        "time": timeout / 1000,
+        "optimal": False,
+        "obj": None,
+        "routes": None,
+        "incumbents": list()
+    }
+
+    def record(model):
+        # The objective of the solution, which max_distance may exceed
+        obj = max(model.eval(distance, model_completion=True).as_long() for distance in distances)
+        if result_dict["obj"] is not None and obj >= result_dict["obj"]:
+            return
+
+        result_dict["obj"] = obj
+        result_dict["routes"] = decode(model)
+        result_dict["incumbents"].append([round(timer() - start_time, 3), obj])
+        if on_incumbent is not None:
+            on_incumbent(result_dict)
+
+    print("SOLVING...")
+    start_time = timer()
+
+    if incumbent is not None:
+        result_dict["obj"], result_dict["routes"] = incumbent
+        result_dict["incumbents"].append([0, result_dict["obj"]])
+        if on_incumbent is not None:
+            on_incumbent(result_dict)
+        s.add(max_distance < result_dict["obj"])
+
+    # Valid for every solution, and lets the optimizer prove the optimality of a solution reaching the bound
+    s.add(max_distance >= lower_bound)
+
+    def violated(model):
+        return separate(model) if separate is not None else list()
+
+    if isinstance(s, Optimize):
+        # Constraints violated by the solutions found during the search, added before the next one
+        pending_cuts = list()
+
+        def on_model(model):
+            cuts = violated(model)
+            if cuts:
+                pending_cuts.extend(cuts)
+            else:
+                record(model)
+
+        s.set_on_model(on_model)
+        s.minimize(max_distance)
+
+        while True:
+            # Optimality proven by the lower bound
+            if result_dict["obj"] is not None and lower_bound >= result_dict["obj"]:
+                result_dict["time"] = timer() - start_time
+                result_dict["optimal"] = True
+                break
+
+            remaining_time = timeout - (timer() - start_time) * 1000
+            if remaining_time <= 0:
+                break
+
+            s.set("timeout", int(remaining_time))
+            is_sat = s.check()
+            if is_sat == unsat and result_dict["obj"] is not None:
+                # Nothing better than the known solution
+                result_dict["time"] = timer() - start_time
+                result_dict["optimal"] = True
+            if is_sat != sat:
+                break
+
+            # The optimum is valid, or the search goes on with the violated constraints
+            model = s.model()
+            cuts = violated(model)
+            if not cuts:
+                record(model)
+                result_dict["time"] = timer() - start_time
+                result_dict["optimal"] = True
+                break
+
+            s.add(cuts + pending_cuts)
+            pending_cuts.clear()
+
+        return result_dict
+
+    n_guards = 0
+    while True:
+        # Optimality proven
+        if result_dict["obj"] is not None and lower_bound >= result_dict["obj"]:
+            result_dict["time"] = timer() - start_time
+            result_dict["optimal"] = True
+            break
+
+        remaining_time = timeout - (timer() - start_time) * 1000
+        if remaining_time <= 0:
+            break
+
+        if result_dict["obj"] is None:
+            # Look for a first solution
+            bound = None
+            assumptions = list()
+        else:
+            # Bisect between the bounds. The bound is guarded by an assumption literal, so it can be dropped
+            # afterwards while the solver keeps what it learned.
+            bound = (lower_bound + result_dict["obj"] - 1) // 2
+            guard = Bool(f'bound_guard_{n_guards}')
+            n_guards += 1
+            s.add(Implies(guard, max_distance <= bound))
+            assumptions = [guard]
+
+        s.set("timeout", int(remaining_time))
+        is_sat = s.check(*assumptions)
+
+        if is_sat == sat:
+            # Solutions violating some constraints are cut off, keeping the bounds
+            cuts = violated(s.model())
+            if cuts:
+                s.add(cuts)
+                continue
+
+            record(s.model())
+
+            # Only look for better solutions from now on
+            s.add(max_distance < result_dict["obj"])
+        elif is_sat == unsat:
+            # No solution at all
+            if bound is None:
+                break
+
+            # No solution within the bound - keep it as a fact
+            lower_bound = bound + 1
+            s.add(max_distance > bound)
+        else:
+            break
+
+    return result_dict
@@ -0,0 +1,65 @@
+import csv
+import os
+import sys
+
+from timeit import default_timer as timer
+
+from src.io_utils import problem_to_lists, read_input_file
+from src.SMT.SMT import solve_sat
+
+
+BENCHMARK_FIELDS = [
+    "instance", "m", "n", "pseudo_boolean", "build_time", "first_solution_time", "obj", "optimal", "time"
+]
+
+
+def benchmark_pb(instance_numbers, timeout=60000):
+    """
+    Solve each instance with the SMT model built with native pseudo-Boolean constraints and with sums of integers,
+    recording the timings (in s).
+
+    :param instance_numbers: list(int) - numbers of the instances to benchmark
+    :param timeout: int - time limit for solving each instance (ms)
+    :return: list(dict) - one row per instance and build, with the fields in BENCHMARK_FIELDS
+    """
+    rows = list()
+    for instance_number in instance_numbers:
+        m, n, li, sj, Di_j = problem_to_lists(
+            read_input_file(os.path.join("data", "problem_instances", "inst%02d.dat" % (instance_number, )))
+        )
+
+        for pseudo_boolean in (False, True):
+            print("Instance", instance_number, "- pseudo-Boolean" if pseudo_boolean else "- integer sums")
+            start_time = timer()
+            result = solve_sat(m, n, Di_j, sj, li, timeout=timeout, pseudo_boolean=pseudo_boolean)
+
+            # Models not built within the timeout have no build time
+            incumbents = result.get("incumbents") or [[None, None]]
+            rows.append({
+                "instance": instance_number,
+                "m": m,
+                "n": n,
+                "pseudo_boolean": pseudo_boolean,
+                "build_time": round(result.get("build_time", timer() - start_time), 3),
+                "first_solution_time": incumbents[0][0],
+                "obj": result["obj"],
+                "optimal": result["optimal"],
+                "time": round(result["time"], 3)
+            })
+
+    return rows
+
+
+def write_benchmark(rows, file_path):
+    with open(file_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=BENCHMARK_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    # python -m src.SMT.benchmark_pb <solving timeout (ms)> [instance numbers, all if none given]
+    timeout = int(sys.argv[1]) if len(sys.argv) > 1 else 60000
+    numbers = [int(arg) for arg in sys.argv[2:]] or range(1, 22)
+
+    write_benchmark(benchmark_pb(numbers, timeout=timeout), os.path.join("data", "SMT_pb_benchmark.csv"))
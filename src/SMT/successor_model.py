@@ -0,0 +1,152 @@
+from z3 import *
+
+from src.heuristics import route_distance
+from src.route_utils import routes_from_successors
+from src.SMT.anytime import minimize
+from src.SMT.symmetry_breaking import assignment_symmetry_breaking
+
+
+def solve_successor(m, n, Di_j, sj, li, timeout=300000, on_incumbent=None, initial_routes=None, lower_bound=None,
+                    compatible=None, arc_mask=None, symmetries=None):
+    """
+    SMT model based on a successor and a courier per item, instead of a Boolean per courier and pair of locations.
+
+    The routes form a single circuit over the items and one copy of the depot per courier: the copy n + i starts the
+    route of courier i, and the last item of courier i is followed by the copy of courier i + 1 (courier m - 1 goes
+    back to the copy n). The size of the model grows with (n + m)^2 instead of m * (n + 1)^2.
+
+    :param m: int - number of couriers
+    :param n: int - number of items
+    :param Di_j: list(list(int)) - distances between each two locations (the depot is the last one)
+    :param sj: list(int) - size of each item
+    :param li: list(int) - maximum load of each courier
+    :param timeout: int - time limit for solving (ms)
+    :param on_incumbent: function(dict) - called after every improving solution (see anytime.minimize)
+    :param initial_routes: list(list(int)) - heuristic solution (items 0-based), the first incumbent and the initial
+                           values of the successors
+    :param lower_bound: int - lower bound of the objective (see bounds.objective_lower_bound), the round trip one if
+                        not given
+    :param compatible: ndarray - items each courier can carry (see preprocessing.preprocess), all if not given
+    :param arc_mask: ndarray - arcs each courier may travel (see preprocessing.preprocess), all if not given
+    :param symmetries: dict - symmetries of the instance to break (see symmetry.detect_symmetries), none if not given:
+                       the initial routes must satisfy the constraints (see symmetry.canonical_routes)
+    :return: dict - the best solution found, as returned by anytime.minimize
+    """
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ PRELIMINARIES ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    s = Solver()
+
+    # Nodes of the circuit: the items, then a copy of the depot for each courier
+    NODES = range(n + m)
+    location = [j for j in range(n)] + [n] * m
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ VARIABLES ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    # Node visited right after each node
+    succ = [Int(f'succ_{v}') for v in NODES]
+
+    # Distance from each node to its successor
+    arc_distance = [Int(f'arc_distance_{v}') for v in NODES]
+
+    # Courier visiting each node, and position of each node in the circuit (for subtour elimination)
+    courier = Function('courier', IntSort(), IntSort())
+    rank = Function('rank', IntSort(), IntSort())
+
+    # Initialize variable to be used in the objective function
+    max_distance = Int('max_distance')
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ CONSTRAINTS ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    # Successors form a permutation of the nodes, without fixed points
+    s.add([And(succ[v] >= 0, succ[v] < n + m, succ[v] != v) for v in NODES])
+    s.add(Distinct(succ))
+
+    # Each copy of the depot belongs to its courier, and each item to one of the couriers
+    s.add([courier(n + i) == i for i in range(m)])
+    s.add([And(courier(j) >= 0, courier(j) < m) for j in range(n)])
+
+    # An item is followed by an item of the same courier, or by the depot copy of the next courier
+    for v in NODES:
+        s.add(If(
+            succ[v] < n,
+            courier(succ[v]) == courier(v),
+            succ[v] == If(courier(v) == m - 1, n, n + courier(v) + 1)
+        ))
+
+    # Single circuit: every node but the first depot copy comes right after its predecessor
+    s.add(rank(n) == 0)
+    s.add([Implies(succ[v] != n, rank(succ[v]) == rank(v) + 1) for v in NODES])
+
+    # Preprocessing - no courier carries an item too large for it, and no node is followed by a node it can't be
+    # followed by on any route: an item by an item no courier goes to from it, a depot copy by an item its courier
+    # doesn't start with, an item by the copy of the next courier if the previous one doesn't end with it
+    if compatible is not None:
+        s.add([courier(j) != i for i in range(m) for j in range(n) if not compatible[i, j]])
+
+    def allowed(v, w):
+        if arc_mask is None:
+            return True
+        if v < n and w < n:
+            return bool(arc_mask[:, v, w].any())
+        if v >= n and w < n:
+            return bool(arc_mask[v - n, n, w])
+        if v < n:
+            return bool(arc_mask[(w - n - 1) % m, v, n])
+        return True
+
+    # Distance to the successor
+    for v in NODES:
+        for w in NODES:
+            if w == v:
+                continue
+            if allowed(v, w):
+                s.add(Implies(succ[v] == w, arc_distance[v] == Di_j[location[v]][location[w]]))
+            else:
+                s.add(succ[v] != w)
+
+    # Symmetry breaking - couriers with the same capacity and interchangeable items (see symmetry_breaking.py), and
+    # with symmetric distances, each route starts with its lower numbered end: the first item (the successor of the
+    # depot copy) is at most the last one (followed by the next copy)
+    if symmetries is not None:
+        s.add(assignment_symmetry_breaking(symmetries, m, n, lambda i, j: courier(j) == i))
+        if symmetries["symmetric_distances"]:
+            s.add([
+                Implies(And(succ[n + i] < n, succ[j] == n + (i + 1) % m), succ[n + i] <= j)
+                for i in range(m) for j in range(n)
+            ])
+
+    # Load capacity constraint
+    s.add([Sum([If(courier(j) == i, sj[j], 0) for j in range(n)]) <= li[i] for i in range(m)])
+
+    # Objective function, minimizes the maximum distance that any one courier has to travel
+    distances = [
+        arc_distance[n + i] + Sum([If(courier(j) == i, arc_distance[j], 0) for j in range(n)]) for i in range(m)
+    ]
+    s.add([distance <= max_distance for distance in distances])
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ SOLVING ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def decode(model):
+        # Successors of the items and of the depot copies, -1 when going back to the depot
+        successors = [model.eval(succ[v], model_completion=True).as_long() for v in NODES]
+        successors = [successor if successor < n else -1 for successor in successors]
+
+        return routes_from_successors(successors[:n], successors[n:])
+
+    # Start from the heuristic solution: each depot copy is followed by the items of its courier, then by the next copy
+    incumbent = None
+    if initial_routes is not None:
+        for i, route in enumerate(initial_routes):
+            nodes = [n + i] + route + [n + (i + 1) % m]
+            for v, w in zip(nodes[:-1], nodes[1:]):
+                s.set_initial_value(succ[v], IntVal(w))
+        incumbent = (
+            max(route_distance(route, Di_j, n) for route in initial_routes),
+            [[j + 1 for j in route] for route in initial_routes]
+        )
+
+    # Minimize the maximum distance, keeping the best solution found within the time limit
+    # Whoever delivers an item makes at least the round trip to it
+    if lower_bound is None:
+        lower_bound = max(Di_j[n][j] + Di_j[j][n] for j in range(n))
+
+    return minimize(
+        s, max_distance, distances, decode, lower_bound=lower_bound, timeout=timeout, on_incumbent=on_incumbent,
+        incumbent=incumbent
+    )
@@ -0,0 +1,38 @@
+from z3 import *
+
+
+def assignment_symmetry_breaking(symmetries, m, n, delivers):
+    """
+    Symmetry breaking constraints on the assignment of the items to the couriers, shared by the SMT models (the
+    constraints on the direction of the routes depend on the model):
+    - of two couriers with the same capacity, the first item either of them delivers is delivered by the lower
+      numbered one;
+    - of two interchangeable items, the lower numbered one is delivered by a courier numbered no higher than the
+      courier of the other.
+    Both hold for the lexicographically smallest assignment of each class of symmetric solutions (the courier of each
+    item, in the order of the items), which satisfies them all at once.
+
+    :param symmetries: dict - symmetries of the instance (see symmetry.detect_symmetries)
+    :param m: int - number of couriers
+    :param n: int - number of items
+    :param delivers: function(int, int) -> BoolRef - whether courier i delivers item j
+    :return: list(BoolRef) - the constraints
+    """
+    constraints = list()
+
+    for group in symmetries["identical_capacities"]:
+        for i1, i2 in zip(group[:-1], group[1:]):
+            # Whether courier i1 delivers any of the items before item j
+            delivers_before = [Bool(f'delivers_before_{i1}_{j}') for j in range(n)]
+            constraints.append(Not(delivers_before[0]))
+            for j in range(n):
+                if j > 0:
+                    constraints.append(delivers_before[j] == Or(delivers_before[j - 1], delivers(i1, j - 1)))
+                constraints.append(Implies(delivers(i2, j), delivers_before[j]))
+
+    for group in symmetries["interchangeable_items"]:
+        for j1, j2 in zip(group[:-1], group[1:]):
+            for i in range(m):
+                constraints.append(Implies(delivers(i, j1), Or([delivers(i2, j2) for i2 in range(i, m)])))
+
+    return constraints
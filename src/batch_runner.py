@@ -0,0 +1,90 @@
+import multiprocessing
+import os
+import signal
+import time
+
+
+# Time between two checks of the running worker processes (in seconds)
+POLL_INTERVAL = 0.5
+
+
+def _run_task(target, args):
+    """
+    Entry point of a worker process. Moves the worker into its own process group, so that the whole process tree
+    (e.g. the minizinc subprocess of a CP run) can be killed when the deadline is exceeded.
+
+    :param target: callable - function to execute
+    :param args: tuple - arguments of the function
+    :return: None
+    """
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+
+    target(*args)
+
+
+def _kill(process):
+    """
+    Kill a worker process, together with all the processes it started.
+
+    :param process: multiprocessing.Process - the worker to kill
+    :return: None
+    """
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    else:
+        process.kill()
+
+    process.join()
+
+
+def run_batch(tasks, target, workers=None, deadline=330):
+    """
+    Run target(*task) for every task, each one in its own process, with at most `workers` processes at the same time.
+    A task still running `deadline` seconds after its start is killed (the deadline can also depend on the task).
+
+    :param tasks: list(tuple) - arguments for each call of the target
+    :param target: callable - function to execute for each task; must be importable by the worker processes
+    :param workers: int - maximum number of parallel worker processes (defaults to the number of cores)
+    :param deadline: float or callable(tuple) -> float - wall-clock limit for each task (or function of the task giving
+                     it), in seconds
+    :return: dict(tuple -> str) - final status of each task ("done", "failed" or "timeout")
+    """
+    if workers is None or workers <= 0:
+        workers = os.cpu_count() or 1
+
+    # Spawned workers behave the same on every platform, and don't inherit any solver state from the parent
+    context = multiprocessing.get_context("spawn")
+
+    pending = list(tasks)
+    running = dict()
+    statuses = dict()
+
+    while pending or running:
+        # Fill the free worker slots
+        while pending and len(running) < workers:
+            task = pending.pop(0)
+            process = context.Process(target=_run_task, args=(target, task))
+            process.start()
+            running[task] = (process, time.time(), deadline(task) if callable(deadline) else deadline)
+
+        time.sleep(POLL_INTERVAL)
+
+        # Collect finished workers and kill the ones over the deadline
+        for task, (process, started, task_deadline) in list(running.items()):
+            if not process.is_alive():
+                process.join()
+                statuses[task] = "done" if process.exitcode == 0 else "failed"
+            elif time.time() - started > task_deadline:
+                _kill(process)
+                statuses[task] = "timeout"
+            else:
+                continue
+
+            print("Finished", task, "-", statuses[task])
+            del running[task]
+
+    return statuses
@@ -0,0 +1,179 @@
+import math
+
+import numpy as np
+
+from scipy.optimize import linear_sum_assignment, linprog
+
+from src.heuristics import heuristic_solution, route_distance
+from src.preprocessing import shortest_distances
+
+
+def distance_lower_bound(instance):
+    """
+    Lower bound of the objective: whoever delivers the farthest item makes at least the round trip to it. The round
+    trip is measured along the shortest paths, since without the triangle inequality the other items of the route may
+    be a shortcut to it.
+
+    :param instance: MCPProblem - the instance
+    :return: int - the bound
+    """
+    n = instance.n_items
+    d = shortest_distances(instance.distances)
+
+    return int((d[n, :n] + d[:n, n]).max())
+
+
+def assignment_lower_bound(instance):
+    """
+    Lower bound of the objective from the assignment relaxation: with one copy of the depot per courier, every
+    location is left exactly once, so the total distance is at least that of the cheapest assignment of a successor to
+    each location (which may form subtours), and the longest route at least that total over the number of couriers.
+
+    :param instance: MCPProblem - the instance
+    :return: int - the bound
+    """
+    n, m = instance.n_items, instance.n_couriers
+    d = np.asarray(instance.distances, dtype=float)
+
+    # Items, then the depot copies: a copy followed by another one is an empty route
+    locations = np.concatenate((np.arange(n), np.full(m, n)))
+    cost = d[np.ix_(locations, locations)]
+    cost[n:, n:] = 0
+    np.fill_diagonal(cost, np.inf)
+
+    rows, cols = linear_sum_assignment(cost)
+
+    return int(math.ceil(cost[rows, cols].sum() / m))
+
+
+def lp_lower_bound(instance):
+    """
+    Lower bound of the objective from the LP relaxation of the assignment of the items to the couriers, under the
+    capacities: every route is at least as long as the shortest ways to reach each of its items, so the longest route
+    is at least max_i sum_j a_j * y_ij, where a_j is the shortest way to item j and y_ij the fraction of item j
+    delivered by courier i (and likewise with the shortest ways to leave each item). The LP is solved locally, with
+    HiGHS.
+
+    :param instance: MCPProblem - the instance
+    :return: int - the bound (0 if the LP can't be solved)
+    """
+    n, m = instance.n_items, instance.n_couriers
+    d = np.array(instance.distances, dtype=float)
+    np.fill_diagonal(d, np.inf)
+    shortest_ways_in = d[:, :n].min(axis=0)
+    shortest_ways_out = d[:n, :].min(axis=1)
+    sizes = np.asarray(instance.sizes, dtype=float)
+
+    # Variables y (courier-major), then the objective z
+    c = np.zeros(m * n + 1)
+    c[-1] = 1
+
+    # Each courier: sum_j a_j * y_ij - z <= 0 (ways in and ways out), and sum_j s_j * y_ij <= l_i
+    a_ub = np.zeros((3 * m, m * n + 1))
+    for i in range(m):
+        a_ub[i, i * n:(i + 1) * n] = shortest_ways_in
+        a_ub[m + i, i * n:(i + 1) * n] = shortest_ways_out
+        a_ub[2 * m + i, i * n:(i + 1) * n] = sizes
+    a_ub[:2 * m, -1] = -1
+    b_ub = np.concatenate((np.zeros(2 * m), np.asarray(instance.max_loads, dtype=float)))
+
+    # Each item: sum_i y_ij = 1
+    a_eq = np.zeros((n, m * n + 1))
+    for i in range(m):
+        a_eq[:, i * n:(i + 1) * n] = np.eye(n)
+
+    result = linprog(c, A_ub=a_ub, b_ub=b_ub, A_eq=a_eq, b_eq=np.ones(n), bounds=(0, None), method="highs")
+    if result.status != 0:
+        return 0
+
+    # Rounded up (the objective is an integer), with a tolerance so that LP values a hair above an integer stay on it
+    return int(math.ceil(result.fun - 1e-6))
+
+
+def objective_lower_bound(instance):
+    """
+    Best lower bound of the objective: the largest of the round trip, assignment and LP bounds.
+
+    :param instance: MCPProblem - the instance
+    :return: int - the bound
+    """
+    return max(distance_lower_bound(instance), assignment_lower_bound(instance), lp_lower_bound(instance))
+
+
+def optimality_gap(obj, lower_bound, optimal=False):
+    """
+    Proven relative gap of a solution: how much its objective may exceed the optimal one, as a fraction of it.
+
+    :param obj: int - objective of the solution (None if there is no solution)
+    :param lower_bound: int - lower bound of the objective
+    :param optimal: bool - whether the solution was proven optimal
+    :return: float - the gap (0 for optimal solutions, None if there is no solution)
+    """
+    if obj is None:
+        return None
+    if optimal or obj <= lower_bound:
+        return 0.0
+
+    return round((obj - lower_bound) / obj, 4)
+
+
+def max_items_per_courier(instance):
+    """
+    Most items each courier can carry: as many of the smallest items as fit in its capacity.
+
+    :param instance: MCPProblem - the instance
+    :return: list(int) - one value per courier
+    """
+    cumulative_sizes = np.cumsum(np.sort(np.asarray(instance.sizes)))
+
+    return np.searchsorted(cumulative_sizes, np.asarray(instance.max_loads), side="right").tolist()
+
+
+def item_distance_upper_bounds(instance):
+    """
+    Longest way to reach each item (from the depot or from another item), plus the way back to the depot.
+
+    :param instance: MCPProblem - the instance
+    :return: list(int) - one value per item
+    """
+    n = instance.n_items
+    d = np.array(instance.distances, dtype=np.int64)
+    np.fill_diagonal(d, 0)
+
+    return (d[:, :n].max(axis=0) + d[:n, n]).tolist()
+
+
+def distance_upper_bound(instance, routes=None):
+    """
+    Upper bound of the objective: the longest route of a heuristic solution. If the heuristic can't place all the
+    items, the longest route any courier could make.
+
+    :param instance: MCPProblem - the instance
+    :param routes: list(list(int)) - heuristic solution (items 0-based), computed if not given
+    :return: int - the bound
+    """
+    if routes is None:
+        routes, _ = heuristic_solution(instance)
+
+    if routes is not None:
+        return max(route_distance(route, instance.distances, instance.n_items) for route in routes)
+
+    return max(courier_distance_upper_bounds(instance))
+
+
+def courier_distance_upper_bounds(instance, upper_bound=None):
+    """
+    Longest route each courier could make: the longest ways to reach as many items as it can carry.
+
+    :param instance: MCPProblem - the instance
+    :param upper_bound: int - bound of the objective, limiting every route (none if not given)
+    :return: list(int) - one value per courier
+    """
+    item_bounds = np.sort(item_distance_upper_bounds(instance))[::-1]
+    cumulative_bounds = np.concatenate(([0], np.cumsum(item_bounds)))
+
+    bounds = [int(cumulative_bounds[count]) for count in max_items_per_courier(instance)]
+    if upper_bound is not None:
+        bounds = [min(bound, upper_bound) for bound in bounds]
+
+    return bounds
@@ -3,6 +3,11 @@ import re
 import sys
 import json
 
+# Run as a script from the project root: make the src package importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.io_utils import read_input_file
+
 TIMEOUT = 300
 # OPT[i] = Optimal value for instance i. 
 OPT = [None, 14, 226, 12, 220, 206]
@@ -46,25 +51,10 @@ def main(args):
         inst_number = '0' + inst_number
       inst_path = args[1] + '/inst' + inst_number + '.dat'
       print(f'\tLoading input instance {inst_path}')
-      with open(inst_path) as inst_file:
-        i = 0        
-        for line in inst_file:
-          if i == 0:
-            n_couriers = int(line)
-          elif i == 1:
-            n_items = int(line)
-            dist_matrix = [None] * (n_items + 1)
-          elif i == 2:
-            capacity = [int(x) for x in line.split()]
-            assert len(capacity) == n_couriers
-          elif i == 3:
-            sizes = [int(x) for x in line.split()]
-            assert len(sizes) == n_items
-          else:
-            row = [int(x) for x in line.split()]
-            assert len(row) == n_items + 1
-            dist_matrix[i-4] = [int(x) for x in row]
-          i += 1
+      instance = read_input_file(inst_path)
+      n_items = instance.n_items
+      capacity, sizes = instance.max_loads, instance.sizes
+      dist_matrix = instance.distances.tolist()
       for i in range(len(dist_matrix)):
         assert dist_matrix[i][i] == 0
       for solver, result in results.items():
@@ -0,0 +1,77 @@
+from src.local_search import construct_routes, improve_routes
+
+
+def nearest_neighbor_heuristic(Di_j, m, n, sj, li):
+    routes = []
+    unvisited_locations = set(range(n))
+    max_distances = [0] * m
+    current_load = [0] * m
+
+    for i in range(m):
+        # Sets depot as starting location
+        start = [n]
+        routes.append(start)
+
+    while unvisited_locations:
+        nearest_neighbors = {}
+        for i in range(m):
+            current_location = routes[i][-1]
+            feasible_neighbors = [j for j in unvisited_locations if current_load[i] + sj[j] <= li[i]]
+
+            if not feasible_neighbors:
+                continue  # Skip to the next courier if no feasible neighbors
+
+            # Finds next location that minimizes distance travelled by courier i
+            best_customer = min(feasible_neighbors, key=lambda j: max_distances[i] + Di_j[current_location][j])
+            nearest_neighbors[i] = best_customer
+
+        if not nearest_neighbors:
+            break  # Break the loop if no feasible neighbors for any courier
+
+        # Finds next location that minimizes the maximum distance travelled by any courier
+        closest_courier = min(
+            nearest_neighbors.keys(),
+            key=lambda j: Di_j[routes[j][-1]][nearest_neighbors[j]] + max_distances[j])
+
+        # Update the current demand for the selected courier
+        current_load[closest_courier] += sj[nearest_neighbors[closest_courier]]
+
+        max_distances[closest_courier] += Di_j[routes[closest_courier][-1]][nearest_neighbors[closest_courier]]
+
+        routes[closest_courier].append(nearest_neighbors[closest_courier])
+        # Removes the nearest neighbor from list of available locations
+        unvisited_locations.remove(nearest_neighbors[closest_courier])
+
+    # Return to the depot
+    [route.append(n) for route in routes]
+    return routes
+
+
+def route_distance(route, distances, depot):
+    """
+    Distance travelled by a courier delivering the items of a route, from the depot and back.
+
+    :param route: list(int) - items (0-based) delivered by the courier, in order
+    :param distances: ndarray - distances between each two delivery points (the depot is the last one)
+    :param depot: int - index of the depot (n)
+    :return: int - total distance
+    """
+    locations = [depot] + list(route) + [depot]
+    return sum(int(distances[a][b]) for a, b in zip(locations[:-1], locations[1:]))
+
+
+def heuristic_solution(instance, time_limit=10):
+    """
+    Solution of an instance found with the sorted-neighbour construction, improved by local search (see
+    local_search.py).
+
+    :param instance: MCPProblem - the instance
+    :param time_limit: float - time limit for the local search (s)
+    :return: (list(list(int)), int) - items (0-based) delivered by each courier in order, and the maximum distance,
+             or (None, None) if no courier could take some of the items
+    """
+    routes = construct_routes(instance)
+    if routes is None:
+        return None, None
+
+    return improve_routes(instance, routes, time_limit)
@@ -1,42 +1,103 @@
+import hashlib
 import json
 import math
 import os
+import tempfile
 
 import numpy as np
 
 from src.MCPProblem import MCPProblem
+from src.route_utils import routes_from_predecessors
 
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where parallel writes are not locked
+    fcntl = None
 
-def read_input_file(file_path):
+
+def _integer_dtype(values, n_items):
+    # Smallest signed integer type holding the values, and the total of a route, that is of up to n_items + 1
+    # distances, so that adding up distances in the array type can't overflow
+    largest = int(values.max(initial=0)) * (n_items + 1)
+    for dtype in (np.int8, np.int16, np.int32):
+        if largest <= np.iinfo(dtype).max:
+            return dtype
+
+    return np.int64
+
+
+def _parse_input(content, file_path):
+    # All the integers of a file in the official format, in order, checked against the numbers of couriers and items
+    values = np.fromstring(content.decode(), dtype=np.int64, sep=" ")
+    if len(values) < 2:
+        raise ValueError("%s: missing the number of couriers and items" % file_path)
+
+    n_couriers, n_items = int(values[0]), int(values[1])
+    expected = 2 + n_couriers + n_items + (n_items + 1) ** 2
+    if len(values) != expected:
+        raise ValueError("%s: %d values instead of %d, for %d couriers and %d items" % (
+            file_path, len(values), expected, n_couriers, n_items
+        ))
+
+    return values.astype(_integer_dtype(values, n_items))
+
+
+def read_input_file(file_path, cache=True):
     """
     Function to read information from a file given in the official format.
 
+    The file is parsed in a single pass, and the distances are kept in the smallest integer type holding the length
+    of any route. The parsed values are cached in a .npy file, in a .cache folder next to the input file and named
+    after the hash of its content: the next reads of the same content only map the cache into memory.
+
     :param file_path: str - path to the input file, relative to the project root
+    :param cache: bool - read and write the cache (the file is parsed again if the cache can't be written)
     :return: MCPProblem object, containing the information read from the file
     """
     # Read file
-    with open(file_path) as fin:
-        content = fin.readlines()
-
-    # Parse file
-    n_couriers = int(content[0][:-1])
-    n_items = int(content[1][:-1])
+    with open(file_path, "rb") as fin:
+        content = fin.read()
+
+    cache_path = os.path.join(
+        os.path.dirname(file_path), ".cache", hashlib.sha256(content).hexdigest() + ".npy"
+    )
+    if cache and os.path.exists(cache_path):
+        values = np.load(cache_path, mmap_mode="r")
+    else:
+        values = _parse_input(content, file_path)
+        if cache:
+            # Through a temporary file, so that a concurrent read never finds a partially written cache
+            try:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                tmp_cache_path = cache_path + ".%d.tmp" % os.getpid()
+                with open(tmp_cache_path, "wb") as f:
+                    np.save(f, values)
+                os.replace(tmp_cache_path, cache_path)
+            except OSError:
+                pass
+
+    # Split the values: numbers of couriers and items, loads, sizes and distances (a view of the cache, if mapped)
+    n_couriers, n_items = int(values[0]), int(values[1])
+    max_loads = values[2:2 + n_couriers].tolist()
+    sizes = values[2 + n_couriers:2 + n_couriers + n_items].tolist()
+    distances = values[2 + n_couriers + n_items:].reshape(n_items + 1, n_items + 1)
 
-    max_loads = list()
-    for max_load in content[2][:-1].split():
-        max_loads.append(int(max_load))
+    return MCPProblem(n_couriers, n_items, max_loads, sizes, distances)
 
-    sizes = list()
-    for size in content[3][:-1].split():
-        sizes.append(int(size))
 
-    distances = np.zeros([n_items + 1, n_items + 1], dtype=int)
-    for i in range(n_items + 1):
-        distances_row = content[4 + i][:-1].split()
-        for j in range(n_items + 1):
-            distances[i][j] = int(distances_row[j])
+def problem_to_lists(problem):
+    """
+    Data of a problem as the SMT and MIP models take it, with the distances as nested lists (single distances are
+    read much faster from these than from the array).
 
-    return MCPProblem(n_couriers, n_items, max_loads, sizes, distances)
+    :param problem: MCPProblem - object containing the data of the problem
+    :return: (int, int, list(int), list(int), list(list(int))) - m, n, li, sj and Di_j
+    """
+    return (
+        problem.n_couriers, problem.n_items, list(problem.max_loads), list(problem.sizes),
+        np.asarray(problem.distances).tolist()
+    )
 
 
 def create_dzn(problem, file_path):
@@ -72,70 +133,133 @@ def create_dzn(problem, file_path):
     return None
 
 
-def output_to_dict_cp(text, experiment_name, time, courier_number):
-    to_return = dict()
+def warm_start_to_dzn(problem, routes, max_dist, lower_bound=0):
+    """
+    Heuristic solution in the format of the warm start parameters of the CP model, to be given with the -D option of
+    MiniZinc. Without a heuristic solution, the parameters only bound the objective by the longest possible route.
 
-    if text == '':
-        return to_return
+    :param problem: MCPProblem - object containing the data of the problem
+    :param routes: list(list(int)) - items (0-based) delivered by each courier in order, or None
+    :param max_dist: int - maximum distance of the routes
+    :param lower_bound: int - lower bound of the objective
+    :return: str - the parameters, in dzn format
+    """
+    n = problem.n_items
+    courier_assignment = [1] * n
+    pre = [n + 1] * n
 
-    if ("UNKNOWN" not in text) and ("ERROR" not in text):
-        experiment_results = dict()
+    if routes is None:
+        max_dist = int(np.asarray(problem.distances)[:n].max(axis=1).sum() + np.asarray(problem.distances)[n].max())
+    else:
+        for courier, route in enumerate(routes):
+            for position, item in enumerate(route):
+                courier_assignment[item] = courier + 1
+                pre[item] = route[position - 1] + 1 if position > 0 else n + 1
 
-        # Write time int
-        if time > 285:
-            time = 300
-        experiment_results["time"] = int(math.floor(time))
+    return "warm_courier_assignment = %s; warm_pre = %s; warm_max_dist = %d; min_dist_bound = %d;" % (
+        courier_assignment, pre, max_dist, lower_bound
+    )
 
-        # Write optimal bool
-        if "==========" in text:
-            experiment_results["optimal"] = True
-        else:
-            experiment_results["optimal"] = False
 
-        # Write total distance int
-        experiment_results["obj"] = int(text[text.rfind("dist = ") + len("dist = "):text.rfind(";")])
+def preprocessing_to_dzn(compatible, arc_mask):
+    """
+    Preprocessing of an instance (see preprocessing.preprocess) in the format of the parameters of the CP model, to be
+    given with the -D option of MiniZinc. The arcs are the ones some courier may travel.
+
+    :param compatible: ndarray - (m, n) items each courier can carry
+    :param arc_mask: ndarray - (m, n + 1, n + 1) arcs each courier may travel
+    :return: str - the parameters, in dzn format
+    """
+    def to_dzn(table):
+        return "[|" + "|".join(", ".join("true" if value else "false" for value in row) for row in table) + "|]"
+
+    return "compatible = %s; allowed_arc = %s;" % (to_dzn(compatible), to_dzn(np.asarray(arc_mask).any(axis=0)))
+
+
+def symmetries_to_dzn(symmetries):
+    """
+    Symmetries of an instance (see symmetry.detect_symmetries) in the format of the parameters of the CP model, to be
+    given with the -D option of MiniZinc. Each group of interchangeable items is given as pairs of consecutive items
+    (1-based); the couriers with the same capacity are found by the model itself.
+
+    :param symmetries: dict - the symmetries of the instance
+    :return: str - the parameters, in dzn format
+    """
+    pairs = [(j + 1, k + 1) for group in symmetries["interchangeable_items"] for j, k in zip(group[:-1], group[1:])]
+
+    return "symmetric_distances = %s; interchangeable_first = %s; interchangeable_second = %s;" % (
+        "true" if symmetries["symmetric_distances"] else "false", [j for j, _ in pairs], [k for _, k in pairs]
+    )
+
 
-        # Write list of item delivery order
-        start_ca_list_idx = text.rfind("courier_assignment = ") + len("courier_assignment = ")
-        courier_assignment = list(
-            map(int, text[start_ca_list_idx:start_ca_list_idx + text[start_ca_list_idx:].find(";")][1:-1].split(', ')))
+def output_to_dict_cp(text, experiment_name, time, courier_number, warm_routes=None, warm_max_dist=None):
+    """
+    Results of a CP run from the output of MiniZinc. Without a solution in the output (e.g. UNKNOWN when none was found
+    in time), the heuristic solution the model started from is the best one found.
+
+    :param text: str - output of MiniZinc
+    :param experiment_name: str - name of the experiment, used as key
+    :param time: float - duration of the run (s)
+    :param courier_number: int - number of couriers
+    :param warm_routes: list(list(int)) - items (0-based) of each courier in the heuristic solution, or None
+    :param warm_max_dist: int - maximum distance of the heuristic solution
+    :return: dict - the results by experiment name, empty without any solution
+    """
+    to_return = dict()
 
-        start_pre_list_idx = text.rfind("pre = ") + len("pre = ")
-        pre = list(map(int, text[start_pre_list_idx:start_pre_list_idx + text[start_pre_list_idx:]
-                       .find(";")][1:-1].split(', ')))
+    if text == '' or "UNKNOWN" in text or "ERROR" in text or "dist = " not in text:
+        if warm_routes is not None:
+            to_return[experiment_name] = {
+                "time": 300,
+                "optimal": False,
+                "obj": int(warm_max_dist),
+                "sol": [[item + 1 for item in route] for route in warm_routes]
+            }
+        return to_return
+
+    experiment_results = dict()
 
-        courier_assignment = np.array(courier_assignment)
-        pre = np.array(pre)
+    # Write time int
+    if time > 285:
+        time = 300
+    experiment_results["time"] = int(math.floor(time))
 
-        sol = list()
-        for i in range(courier_number):
-            local_sol = list()
+    # Write optimal bool
+    if "==========" in text:
+        experiment_results["optimal"] = True
+    else:
+        experiment_results["optimal"] = False
 
-            if (i + 1) not in courier_assignment:
-                sol.append(local_sol)
-                continue
+    # Write total distance int
+    experiment_results["obj"] = int(text[text.rfind("dist = ") + len("dist = "):text.rfind(";")])
 
-            current_item = np.argmax(np.logical_and(courier_assignment == (i + 1), pre == max(pre))) + 1
+    # Write list of item delivery order
+    start_ca_list_idx = text.rfind("courier_assignment = ") + len("courier_assignment = ")
+    courier_assignment = list(
+        map(int, text[start_ca_list_idx:start_ca_list_idx + text[start_ca_list_idx:].find(";")][1:-1].split(', ')))
 
-            local_sol.append(int(current_item))
-            while current_item in pre:
-                current_item = np.where(pre == current_item)[0] + 1
-                local_sol.append(int(current_item))
+    start_pre_list_idx = text.rfind("pre = ") + len("pre = ")
+    pre = list(map(int, text[start_pre_list_idx:start_pre_list_idx + text[start_pre_list_idx:]
+                   .find(";")][1:-1].split(', ')))
 
-            sol.append(local_sol)
-        experiment_results["sol"] = sol
+    # Both 1-based, with n + 1 as predecessor of the first items
+    courier_assignment = np.array(courier_assignment)
+    pre = np.array(pre)
 
-        to_return[experiment_name] = experiment_results
+    experiment_results["sol"] = routes_from_predecessors(
+        np.where(pre > len(pre), -1, pre - 1),
+        courier_assignment - 1,
+        courier_number
+    )
+
+    to_return[experiment_name] = experiment_results
 
     return to_return
 
 
 def write_to_json(data, instance_number, model_type):
     # Prepare directories if they don't exist yet
-    if not os.path.exists("res"):
-        os.mkdir("res")
-    if not os.path.exists(os.path.join("res", model_type)):
-        os.mkdir(os.path.join("res", model_type))
+    os.makedirs(os.path.join("res", model_type), exist_ok=True)
 
     # Prepare json path
     if isinstance(instance_number, int):
@@ -143,17 +267,34 @@ def write_to_json(data, instance_number, model_type):
     else:
         json_file_path = os.path.join("res", model_type, instance_number + "json")
 
-    # Read existing data from the json
-    if os.path.exists(json_file_path):
-        with open(json_file_path, "r") as f:
-            loaded_data = json.load(f)
-    else:
-        loaded_data = dict()
-
-    # Add current results
-    for key in data.keys():
-        loaded_data[key] = data[key]
-
-    # Write the new, completed data
-    with open(json_file_path, "w") as f:
-        json.dump(loaded_data, f, indent=4)
+    # Parallel runs of the same instance merge their results one at a time (locking a separate file, since the json is
+    # replaced at every write)
+    with open(os.path.join(os.path.dirname(json_file_path), "." + os.path.basename(json_file_path) + ".lock"),
+              "w") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+        # Read existing data from the json
+        if os.path.exists(json_file_path):
+            with open(json_file_path, "r") as f:
+                loaded_data = json.load(f)
+        else:
+            loaded_data = dict()
+
+        # Add current results
+        for key in data.keys():
+            loaded_data[key] = data[key]
+
+        # Write the new, completed data
+        # (through a hidden temporary file in the same directory, so that a killed process never leaves behind a
+        # partially written json, and the checker never reads the temporary one)
+        tmp_file = tempfile.NamedTemporaryFile("w", dir=os.path.dirname(json_file_path),
+                                               prefix="." + os.path.basename(json_file_path) + ".", suffix=".tmp",
+                                               delete=False)
+        try:
+            with tmp_file:
+                json.dump(loaded_data, tmp_file, indent=4)
+            os.replace(tmp_file.name, json_file_path)
+        except BaseException:
+            os.remove(tmp_file.name)
+            raise
@@ -0,0 +1,278 @@
+import numpy as np
+
+from timeit import default_timer as timer
+
+from src.solution import Solution
+
+
+def sorted_neighbors(distances, n_items):
+    """
+    Index of the nearest items: for each location, all the items (but itself) sorted by distance from it.
+
+    :param distances: ndarray - distances between each two locations (the depot is the last one)
+    :param n_items: int - number of items (n)
+    :return: list(list(int)) - one list of items (0-based) per location
+    """
+    order = np.argsort(np.asarray(distances)[:, :n_items], axis=1, kind="stable").tolist()
+
+    return [[k for k in row if k != j] for j, row in enumerate(order)]
+
+
+def construct_routes(instance):
+    """
+    Greedy construction, as in heuristics.nearest_neighbor_heuristic: at each step, the courier travelling the least
+    after moving to its nearest item that fits moves there. The nearest item of a courier is found by scanning the
+    sorted neighbour index of its location, from the first item not delivered yet, instead of all the items.
+    The items no courier can take at its turn are then inserted where they fit, lengthening the routes least.
+
+    :param instance: MCPProblem - the instance
+    :return: list(list(int)) - items (0-based) delivered by each courier in order, None if some item fits nowhere
+    """
+    n, m = instance.n_items, instance.n_couriers
+    d = np.asarray(instance.distances).tolist()
+    sizes = [int(size) for size in instance.sizes]
+    free = [int(max_load) for max_load in instance.max_loads]
+
+    neighbors = sorted_neighbors(d, n)
+    # Position, in the neighbour list of each location, of the first item possibly not delivered yet
+    first_position = [0] * (n + 1)
+    delivered = [False] * n
+
+    def nearest(i):
+        # Nearest item not delivered yet that fits courier i
+        row = neighbors[last[i]]
+        position = first_position[last[i]]
+        while position < len(row) and delivered[row[position]]:
+            position += 1
+        first_position[last[i]] = position
+
+        for k in row[position:]:
+            if not delivered[k] and sizes[k] <= free[i]:
+                return k
+        return None
+
+    routes = [list() for _ in range(m)]
+    last = [n] * m
+    lengths = [0] * m
+    while True:
+        best = None
+        for i in range(m):
+            k = nearest(i)
+            if k is not None and (best is None or lengths[i] + d[last[i]][k] < best[0]):
+                best = (lengths[i] + d[last[i]][k], i, k)
+        if best is None:
+            break
+
+        lengths[best[1]], i, k = best
+        routes[i].append(k)
+        last[i] = k
+        free[i] -= sizes[k]
+        delivered[k] = True
+
+    # Cheapest insertion of the items left, largest first
+    for k in sorted((k for k in range(n) if not delivered[k]), key=lambda k: -sizes[k]):
+        best = None
+        for i in range(m):
+            if sizes[k] > free[i]:
+                continue
+            path = [n] + routes[i] + [n]
+            for p in range(1, len(path)):
+                increase = d[path[p - 1]][k] + d[k][path[p]] - d[path[p - 1]][path[p]]
+                if best is None or increase < best[0]:
+                    best = (increase, i, p)
+        if best is None:
+            return pack_routes(instance)
+
+        _, i, p = best
+        routes[i].insert(p - 1, k)
+        free[i] -= sizes[k]
+
+    return routes
+
+
+def pack_routes(instance):
+    """
+    Construction for instances with tight capacities: the items are packed first (largest first, into the courier they
+    fit best, backtracking when some item fits nowhere), then the items of each courier are visited in nearest
+    neighbour order.
+
+    :param instance: MCPProblem - the instance
+    :return: list(list(int)) - items (0-based) delivered by each courier in order, None if some item fits nowhere
+    """
+    n, m = instance.n_items, instance.n_couriers
+    d = np.asarray(instance.distances).tolist()
+    sizes = [int(size) for size in instance.sizes]
+    free = [int(max_load) for max_load in instance.max_loads]
+
+    # Depth-first search over the couriers of each item, trying the tightest fit first, so that the first packing
+    # tried is the best fit one (couriers with the same free capacity are tried once, and the search is bounded)
+    order = sorted(range(n), key=lambda k: -sizes[k])
+    items = [list() for _ in range(m)]
+    nodes_left = [100000]
+
+    def pack(position):
+        if position == n:
+            return True
+        nodes_left[0] -= 1
+        if nodes_left[0] < 0:
+            return False
+
+        k = order[position]
+        tried = set()
+        for i in sorted(range(m), key=lambda i: free[i]):
+            if sizes[k] > free[i] or free[i] in tried:
+                continue
+            tried.add(free[i])
+
+            items[i].append(k)
+            free[i] -= sizes[k]
+            if pack(position + 1):
+                return True
+            free[i] += sizes[k]
+            items[i].pop()
+        return False
+
+    if not pack(0):
+        return None
+
+    routes = list()
+    for courier_items in items:
+        route = list()
+        location = n
+        while courier_items:
+            location = min(courier_items, key=lambda k: d[location][k])
+            courier_items.remove(location)
+            route.append(location)
+        routes.append(route)
+
+    return routes
+
+
+class _LocalSearch:
+    """
+    Local search over the routes of a solution, with the moves evaluated in O(1) by solution.Solution.
+    """
+    # Lengths of the segments exchanged between two routes (relocate, swap and cross-exchange)
+    RELOCATE = [(1, 0)]
+    SWAP = [(1, 1)]
+    CROSS_EXCHANGE = [(k1, k2) for k1 in range(1, 4) for k2 in range(4) if k1 + k2 > 2]
+
+    def __init__(self, solution):
+        """
+        :param solution: Solution - the solution to improve (modified)
+        """
+        self.solution = solution
+
+    def two_opt(self, r):
+        """
+        Best reversal of a segment of route r, if it shortens the route.
+
+        :return: bool - whether the route was improved
+        """
+        solution = self.solution
+        two_opt_delta = solution.two_opt_delta
+        last = len(solution.paths[r]) - 1
+
+        best = (0, None, None)
+        for i in range(1, last):
+            for j in range(i + 1, last):
+                delta = two_opt_delta(r, i, j)
+                if delta < best[0]:
+                    best = (delta, i, j)
+
+        _, i, j = best
+        if i is None:
+            return False
+
+        solution.two_opt(r, i, j)
+        return True
+
+    def exchange(self, r, segment_lengths):
+        """
+        Best exchange of a segment of route r with a segment of another route (empty to move the segment of r only),
+        under the capacities, if both routes end up shorter than route r was.
+
+        :param r: int - index of the route to shorten
+        :param segment_lengths: list((int, int)) - lengths of the segments of route r and of the other route
+        :return: bool - whether the route was improved
+        """
+        solution = self.solution
+        exchange_delta = solution.exchange_delta
+        length = solution.lengths[r]
+        others = [b for b in range(len(solution.paths)) if b != r]
+
+        best = (length, None)
+        for k1, k2 in segment_lengths:
+            for i in range(1, len(solution.paths[r]) - k1):
+                size = solution.segment_size(r, i, k1)
+                for b in others:
+                    other_length, other_sizes = solution.lengths[b], solution.prefix_sizes[b]
+                    # Sizes the segment of route b may have, for both routes to stay within the capacities
+                    min_size = solution.loads[b] + size - solution.capacities[b]
+                    max_size = solution.capacities[r] - solution.loads[r] + size
+                    for p in range(1, len(solution.paths[b]) - k2):
+                        if not min_size <= other_sizes[p + k2] - other_sizes[p] <= max_size:
+                            continue
+
+                        delta_r, delta_b = exchange_delta(r, i, k1, b, p, k2)
+                        new_length = max(length + delta_r, other_length + delta_b)
+                        if new_length < best[0]:
+                            best = (new_length, (r, i, k1, b, p, k2))
+
+        if best[1] is None:
+            return False
+
+        solution.exchange(*best[1])
+        return True
+
+    def improve(self, deadline=None):
+        """
+        Shorten the longest routes with 2-opt, relocate, swap and cross-exchange moves, until none of them improves a
+        longest route or the deadline is reached. Every move shortens a longest route without making the other route
+        as long, so the search always ends.
+
+        :param deadline: float - time (as given by timeit.default_timer) to stop at, none if not given
+        """
+        moves = [
+            self.two_opt,
+            lambda r: self.exchange(r, self.RELOCATE),
+            lambda r: self.exchange(r, self.SWAP),
+            lambda r: self.exchange(r, self.CROSS_EXCHANGE)
+        ]
+
+        improved = True
+        while improved and (deadline is None or timer() < deadline):
+            improved = False
+            longest = self.solution.max_length()
+            for r in [i for i, length in enumerate(self.solution.lengths) if length == longest]:
+                if any(move(r) for move in moves):
+                    improved = True
+                    break
+
+
+def improve_solution(solution, time_limit=None):
+    """
+    Improve a solution by local search (see _LocalSearch.improve).
+
+    :param solution: Solution - the solution (modified)
+    :param time_limit: float - time limit (s), none if not given
+    :return: int - the maximum distance of the improved solution
+    """
+    _LocalSearch(solution).improve(None if time_limit is None else timer() + time_limit)
+
+    return solution.objective()
+
+
+def improve_routes(instance, routes, time_limit=None):
+    """
+    Improve the routes of a solution by local search (see _LocalSearch.improve).
+
+    :param instance: MCPProblem - the instance
+    :param routes: list(list(int)) - items (0-based) delivered by each courier in order
+    :param time_limit: float - time limit (s), none if not given
+    :return: (list(list(int)), int) - the improved routes, and their maximum distance
+    """
+    solution = Solution(instance, routes)
+    obj = improve_solution(solution, time_limit)
+
+    return solution.routes, obj
@@ -0,0 +1,75 @@
+import numpy as np
+
+
+def compatibility_mask(instance):
+    """
+    Items each courier can carry: item j fits courier i if sizes[j] <= max_loads[i].
+
+    :param instance: MCPProblem - the instance
+    :return: ndarray - (m, n) bool, whether courier i can carry item j
+    """
+    return np.asarray(instance.sizes)[None, :] <= np.asarray(instance.max_loads)[:, None]
+
+
+def shortest_distances(distances):
+    """
+    Length of the shortest path between each two locations (Floyd-Warshall), which may be shorter than the direct
+    distance if the distances don't satisfy the triangle inequality.
+
+    :param distances: ndarray - distances between each two locations
+    :return: ndarray - the shortest path lengths
+    """
+    shortest = np.array(distances, dtype=np.int64)
+    for k in range(len(shortest)):
+        np.minimum(shortest, shortest[:, k, None] + shortest[None, k, :], out=shortest)
+
+    return shortest
+
+
+def arc_mask(instance, upper_bound=None, compatible=None):
+    """
+    Arcs each courier may travel in a solution whose objective is at most upper_bound. Courier i can travel from
+    location a to location b only if:
+    - it can carry both of them (the depot always), and both together when they are items;
+    - the shortest route through the arc, from the depot to a, over the arc and from b back to the depot, is within
+      the bound.
+    The depot loop (the route of a courier delivering nothing) is kept, the item loops are not.
+
+    :param instance: MCPProblem - the instance
+    :param upper_bound: int - bound of the objective (e.g. that of a heuristic solution), no arc is pruned by its
+                        distance if not given
+    :param compatible: ndarray - compatibility mask (see compatibility_mask), computed if not given
+    :return: ndarray - (m, n + 1, n + 1) bool, whether courier i may travel from location a to location b
+    """
+    n = instance.n_items
+    if compatible is None:
+        compatible = compatibility_mask(instance)
+
+    # Sizes and compatibility of the locations, with the depot last
+    sizes = np.append(np.asarray(instance.sizes), 0)
+    located = np.hstack((compatible, np.ones((len(compatible), 1), dtype=bool)))
+
+    mask = located[:, :, None] & located[:, None, :]
+    mask &= (sizes[:, None] + sizes[None, :])[None] <= np.asarray(instance.max_loads)[:, None, None]
+    mask[:, np.arange(n), np.arange(n)] = False
+
+    if upper_bound is not None:
+        shortest = shortest_distances(instance.distances)
+        through = shortest[n, :, None] + np.asarray(instance.distances) + shortest[None, :, n]
+        mask &= (through <= upper_bound)[None]
+
+    return mask
+
+
+def preprocess(instance, upper_bound=None):
+    """
+    Reduction of an instance shared by all the models: the item-courier compatibility mask, and the arcs each courier
+    may travel in a solution no worse than upper_bound (see arc_mask).
+
+    :param instance: MCPProblem - the instance
+    :param upper_bound: int - bound of the objective, none if not given
+    :return: (ndarray, ndarray) - (m, n) compatibility mask and (m, n + 1, n + 1) arc mask
+    """
+    compatible = compatibility_mask(instance)
+
+    return compatible, arc_mask(instance, upper_bound, compatible)
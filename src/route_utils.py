@@ -0,0 +1,131 @@
+import numpy as np
+
+
+def predecessors_from_table(pre_table):
+    """
+    Predecessor of each item, from a precedence table.
+
+    :param pre_table: ndarray(bool) - n x n table, pre_table[i][j] true if item j is delivered immediately before item i
+    :return: ndarray(int) - predecessor of each item, -1 for the first items of the couriers
+    """
+    pre_table = np.asarray(pre_table, dtype=bool)
+
+    return np.where(pre_table.any(axis=1), pre_table.argmax(axis=1), -1)
+
+
+def routes_from_successors(successors, firsts):
+    """
+    Build the route of each courier in linear time, following the successors of its first item.
+
+    :param successors: array(int) - successor of each item (0-based), -1 for the last items of the couriers
+    :param firsts: array(int) - first item (0-based) of each courier, -1 for the couriers delivering no item
+    :return: list(list(int)) - items (1-based, as in the output format) delivered by each courier, in order
+    """
+    successors = np.asarray(successors).tolist()
+    n = len(successors)
+
+    routes = list()
+    for first in np.asarray(firsts).tolist():
+        route = list()
+        item = first
+        while item >= 0 and len(route) < n:
+            route.append(item + 1)
+            item = successors[item]
+        routes.append(route)
+
+    return routes
+
+
+def routes_from_predecessors(predecessors, couriers, n_couriers):
+    """
+    Build the route of each courier in linear time, following the successors of the first item of each courier.
+
+    :param predecessors: array(int) - predecessor of each item (0-based), -1 for the first items of the couriers
+    :param couriers: array(int) - courier (0-based) delivering each item
+    :param n_couriers: int - number of couriers
+    :return: list(list(int)) - items (1-based, as in the output format) delivered by each courier, in order
+    """
+    predecessors = np.asarray(predecessors)
+    n = len(predecessors)
+
+    # Invert the predecessor array
+    has_predecessor = predecessors >= 0
+    successors = np.full(n, -1)
+    successors[predecessors[has_predecessor]] = np.nonzero(has_predecessor)[0]
+
+    firsts = np.full(n_couriers, -1)
+    first_items = np.nonzero(~has_predecessor)[0]
+    firsts[np.asarray(couriers)[first_items]] = first_items
+
+    return routes_from_successors(successors, firsts)
+
+
+def arcs_from_values(values, n_couriers):
+    """
+    Arcs travelled by each courier, from the values of the arc variables of a model.
+
+    :param values: dict((int, int, int) -> float or bool) - value of the variable of each courier and pair of
+                   locations (0-based), true or above 0.5 if the courier travels from the first to the second
+    :param n_couriers: int - number of couriers
+    :return: list(list((int, int))) - arcs travelled by each courier
+    """
+    arcs = [list() for _ in range(n_couriers)]
+    for (courier, j, k), value in values.items():
+        if value > 0.5:
+            arcs[courier].append((j, k))
+
+    return arcs
+
+
+def routes_from_arcs(arcs, depot):
+    """
+    Build the route of each courier in linear time, following its arcs from the depot. Self-loops are ignored.
+
+    :param arcs: list(list((int, int))) - arcs (pairs of 0-based locations) travelled by each courier
+    :param depot: int - index of the depot (n)
+    :return: list(list(int)) - items (1-based, as in the output format) delivered by each courier, in order
+    """
+    routes = list()
+    for courier_arcs in arcs:
+        successors = {j: k for j, k in courier_arcs if j != k}
+
+        route = list()
+        location = successors.get(depot, depot)
+        while location != depot and len(route) < len(successors):
+            route.append(location + 1)
+            location = successors.get(location, depot)
+        routes.append(route)
+
+    return routes
+
+
+def subtours(successors, depot):
+    """
+    Cycles not going through the depot, in the arcs travelled by a courier.
+
+    :param successors: dict(int -> int) - next location after each location left by the courier (without self-loops)
+    :param depot: int - index of the depot
+    :return: list(list(int)) - locations of each cycle
+    """
+    # Locations reached from the depot
+    visited = {depot}
+    location = successors.get(depot)
+    while location is not None and location not in visited:
+        visited.add(location)
+        location = successors.get(location)
+
+    # The remaining arcs form cycles
+    cycles = list()
+    for start in successors:
+        if start in visited:
+            continue
+
+        cycle = list()
+        location = start
+        while location is not None and location not in visited:
+            visited.add(location)
+            cycle.append(location)
+            location = successors.get(location)
+        cycles.append(cycle)
+
+    return cycles
@@ -0,0 +1,262 @@
+import copy
+import heapq
+
+import numpy as np
+
+
+class Solution:
+    """
+    Routes of a solution, with the length and load of each route and a max-heap of the lengths, for the moves of a
+    local search: relocate, swap, segment exchange and 2-opt moves are evaluated in O(1), and applying one updates
+    only the routes it changes.
+
+    Each route is kept as its path, from the depot back to it (the depot is location n), so positions are indices in
+    the path: the items of a route are at positions 1 to len(path) - 2. With the length of the path up to each of its
+    locations, in both directions, the length of any segment (travelled either way, since the distances may be
+    asymmetric) is the difference of two of them.
+    """
+    def __init__(self, instance, routes):
+        """
+        :param instance: MCPProblem - the instance
+        :param routes: list(list(int)) - items (0-based) delivered by each courier in order
+        """
+        self.n = instance.n_items
+        self.distances = np.asarray(instance.distances)
+        # Single distances are read much faster from nested lists than from the array
+        self.d = self.distances.tolist()
+        self.sizes = [int(size) for size in instance.sizes]
+        self.capacities = [int(max_load) for max_load in instance.max_loads]
+
+        self.paths = [[self.n] + list(route) + [self.n] for route in routes]
+        # Length of each path up to each location, forwards and backwards, and total size of the items before it
+        self.forward = [None] * len(self.paths)
+        self.backward = [None] * len(self.paths)
+        self.prefix_sizes = [None] * len(self.paths)
+        self.lengths = [0] * len(self.paths)
+        self.loads = [0] * len(self.paths)
+        # (-length, courier), with an entry left behind whenever a length changes, skipped when it gets to the top
+        self._heap = list()
+
+        for r in range(len(self.paths)):
+            self._update(r)
+        self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        self._heap = [(-length, r) for r, length in enumerate(self.lengths)]
+        heapq.heapify(self._heap)
+
+    def _update(self, r):
+        # Prefix sums, length and load of route r, after it was changed
+        d, path = self.d, self.paths[r]
+
+        forward, backward, prefix_sizes = [0], [0], [0]
+        for a, b in zip(path[:-1], path[1:]):
+            forward.append(forward[-1] + d[a][b])
+            backward.append(backward[-1] + d[b][a])
+            prefix_sizes.append(prefix_sizes[-1] + (self.sizes[a] if a != self.n else 0))
+
+        self.forward[r], self.backward[r], self.prefix_sizes[r] = forward, backward, prefix_sizes
+        self.loads[r] = prefix_sizes[-1]
+        if forward[-1] != self.lengths[r]:
+            self.lengths[r] = forward[-1]
+            if len(self._heap) > 4 * len(self.paths):
+                self._rebuild_heap()
+            else:
+                heapq.heappush(self._heap, (-forward[-1], r))
+
+    def copy(self):
+        """
+        :return: Solution - a copy of the solution, sharing the data of the instance
+        """
+        other = copy.copy(self)
+        other.paths = [list(path) for path in self.paths]
+        # The prefix sums of a route are replaced, never changed, when the route changes
+        other.forward, other.backward = list(self.forward), list(self.backward)
+        other.prefix_sizes = list(self.prefix_sizes)
+        other.lengths, other.loads, other._heap = list(self.lengths), list(self.loads), list(self._heap)
+
+        return other
+
+    @property
+    def routes(self):
+        """
+        :return: list(list(int)) - items (0-based) delivered by each courier in order
+        """
+        return [path[1:-1] for path in self.paths]
+
+    def max_length(self, exclude=()):
+        """
+        Length of the longest route, from the top of the heap.
+
+        :param exclude: collection(int) - routes left out (e.g. the ones changed by a move)
+        :return: int - the length (0 if all the routes are left out)
+        """
+        heap = self._heap
+        put_back = list()
+        while heap:
+            length, r = heap[0]
+            if -length != self.lengths[r]:
+                heapq.heappop(heap)
+            elif r in exclude:
+                put_back.append(heapq.heappop(heap))
+            else:
+                break
+
+        result = -heap[0][0] if heap else 0
+        for entry in put_back:
+            heapq.heappush(heap, entry)
+
+        return result
+
+    def objective(self):
+        """
+        :return: int - distance travelled by the courier going farthest
+        """
+        return self.max_length()
+
+    def objective_after(self, changes):
+        """
+        Objective of the solution after a move, in O(1) amortized.
+
+        :param changes: dict(int -> int) - new length of each route changed by the move
+        :return: int - the maximum distance
+        """
+        return max(max(changes.values()), self.max_length(changes))
+
+    def segment_size(self, r, i, k):
+        """
+        :return: int - total size of the k items of route r from position i
+        """
+        return self.prefix_sizes[r][i + k] - self.prefix_sizes[r][i]
+
+    def insertion_delta(self, j, b, p):
+        """
+        :return: int - change of the length of route b when item j is inserted at position p
+        """
+        path = self.paths[b]
+
+        return self.d[path[p - 1]][j] + self.d[j][path[p]] - self.d[path[p - 1]][path[p]]
+
+    def removal_delta(self, r, i, k=1):
+        """
+        :return: int - change of the length of route r when its k items from position i are removed
+        """
+        path, forward = self.paths[r], self.forward[r]
+
+        return self.d[path[i - 1]][path[i + k]] - (forward[i + k] - forward[i - 1])
+
+    def exchange_delta(self, r, i, k1, b, p, k2):
+        """
+        Change of the lengths of routes r and b (r != b) when the k1 items of route r from position i are exchanged
+        with the k2 items of route b from position p (with k2 = 0, the items of route r are moved before position p of
+        route b). The segments keep their direction.
+
+        :return: (int, int) - change of the length of route r and of route b
+        """
+        d = self.d
+        path, forward = self.paths[r], self.forward[r]
+        other_path, other_forward = self.paths[b], self.forward[b]
+
+        before, after = path[i - 1], path[i + k1]
+        other_before, other_after = other_path[p - 1], other_path[p + k2]
+        inner = forward[i + k1 - 1] - forward[i]
+        removed = forward[i + k1] - forward[i - 1]
+        added_b = d[other_before][path[i]] + inner + d[path[i + k1 - 1]][other_after]
+
+        if k2 == 0:
+            return d[before][after] - removed, added_b - d[other_before][other_after]
+
+        other_inner = other_forward[p + k2 - 1] - other_forward[p]
+        other_removed = other_forward[p + k2] - other_forward[p - 1]
+        added_r = d[before][other_path[p]] + other_inner + d[other_path[p + k2 - 1]][after]
+
+        return added_r - removed, added_b - other_removed
+
+    def exchange_fits(self, r, i, k1, b, p, k2):
+        """
+        :return: bool - whether both routes are within the capacities after the exchange (see exchange_delta)
+        """
+        size, other_size = self.segment_size(r, i, k1), self.segment_size(b, p, k2)
+
+        return (self.loads[r] - size + other_size <= self.capacities[r]
+                and self.loads[b] - other_size + size <= self.capacities[b])
+
+    def relocate_delta(self, r, i, b, p):
+        """
+        :return: (int, int) - change of the length of route r and of route b (r != b) when the item at position i of
+                 route r is moved to position p of route b
+        """
+        return self.exchange_delta(r, i, 1, b, p, 0)
+
+    def swap_delta(self, r, i, b, p):
+        """
+        :return: (int, int) - change of the length of route r and of route b (r != b) when the item at position i of
+                 route r and the item at position p of route b are swapped
+        """
+        return self.exchange_delta(r, i, 1, b, p, 1)
+
+    def two_opt_delta(self, r, i, j):
+        """
+        :return: int - change of the length of route r when its items from position i to position j (included) are
+                 visited in reverse order
+        """
+        d, path = self.d, self.paths[r]
+        forward, backward = self.forward[r], self.backward[r]
+
+        return (d[path[i - 1]][path[j]] + (backward[j] - backward[i]) + d[path[i]][path[j + 1]]
+                - (forward[j + 1] - forward[i - 1]))
+
+    def insert(self, j, b, p):
+        """
+        Insert item j at position p of route b.
+        """
+        self.paths[b].insert(p, j)
+        self._update(b)
+
+    def remove(self, r, i, k=1):
+        """
+        Remove the k items of route r from position i.
+
+        :return: list(int) - the removed items
+        """
+        removed = self.paths[r][i:i + k]
+        del self.paths[r][i:i + k]
+        self._update(r)
+
+        return removed
+
+    def remove_items(self, items):
+        """
+        Remove the given items, wherever they are.
+
+        :param items: collection(int) - the items
+        """
+        items = set(items)
+        for r, path in enumerate(self.paths):
+            if not items.isdisjoint(path):
+                self.paths[r] = [j for j in path if j not in items]
+                self._update(r)
+
+    def exchange(self, r, i, k1, b, p, k2):
+        """
+        Exchange the k1 items of route r from position i with the k2 items of route b from position p (see
+        exchange_delta).
+        """
+        segment = self.paths[r][i:i + k1]
+        self.paths[r][i:i + k1] = self.paths[b][p:p + k2]
+        self.paths[b][p:p + k2] = segment
+        self._update(r)
+        self._update(b)
+
+    def relocate(self, r, i, b, p):
+        self.exchange(r, i, 1, b, p, 0)
+
+    def swap(self, r, i, b, p):
+        self.exchange(r, i, 1, b, p, 1)
+
+    def two_opt(self, r, i, j):
+        """
+        Visit the items of route r from position i to position j (included) in reverse order.
+        """
+        self.paths[r][i:j + 1] = self.paths[r][i:j + 1][::-1]
+        self._update(r)
@@ -0,0 +1,116 @@
+import numpy as np
+
+
+def _equal_groups(values):
+    # Positions sharing the same value, in groups of at least two (each in increasing order)
+    groups = dict()
+    for position, value in enumerate(values):
+        groups.setdefault(value, list()).append(position)
+
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def _interchangeable(d, sizes, j, k):
+    # Items j and k can exchange their places in any solution: same size, same distances from and to every other
+    # location, and the same distance between them both ways
+    others = np.ones(len(d), dtype=bool)
+    others[[j, k]] = False
+
+    return bool(
+        sizes[j] == sizes[k] and d[j, k] == d[k, j]
+        and np.array_equal(d[j, others], d[k, others]) and np.array_equal(d[others, j], d[others, k])
+    )
+
+
+def detect_symmetries(instance):
+    """
+    Symmetries of an instance, computed from its data:
+    - symmetric_distances: the distances are symmetric, so every route can be travelled backwards at the same cost;
+    - identical_capacities: groups of couriers with the same maximum load, which can exchange their routes;
+    - identical_sizes: groups of items with the same size;
+    - interchangeable_items: groups of items that can exchange their places in any solution (same size, and same
+      distances from and to every other location).
+
+    :param instance: MCPProblem - the instance
+    :return: dict - the symmetries, by name (groups as lists of 0-based indices, in increasing order)
+    """
+    n = instance.n_items
+    d = np.asarray(instance.distances)
+    sizes = [int(size) for size in instance.sizes]
+
+    # Items are only compared with the items of the same size and the same distances from and to the origin
+    interchangeable_items = list()
+    for candidates in _equal_groups(list(zip(sizes, d[n, :n].tolist(), d[:n, n].tolist()))):
+        while candidates:
+            group = [candidates[0]]
+            for k in candidates[1:]:
+                if all(_interchangeable(d, sizes, j, k) for j in group):
+                    group.append(k)
+            candidates = [k for k in candidates if k not in group]
+            if len(group) > 1:
+                interchangeable_items.append(group)
+
+    return {
+        "symmetric_distances": bool(np.array_equal(d, d.T)),
+        "identical_capacities": _equal_groups([int(max_load) for max_load in instance.max_loads]),
+        "identical_sizes": _equal_groups(sizes),
+        "interchangeable_items": sorted(interchangeable_items)
+    }
+
+
+def canonical_routes(routes, symmetries, courier_order="assignment"):
+    """
+    Solution equivalent to the given one (by the detected symmetries) satisfying the symmetry breaking constraints of
+    the models, so that it can still be their warm start:
+    - the routes are travelled from their lower numbered end, if the distances are symmetric;
+    - with courier_order assignment, couriers with the same capacity are ordered by the first (lowest numbered) item
+      they deliver, and interchangeable items are delivered by couriers in the same order as the items;
+    - with courier_order first_item, couriers with the same capacity are ordered by the first item of their route
+      (interchangeable items are not ordered).
+
+    :param routes: list(list(int)) - items (0-based) delivered by each courier in order
+    :param symmetries: dict - symmetries of the instance (see detect_symmetries)
+    :param courier_order: str - assignment or first_item, the order of the couriers with the same capacity
+    :return: list(list(int)) - the routes of the equivalent solution
+    """
+    routes = [list(route) for route in routes]
+
+    def reverse_routes():
+        # Only the direction of the routes changes, not the items of each courier
+        if symmetries["symmetric_distances"]:
+            for i, route in enumerate(routes):
+                if route and route[0] > route[-1]:
+                    routes[i] = route[::-1]
+
+    def order_couriers(key):
+        for group in symmetries["identical_capacities"]:
+            group_routes = sorted((routes[i] for i in group), key=lambda route: key(route) if route else np.inf)
+            for i, route in zip(group, group_routes):
+                routes[i] = route
+
+    if courier_order == "first_item":
+        # The first item of each route is only known once the direction is
+        reverse_routes()
+        order_couriers(lambda route: route[0])
+        return routes
+
+    # Each swap of two interchangeable items puts the earlier one with an earlier courier, so the assignment gets
+    # lexicographically smaller at every change, until none is needed
+    changed = True
+    while changed:
+        order_couriers(min)
+
+        changed = False
+        courier = {j: i for i, route in enumerate(routes) for j in route}
+        for group in symmetries["interchangeable_items"]:
+            for j, k in zip(group[:-1], group[1:]):
+                if courier[j] > courier[k]:
+                    routes[courier[j]][routes[courier[j]].index(j)] = k
+                    routes[courier[k]][routes[courier[k]].index(k)] = j
+                    courier[j], courier[k] = courier[k], courier[j]
+                    changed = True
+
+    # Last, since the swaps change the ends of the routes
+    reverse_routes()
+
+    return routes
@@ -0,0 +1,42 @@
+import numpy as np
+
+from src.MCPProblem import MCPProblem
+from src.MIP.formulation import MIPFormulation
+from src.symmetry import canonical_routes, detect_symmetries
+
+
+def _line_instance():
+    # Symmetric distances on a line, the origin last
+    positions = np.array([4, 1, 3, 6, 2, 0])
+    distances = np.abs(positions[:, None] - positions[None, :])
+
+    return MCPProblem(2, 5, [15, 15], [2, 1, 3, 2, 1], distances)
+
+
+def _formulation(instance, symmetries=None):
+    return MIPFormulation(instance.n_couriers, instance.n_items, instance.max_loads, instance.sizes,
+                          instance.distances, symmetries=symmetries)
+
+
+def test_single_route_start():
+    # One courier delivers all the items: the last item takes position n in the MTZ order, before the origin
+    instance = _line_instance()
+    n = instance.n_items
+    formulation = _formulation(instance)
+
+    values = formulation.start_values([[n, 1, 4, 2, 0, 3, n], [n, n]])
+
+    assert formulation.is_feasible(values)
+
+
+def test_canonical_start():
+    # The canonical routes of a heuristic solution satisfy the symmetry breaking constraints of the formulation
+    instance = _line_instance()
+    n = instance.n_items
+    symmetries = detect_symmetries(instance)
+    formulation = _formulation(instance, symmetries)
+
+    for routes in ([[3, 0], [1, 4, 2]], [[], [2, 0, 3, 4, 1]], [[4], [0, 3, 2, 1]]):
+        routes = canonical_routes(routes, symmetries)
+        values = formulation.start_values([[n] + route + [n] for route in routes])
+        assert formulation.is_feasible(values)
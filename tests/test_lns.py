@@ -0,0 +1,35 @@
+import numpy as np
+
+from src.LNS.lns import DESTROY_OPERATORS, regret_insertion
+from src.local_search import sorted_neighbors
+from src.MCPProblem import MCPProblem
+from src.solution import Solution
+
+
+def test_regret_insertion_feasible():
+    # Every item is delivered exactly once, within the capacities, whenever the insertion succeeds
+    rng = np.random.default_rng(5)
+    for _ in range(100):
+        m, n = 3, 10
+        distances = rng.integers(1, 50, (n + 1, n + 1))
+        np.fill_diagonal(distances, 0)
+        sizes = rng.integers(1, 5, n)
+        instance = MCPProblem(m, n, [12, 10, 8], sizes.tolist(), distances)
+
+        # Items dealt out to the couriers within their capacities
+        routes = [list() for _ in range(m)]
+        for j in rng.permutation(n).tolist():
+            fitting = [i for i in range(m) if sum(sizes[routes[i]]) + sizes[j] <= instance.max_loads[i]]
+            routes[fitting[0] if fitting else int(np.argmin([sum(sizes[route]) for route in routes]))].append(j)
+        if any(sum(sizes[route]) > max_load for route, max_load in zip(routes, instance.max_loads)):
+            continue
+
+        solution = Solution(instance, routes)
+        destroy = DESTROY_OPERATORS[int(rng.integers(len(DESTROY_OPERATORS)))]
+        removed = destroy(solution, int(rng.integers(2, 6)), rng, sorted_neighbors(instance.distances, n))
+        solution.remove_items(removed)
+
+        if not regret_insertion(solution, removed):
+            continue
+        assert sorted(j for route in solution.routes for j in route) == list(range(n))
+        assert all(load <= max_load for load, max_load in zip(solution.loads, instance.max_loads))
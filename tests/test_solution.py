@@ -0,0 +1,92 @@
+import numpy as np
+
+from src.heuristics import route_distance
+from src.MCPProblem import MCPProblem
+from src.solution import Solution
+
+
+def _random_solution(rng):
+    # Asymmetric distances, so that the direction of the segments matters
+    m, n = 3, 9
+    distances = rng.integers(1, 50, (n + 1, n + 1))
+    np.fill_diagonal(distances, 0)
+    instance = MCPProblem(m, n, [10, 10, 10], rng.integers(1, 4, n).tolist(), distances)
+
+    items = rng.permutation(n)
+    routes = [items[:4].tolist(), items[4:8].tolist(), items[8:].tolist()]
+
+    return instance, Solution(instance, routes)
+
+
+def _check(solution, instance):
+    # Lengths, loads and objective match the routes
+    lengths = [route_distance(route, instance.distances, instance.n_items) for route in solution.routes]
+    loads = [sum(instance.sizes[j] for j in route) for route in solution.routes]
+
+    assert solution.lengths == lengths
+    assert solution.loads == loads
+    assert solution.objective() == max(lengths)
+
+
+def test_move_deltas():
+    # The change of the lengths predicted by each move is the one applying it gives
+    rng = np.random.default_rng(11)
+    for _ in range(200):
+        instance, solution = _random_solution(rng)
+        _check(solution, instance)
+        r, b = (int(x) for x in rng.choice(3, 2, replace=False))
+        i = int(rng.integers(1, len(solution.paths[r]) - 1))
+        p = int(rng.integers(1, len(solution.paths[b])))
+        before = list(solution.lengths)
+
+        kind = int(rng.integers(4))
+        moved = solution.copy()
+        if kind == 0:
+            delta_r, delta_b = solution.relocate_delta(r, i, b, p)
+            moved.relocate(r, i, b, p)
+        elif kind == 1 and p < len(solution.paths[b]) - 1:
+            delta_r, delta_b = solution.swap_delta(r, i, b, p)
+            moved.swap(r, i, b, p)
+        elif kind == 2:
+            k1 = int(rng.integers(1, len(solution.paths[r]) - i))
+            k2 = int(rng.integers(0, len(solution.paths[b]) - p))
+            delta_r, delta_b = solution.exchange_delta(r, i, k1, b, p, k2)
+            fits = solution.exchange_fits(r, i, k1, b, p, k2)
+            moved.exchange(r, i, k1, b, p, k2)
+            assert fits == (moved.loads[r] <= moved.capacities[r] and moved.loads[b] <= moved.capacities[b])
+        else:
+            j = int(rng.integers(i, len(solution.paths[r]) - 1))
+            delta_r, delta_b = solution.two_opt_delta(r, i, j), 0
+            moved.two_opt(r, i, j)
+
+        _check(moved, instance)
+        assert moved.lengths[r] == before[r] + delta_r
+        assert moved.lengths[b] == before[b] + delta_b
+        assert moved.objective() == solution.objective_after({r: moved.lengths[r], b: moved.lengths[b]})
+
+        # The copy shares nothing that the moves change
+        assert solution.lengths == before
+        _check(solution, instance)
+
+
+def test_insertion_and_removal_deltas():
+    rng = np.random.default_rng(12)
+    for _ in range(100):
+        instance, solution = _random_solution(rng)
+        r = int(rng.integers(3))
+        i = int(rng.integers(1, len(solution.paths[r]) - 1))
+        k = int(rng.integers(1, len(solution.paths[r]) - i))
+        before = solution.lengths[r]
+
+        delta = solution.removal_delta(r, i, k)
+        removed = solution.remove(r, i, k)
+        _check(solution, instance)
+        assert solution.lengths[r] == before + delta
+
+        b = int(rng.integers(3))
+        p = int(rng.integers(1, len(solution.paths[b])))
+        before = solution.lengths[b]
+        delta = solution.insertion_delta(removed[0], b, p)
+        solution.insert(removed[0], b, p)
+        _check(solution, instance)
+        assert solution.lengths[b] == before + delta
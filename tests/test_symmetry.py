@@ -0,0 +1,117 @@
+import itertools
+import os
+
+import numpy as np
+
+from src.bounds import objective_lower_bound
+from src.heuristics import heuristic_solution, route_distance
+from src.io_utils import read_input_file
+from src.MCPProblem import MCPProblem
+from src.preprocessing import preprocess
+from src.symmetry import canonical_routes, detect_symmetries
+
+
+def _satisfies(routes, symmetries):
+    # Whether the routes satisfy the symmetry breaking constraints of the models (courier_order assignment)
+    courier = {j: i for i, route in enumerate(routes) for j in route}
+    first = [min(route) if route else np.inf for route in routes]
+
+    return (
+        all(first[i1] < first[i2] or first[i1] == first[i2] == np.inf
+            for group in symmetries["identical_capacities"] for i1, i2 in zip(group[:-1], group[1:]))
+        and all(courier[j] <= courier[k]
+                for group in symmetries["interchangeable_items"] for j, k in zip(group[:-1], group[1:]))
+        and (not symmetries["symmetric_distances"] or all(route[0] <= route[-1] for route in routes if route))
+    )
+
+
+def test_swap_then_reverse():
+    # Swapping the interchangeable items 2 and 7 makes 2 the last item of the first route, which must be reversed
+    symmetries = {
+        "symmetric_distances": True,
+        "identical_capacities": [],
+        "identical_sizes": [],
+        "interchangeable_items": [[2, 7]]
+    }
+
+    routes = canonical_routes([[5, 3, 7], [2]], symmetries)
+
+    assert routes == [[2, 3, 5], [7]]
+    assert _satisfies(routes, symmetries)
+
+
+def test_all_symmetries():
+    # Symmetric distances on a line, couriers 0 and 1 with the same capacity, items 0 and 1 at the same place
+    positions = np.array([3, 3, 1, 5, 2, 0])
+    distances = np.abs(positions[:, None] - positions[None, :])
+    instance = MCPProblem(3, 5, [10, 10, 4], [2, 2, 1, 3, 1], distances)
+
+    symmetries = detect_symmetries(instance)
+    assert symmetries["symmetric_distances"]
+    assert symmetries["identical_capacities"] == [[0, 1]]
+    assert symmetries["interchangeable_items"] == [[0, 1]]
+
+    for routes in ([[4, 1], [3, 0], [2]], [[3, 1, 2], [], [4, 0]], [[], [0, 2, 4], [3, 1]]):
+        canonical = canonical_routes(routes, symmetries)
+        assert _satisfies(canonical, symmetries)
+        assert sorted(j for route in canonical for j in route) == list(range(5))
+
+
+def _solutions(instance):
+    # Every solution of a small instance: each assignment of the items within the capacities, in every order
+    m, n = instance.n_couriers, instance.n_items
+    for assignment in itertools.product(range(m), repeat=n):
+        items = [[j for j in range(n) if assignment[j] == i] for i in range(m)]
+        if any(sum(instance.sizes[j] for j in route) > instance.max_loads[i] for i, route in enumerate(items)):
+            continue
+        for routes in itertools.product(*(itertools.permutations(route) for route in items)):
+            yield [list(route) for route in routes]
+
+
+def _objective(routes, instance):
+    return max(route_distance(route, instance.distances, instance.n_items) for route in routes)
+
+
+def _small_instances():
+    # The smallest bundled instance (asymmetric distances), and random ones: on a line, with couriers of the same
+    # capacity and items at the same place, and with asymmetric distances not satisfying the triangle inequality
+    yield read_input_file(os.path.join("data", "problem_instances", "inst05.dat"), cache=False)
+
+    rng = np.random.default_rng(7)
+    for _ in range(4):
+        positions = rng.integers(0, 6, 6)
+        yield MCPProblem(3, 5, [6, 6, 4], rng.integers(1, 4, 5).tolist(),
+                         np.abs(positions[:, None] - positions[None, :]))
+
+        distances = rng.integers(1, 30, (6, 6))
+        np.fill_diagonal(distances, 0)
+        yield MCPProblem(2, 5, [8, 7], rng.integers(1, 4, 5).tolist(), distances)
+
+
+def test_optimal_solution_kept():
+    # The lower bound, the preprocessing and the symmetry breaking together leave at least one optimal solution, and
+    # the canonical routes of an optimal solution are still optimal
+    for instance in _small_instances():
+        n = instance.n_items
+        solutions = list(_solutions(instance))
+        optimum = min(_objective(routes, instance) for routes in solutions)
+        optimal = [routes for routes in solutions if _objective(routes, instance) == optimum]
+
+        assert objective_lower_bound(instance) <= optimum
+
+        _, upper_bound = heuristic_solution(instance, time_limit=1)
+        compatible, arc_mask = preprocess(instance, upper_bound)
+        symmetries = detect_symmetries(instance)
+
+        def kept(routes):
+            paths = [[n] + route + [n] for route in routes]
+            return (all(compatible[i, j] for i, route in enumerate(routes) for j in route)
+                    and all(arc_mask[i, a, b] for i, path in enumerate(paths) for a, b in zip(path[:-1], path[1:]))
+                    and _satisfies(routes, symmetries))
+
+        assert any(kept(routes) for routes in optimal)
+
+        for routes in optimal:
+            canonical = canonical_routes(routes, symmetries)
+            assert _objective(canonical, instance) == optimum
+            assert _satisfies(canonical, symmetries)